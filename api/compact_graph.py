@@ -0,0 +1,412 @@
+from array import array
+from collections import deque
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+import copy
+
+from .graph_engine import Graph_1
+from .connectivity import IntDisjointSet
+
+
+# Compact backend for Graph_1.
+#
+# Node ids are interned to integers in insertion order. Edges are appended to
+# flat source/destination arrays and, once the graph is processed, packed into
+# CSR form: for node u, the ids of its outgoing edges are
+# out_edge_ids[out_offsets[u]:out_offsets[u + 1]] (incoming edges likewise).
+# Edges are stored column-wise (ids, key mappings, endpoint arrays) and only
+# materialised as __slots__ records when accessed through the `edges` view.
+# Indegree and the toposort parent are flat int arrays.
+
+
+class CompactNode:
+    """Node record of CompactGraph."""
+    __slots__ = ('node_id', 'data_in', 'data_out', 'runtime_data')
+
+    def __init__(self, node_id: str, data_in: Dict[str, Any], data_out: Dict[str, Any],
+                 runtime_data: Optional[Dict[str, Any]] = None):
+        self.node_id = node_id
+        self.data_in = data_in
+        self.data_out = data_out
+        self.runtime_data = runtime_data if runtime_data is not None else {}
+
+
+class CompactEdge:
+    """Edge record returned by CompactGraph views, `src`/`dst` are the interned node indices."""
+    __slots__ = ('edge_id', 'src_node', 'dst_node', 'src_to_dst_data_keys', 'src', 'dst')
+
+    def __init__(self, edge_id: str, src_node: str, dst_node: str,
+                 src_to_dst_data_keys: Dict[str, str], src: int, dst: int):
+        self.edge_id = edge_id
+        self.src_node = src_node
+        self.dst_node = dst_node
+        self.src_to_dst_data_keys = src_to_dst_data_keys
+        self.src = src
+        self.dst = dst
+
+
+class _IndexView(Mapping):
+    """Read-only id -> value mapping over an interned index, built on access."""
+    __slots__ = ('_index', '_get')
+
+    def __init__(self, index: Dict[str, int], get: Callable[[int], Any]):
+        self._index = index
+        self._get = get
+
+    def __getitem__(self, key):
+        return self._get(self._index[key])
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+class CompactGraph(Graph_1):
+    """
+    Graph_1 backed by interned node ids and CSR adjacency arrays.
+    add_node, add_edge, is_connected, process_graph, propagate_data, fork,
+    get_all_nodes and set_node_data behave like Graph_1's; the dict-shaped
+    attributes (nodes, edges, indegree, directed_adj, ...) are read-only views.
+    The graph is append-only: patches rebuild it rather than edit it.
+    """
+
+    def __init__(self):
+        self.node_ids: List[str] = []
+        self.node_index: Dict[str, int] = {}
+        self.node_records: List[CompactNode] = []
+        self.edge_ids: List[str] = []
+        self.edge_keys: List[Dict[str, str]] = []
+        self.edge_index: Dict[str, int] = {}
+        self.edge_src = array('i')
+        self.edge_dst = array('i')
+        self.indegree_array = array('i')
+        self.dependent_on_array = array('i')
+        self.components = IntDisjointSet()
+        self.disabled: FrozenSet[str] = frozenset()
+        self.disabled_index: FrozenSet[int] = frozenset()
+        self._csr: Optional[Tuple[array, array, array, array, array]] = None
+
+    # Construction
+
+    def add_node(self, node_id: str, node_data: dict) -> bool:
+        """
+        Add a new node to the graph.
+        Returns True if successful, False if node already exists.
+        """
+        if node_id in self.node_index:
+            return False
+
+        self.node_index[node_id] = len(self.node_ids)
+        self.node_ids.append(node_id)
+        self.node_records.append(CompactNode(
+            node_id,
+            node_data.get('data_in', {}),
+            node_data.get('data_out', {})
+        ))
+        self.indegree_array.append(0)
+        self.dependent_on_array.append(-1)
+        self.components.add()
+        self._csr = None
+        return True
+
+    def add_edge(self, edge_data: dict) -> bool:
+        """
+        Add a new edge to the graph.
+        Returns True if successful, False if edge already exists or nodes don't exist.
+        """
+        edge_id = edge_data['edge_id']
+        src = self.node_index.get(edge_data['src_node'])
+        dst = self.node_index.get(edge_data['dst_node'])
+
+        if edge_id in self.edge_index or src is None or dst is None:
+            return False
+
+        self.edge_index[edge_id] = len(self.edge_ids)
+        self.edge_ids.append(edge_id)
+        self.edge_keys.append(edge_data['src_to_dst_data_keys'])
+        self.edge_src.append(src)
+        self.edge_dst.append(dst)
+        self.indegree_array[dst] += 1
+        self.components.union(src, dst)
+        self._csr = None
+        return True
+
+    # Graph_1's editing methods would fail on the read-only views
+    def remove_edge(self, edge_id: str) -> bool:
+        raise TypeError("CompactGraph is append-only; rebuild it instead")
+
+    def remove_node(self, node_id: str) -> bool:
+        raise TypeError("CompactGraph is append-only; rebuild it instead")
+
+    def copy_topology(self, node_ids: Iterable[str]) -> "CompactGraph":
+        raise TypeError("CompactGraph is append-only; rebuild it instead")
+
+    def _build_csr(self) -> Tuple[array, array, array, array, array]:
+        """
+        Pack the edge arrays into outgoing and incoming CSR with a counting sort,
+        which keeps each node's edges in insertion order. Also ranks the node ids
+        lexicographically so levels can be ordered without comparing strings.
+        """
+        if self._csr is not None:
+            return self._csr
+
+        num_nodes = len(self.node_ids)
+        out_offsets = self._offsets(self.edge_src, num_nodes)
+        in_offsets = self._offsets(self.edge_dst, num_nodes)
+        out_edge_ids = self._scatter(self.edge_src, out_offsets)
+        in_edge_ids = self._scatter(self.edge_dst, in_offsets)
+
+        rank = array('i', bytes(4 * num_nodes))
+        for position, node in enumerate(sorted(range(num_nodes), key=self.node_ids.__getitem__)):
+            rank[node] = position
+
+        self._csr = (out_offsets, out_edge_ids, in_offsets, in_edge_ids, rank)
+        return self._csr
+
+    @staticmethod
+    def _offsets(endpoints: array, num_nodes: int) -> array:
+        offsets = array('i', bytes(4 * (num_nodes + 1)))
+        for node in endpoints:
+            offsets[node + 1] += 1
+        for node in range(num_nodes):
+            offsets[node + 1] += offsets[node]
+        return offsets
+
+    @staticmethod
+    def _scatter(endpoints: array, offsets: array) -> array:
+        edge_ids = array('i', bytes(4 * len(endpoints)))
+        cursor = array('i', offsets)
+        for edge, node in enumerate(endpoints):
+            edge_ids[cursor[node]] = edge
+            cursor[node] += 1
+        return edge_ids
+
+    # Graph_1 compatible views
+
+    @property
+    def nodes(self) -> Mapping:
+        return _IndexView(self.node_index, self.node_records.__getitem__)
+
+    @property
+    def edges(self) -> Mapping:
+        return _IndexView(self.edge_index, self._edge_record)
+
+    @property
+    def indegree(self) -> Mapping:
+        return _IndexView(self.node_index, self.indegree_array.__getitem__)
+
+    @property
+    def dependent_on(self) -> Dict[str, str]:
+        return {self.node_ids[node]: self.node_ids[parent]
+                for node, parent in enumerate(self.dependent_on_array) if parent >= 0}
+
+    @property
+    def out_edges(self) -> Mapping:
+        return _IndexView(self.node_index, self._out_edge_records)
+
+    @property
+    def directed_adj(self) -> Mapping:
+        return _IndexView(self.node_index, lambda node: [
+            edge.dst_node for edge in self._out_edge_records(node)])
+
+    @property
+    def reverse_adj(self) -> Mapping:
+        _, _, in_offsets, in_edge_ids, _ = self._build_csr()
+        return _IndexView(self.node_index, lambda node: [
+            self.node_ids[self.edge_src[edge]] for edge in in_edge_ids[in_offsets[node]:in_offsets[node + 1]]])
+
+    @property
+    def undirected_adj(self) -> Mapping:
+        return _IndexView(self.node_index, lambda node: [
+            self.node_ids[neighbor] for neighbor in self._neighbors(node)])
+
+    def _edge_record(self, edge: int) -> CompactEdge:
+        src, dst = self.edge_src[edge], self.edge_dst[edge]
+        return CompactEdge(self.edge_ids[edge], self.node_ids[src], self.node_ids[dst],
+                           self.edge_keys[edge], src, dst)
+
+    def _out_edge_records(self, node: int) -> List[CompactEdge]:
+        out_offsets, out_edge_ids = self._build_csr()[:2]
+        return [self._edge_record(edge)
+                for edge in out_edge_ids[out_offsets[node]:out_offsets[node + 1]]]
+
+    def _neighbors(self, node: int) -> Iterator[int]:
+        out_offsets, out_edge_ids, in_offsets, in_edge_ids, _ = self._build_csr()
+        for edge in out_edge_ids[out_offsets[node]:out_offsets[node + 1]]:
+            yield self.edge_dst[edge]
+        for edge in in_edge_ids[in_offsets[node]:in_offsets[node + 1]]:
+            yield self.edge_src[edge]
+
+    # Algorithms over the arrays
+
+    def connected_components(self) -> List[List[str]]:
+        """Returns the node ids of each connected component, largest component first."""
+        node_ids = self.node_ids
+        groups = self._masked_groups() if self.disabled_index else self.components.groups()
+        return [[node_ids[node] for node in group] for group in groups]
+
+    def _masked_groups(self) -> List[List[int]]:
+        """Components of the enabled nodes by BFS over the CSR arrays."""
+        seen = bytearray(len(self.node_ids))
+        for node in self.disabled_index:
+            seen[node] = 1
+        groups = []
+        for start in range(len(self.node_ids)):
+            if seen[start]:
+                continue
+            seen[start] = 1
+            group = [start]
+            queue = deque(group)
+            while queue:
+                for neighbor in self._neighbors(queue.popleft()):
+                    if not seen[neighbor]:
+                        seen[neighbor] = 1
+                        group.append(neighbor)
+                        queue.append(neighbor)
+            groups.append(group)
+        return sorted(groups, key=len, reverse=True)
+
+    def overlay(self, disabled: Iterable[str]) -> "CompactGraph":
+        """
+        Returns a view with the given nodes disabled. The interned ids, edge
+        columns and CSR arrays are shared; the indegree array is copied and the
+        disabled nodes' successors are decremented.
+        """
+        self._build_csr()
+        out_offsets, out_edge_ids = self._csr[:2]
+        view = copy.copy(self)
+        view.disabled = frozenset(node_id for node_id in disabled if node_id in self.node_index)
+        view.disabled_index = frozenset(self.node_index[node_id] for node_id in view.disabled)
+        view.indegree_array = indegree = array('i', self.indegree_array)
+        for node in view.disabled_index:
+            indegree[node] = 0
+            for edge in out_edge_ids[out_offsets[node]:out_offsets[node + 1]]:
+                if self.edge_dst[edge] not in view.disabled_index:
+                    indegree[self.edge_dst[edge]] -= 1
+        view.dependent_on_array = array('i', self.dependent_on_array)
+        return view
+
+    def process_graph(self) -> Tuple[List[List[str]], bool]:
+        """
+        Levelled Kahn's algorithm over the CSR arrays.
+        Returns (topological_order, is_not_cyclic) in the same order as Graph_1:
+        within a level, nodes are in descending lexicographical order.
+        """
+        levels, is_not_cyclic = self._topo_levels()
+        node_ids = self.node_ids
+        return [[node_ids[node] for node in level] for level in levels], is_not_cyclic
+
+    def _topo_levels(self) -> Tuple[List[List[int]], bool]:
+        out_offsets, out_edge_ids, _, _, rank = self._build_csr()
+        edge_dst = self.edge_dst
+        indegree = array('i', self.indegree_array)
+        dependent_on = self.dependent_on_array
+        disabled = self.disabled_index
+
+        levels = []
+        current = [node for node in range(len(self.node_ids))
+                   if indegree[node] == 0 and node not in disabled]
+        while current:
+            current.sort(key=rank.__getitem__, reverse=True)
+            future = []
+            for node in current:
+                for k in range(out_offsets[node], out_offsets[node + 1]):
+                    neighbor = edge_dst[out_edge_ids[k]]
+                    if neighbor in disabled:
+                        continue
+                    indegree[neighbor] -= 1
+                    if indegree[neighbor] == 0:
+                        dependent_on[neighbor] = node
+                        future.append(neighbor)
+            levels.append(current)
+            current = future
+
+        return levels, not any(indegree)
+
+    def upstream_cone(self, node_ids: Iterable[str]) -> Set[str]:
+        """The given nodes and every node they depend on, found by BFS over the incoming CSR."""
+        _, _, in_offsets, in_edge_ids, _ = self._build_csr()
+        edge_src, disabled = self.edge_src, self.disabled_index
+        seen = bytearray(len(self.node_ids))
+        queue = deque()
+        for node_id in node_ids:
+            node = self.node_index.get(node_id)
+            if node is not None and node not in disabled and not seen[node]:
+                seen[node] = 1
+                queue.append(node)
+        cone = list(queue)
+        while queue:
+            node = queue.popleft()
+            for k in range(in_offsets[node], in_offsets[node + 1]):
+                src = edge_src[in_edge_ids[k]]
+                if not seen[src] and src not in disabled:
+                    seen[src] = 1
+                    cone.append(src)
+                    queue.append(src)
+        node_ids = self.node_ids
+        return {node_ids[node] for node in cone}
+
+    def propagate_level(self, level: List[str], executor=None) -> None:
+        """Push the runtime data of every node in a level along its slice of the outgoing CSR."""
+        if executor is not None:
+            self.apply_writes(executor.run_level(self.level_tasks(level)))
+            return
+
+        out_offsets, out_edge_ids = self._build_csr()[:2]
+        node_index, records = self.node_index, self.node_records
+        edge_keys, edge_dst = self.edge_keys, self.edge_dst
+        disabled = self.disabled_index
+        for node_id in level:
+            node = node_index[node_id]
+            runtime_data = records[node].runtime_data
+            if not runtime_data:
+                continue
+            for k in range(out_offsets[node], out_offsets[node + 1]):
+                edge = out_edge_ids[k]
+                if disabled and edge_dst[edge] in disabled:
+                    continue
+                dst_node = records[edge_dst[edge]]
+                for src_key, dst_key in edge_keys[edge].items():
+                    if src_key in runtime_data:
+                        value = runtime_data[src_key]
+                        dst_node.data_in[dst_key] = value
+                        dst_node.runtime_data[dst_key] = value
+                        dst_node.data_out[dst_key] = value
+
+    def level_tasks(self, level: List[str]) -> List[tuple]:
+        out_offsets, out_edge_ids = self._build_csr()[:2]
+        node_index, records, node_ids = self.node_index, self.node_records, self.node_ids
+        edge_keys, edge_dst = self.edge_keys, self.edge_dst
+        tasks = []
+        for node_id in level:
+            node = node_index[node_id]
+            tasks.append((node_id, records[node].runtime_data, [
+                (node_ids[edge_dst[edge]], edge_keys[edge])
+                for edge in out_edge_ids[out_offsets[node]:out_offsets[node + 1]]
+                if edge_dst[edge] not in self.disabled_index
+            ]))
+        return tasks
+
+    def fork(self, data_overwrites: Optional[Dict[str, dict]] = None) -> "CompactGraph":
+        """
+        Returns a copy for a single run that shares the interned ids, edge
+        columns and CSR arrays, with fresh node records.
+        """
+        self._build_csr()
+        data_overwrites = data_overwrites or {}
+        run = copy.copy(self)
+        run.node_records = [
+            CompactNode(
+                record.node_id,
+                dict(data_overwrites.get(record.node_id, record.data_in)),
+                dict(record.data_out)
+            )
+            for record in self.node_records
+        ]
+        run.dependent_on_array = array('i', self.dependent_on_array)
+        return run
@@ -0,0 +1,193 @@
+from array import array
+from typing import Dict, Hashable, Iterable, List, Optional, Set
+
+
+class DisjointSet:
+    """
+    Union-find over hashable keys, with union by size and path halving.
+    Both operations are iterative and run in near-constant amortised time,
+    so connectivity can be maintained while edges are added.
+    """
+
+    def __init__(self):
+        self.parent: Dict[Hashable, Hashable] = {}
+        self.size: Dict[Hashable, int] = {}
+        self.count = 0  # Number of disjoint components
+
+    def add(self, key: Hashable) -> None:
+        if key in self.parent:
+            return
+        self.parent[key] = key
+        self.size[key] = 1
+        self.count += 1
+
+    def keys(self) -> Iterable[Hashable]:
+        return self.parent.keys()
+
+    def find(self, key: Hashable) -> Hashable:
+        parent = self.parent
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    def union(self, a: Hashable, b: Hashable) -> bool:
+        """Merge the components of a and b. Returns False if they were already connected."""
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return False
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+        self.count -= 1
+        return True
+
+    def groups(self) -> List[List[Hashable]]:
+        """Members of each component, largest component first."""
+        groups: Dict[Hashable, List[Hashable]] = {}
+        for key in self.keys():
+            groups.setdefault(self.find(key), []).append(key)
+        return sorted(groups.values(), key=len, reverse=True)
+
+    def copy(self) -> "DisjointSet":
+        copied = DisjointSet()
+        copied.parent = dict(self.parent)
+        copied.size = dict(self.size)
+        copied.count = self.count
+        return copied
+
+
+class DynamicComponents:
+    """
+    Connected components as explicit labels, for graphs that also lose edges,
+    which union-find can't undo. union relabels the smaller component and split
+    moves a detached part to a new label, so both cost time in the size of the
+    smaller side. copy() shares the member sets until one of them is modified.
+    """
+
+    def __init__(self):
+        self.label: Dict[Hashable, int] = {}
+        self.members: Dict[int, Set[Hashable]] = {}
+        self._owned: Set[int] = set()  # Labels whose member set belongs to this instance
+        self._next_label = 0
+
+    @classmethod
+    def from_groups(cls, groups: Iterable[Iterable[Hashable]]) -> "DynamicComponents":
+        components = cls()
+        for group in groups:
+            label = components._new_label(set(group))
+            for key in components.members[label]:
+                components.label[key] = label
+        return components
+
+    @property
+    def count(self) -> int:
+        """Number of disjoint components."""
+        return len(self.members)
+
+    def add(self, key: Hashable) -> None:
+        if key in self.label:
+            return
+        self.label[key] = self._new_label({key})
+
+    def keys(self) -> Iterable[Hashable]:
+        return self.label.keys()
+
+    def find(self, key: Hashable) -> int:
+        return self.label[key]
+
+    def union(self, a: Hashable, b: Hashable) -> bool:
+        """Merge the components of a and b. Returns False if they were already connected."""
+        label_a, label_b = self.label[a], self.label[b]
+        if label_a == label_b:
+            return False
+        if len(self.members[label_a]) < len(self.members[label_b]):
+            label_a, label_b = label_b, label_a
+        moved = self.members.pop(label_b)
+        self._owned.discard(label_b)
+        self._own(label_a).update(moved)
+        for key in moved:
+            self.label[key] = label_a
+        return True
+
+    def split(self, keys: Set[Hashable]) -> None:
+        """Move `keys`, a part of one component that got disconnected from the rest, to a new component."""
+        label = self.label[next(iter(keys))]
+        self._own(label).difference_update(keys)
+        new_label = self._new_label(set(keys))
+        for key in keys:
+            self.label[key] = new_label
+
+    def discard(self, key: Hashable) -> None:
+        """Remove a key, which must have no edges left."""
+        label = self.label.pop(key, None)
+        if label is None:
+            return
+        members = self._own(label)
+        members.discard(key)
+        if not members:
+            del self.members[label]
+            self._owned.discard(label)
+
+    def groups(self) -> List[List[Hashable]]:
+        """Members of each component, largest component first."""
+        return sorted((list(members) for members in self.members.values()), key=len, reverse=True)
+
+    def copy(self) -> "DynamicComponents":
+        copied = DynamicComponents()
+        copied.label = dict(self.label)
+        copied.members = dict(self.members)
+        copied._next_label = self._next_label
+        # The member sets are shared now, either side copies one before modifying it
+        self._owned = set()
+        return copied
+
+    def _own(self, label: int) -> Set[Hashable]:
+        if label not in self._owned:
+            self.members[label] = set(self.members[label])
+            self._owned.add(label)
+        return self.members[label]
+
+    def _new_label(self, members: Set[Hashable]) -> int:
+        label = self._next_label
+        self._next_label += 1
+        self.members[label] = members
+        self._owned.add(label)
+        return label
+
+
+class IntDisjointSet(DisjointSet):
+    """DisjointSet over the dense integers 0..n-1, stored in flat int arrays."""
+
+    def __init__(self):
+        self.parent = array('i')
+        self.size = array('i')
+        self.count = 0
+
+    def add(self, key: Optional[int] = None) -> int:
+        """Adds the next integer key and returns it. A given key must be that next integer."""
+        if key is not None and key != len(self.parent):
+            raise ValueError(f"IntDisjointSet keys are dense, expected {len(self.parent)}, got {key}")
+        key = len(self.parent)
+        self.parent.append(key)
+        self.size.append(1)
+        self.count += 1
+        return key
+
+    def keys(self) -> Iterable[int]:
+        return range(len(self.parent))
+
+    def copy(self) -> "IntDisjointSet":
+        copied = IntDisjointSet()
+        copied.parent = array('i', self.parent)
+        copied.size = array('i', self.size)
+        copied.count = self.count
+        return copied
+
+
+def component_report(groups: List[List[str]]) -> List[dict]:
+    """Format connected components for a response: size and sorted members, largest first."""
+    components = [{"size": len(members), "nodes": sorted(members)} for members in groups]
+    components.sort(key=lambda component: (-component["size"], component["nodes"][0]))
+    return components
@@ -1,56 +1,51 @@
+import itertools
 from flask import Blueprint, jsonify, request
+from mongoengine import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from config import Config
 from models import Node, Edge,Graph
+from .graph_loader import (load_adjacency_list, get_nodes, get_graph_node_ids, get_graph_members,
+                           get_validated_version, get_graph_edges, iter_adjacency_list, find_edges)
+from .graph_patch import PatchError, PatchConflict, plan_patch, apply_patch, patch_compiled
+from .schema_index import VALID_SCHEMA, validate_schema, mark_validated
+from .streaming import wants_ndjson, ndjson_response
+from .serialization import loads_json, loads_msgpack, is_msgpack_body
+from .graph_cache import compiled_graphs
+from .metrics import phase
+from .validation import (NODE_REQUIRED_FIELDS, EDGE_REQUIRED_FIELDS, NODE_ID_FIELDS, EDGE_ID_FIELDS,
+                         missing_field_error, string_field_error, validate_node_data, validate_edge_keys)
 
 crud_bp = Blueprint('crud', __name__)
 
 
+def bump_graph_versions(node_ids, exclude=None):
+    """
+    Bump the version of every graph containing one of these nodes (except
+    the graph `exclude`) so that compiled copies of them are not reused.
+    Uses the index on Graph.nodes.
+    """
+    query = {"nodes": {"$in": list(node_ids)}}
+    if exclude is not None:
+        query["graph_id"] = {"$ne": exclude}
+    Graph.objects(__raw__=query).update(inc__version=1)
+
+
 @crud_bp.route('/create_nodes', methods=['POST'])
 def create_node():
     data = request.json
-    required_fields = ['node_id', 'data_in', 'data_out']
-    
+
     # Check for required fields
-    for field in required_fields:
-        if field not in data:
-            return jsonify({"error": f"Missing required field: {field}"}), 400
-    
-    # Data type validation mapping
-    type_mapping = {
-        "int": int,
-        "float": float,
-        "str": str,
-        "bool": bool,
-        "list": list,
-        "dict": dict
-    }
-    
+    error = missing_field_error(data, NODE_REQUIRED_FIELDS)
+    if error:
+        return jsonify({"error": error}), 400
+
     data_in = data['data_in']
     data_out = data['data_out']
-    
-    # Check if all keys in data_out are present in data_in
-    for key in data_out.keys():
-        if key not in data_in:
-            return jsonify({
-                "error": f"Key '{key}' in data_out is not present in data_in"
-            }), 400
 
-    
-    # Check if data types for the same keys in data_in and data_out match
-    for key, expected_type_str in data_in.items():
-        if key in data_out:
-            expected_type = type_mapping.get(expected_type_str)
-            actual_type = type_mapping.get(data_out[key])
-            
-            if expected_type is None or actual_type is None:
-                return jsonify({
-                    "error": f"Invalid type for key '{key}'"
-                }), 400
-            
-            if expected_type != actual_type:
-                return jsonify({
-                    "error": f"Data type mismatch for key '{key}': "
-                             f"{expected_type_str} in data_in vs {data_out[key]} in data_out"
-                }), 400
+    error = validate_node_data(data_in, data_out)
+    if error:
+        return jsonify({"error": error}), 400
 
     try:
         # Create and save a new Node object if validation passes
@@ -59,9 +54,11 @@ def create_node():
             data_in=data_in,
             data_out=data_out,
             paths_in=[],  # Assuming paths_in and paths_out are initially empty
-            paths_out=[]
+            paths_out=[],
+            graph_id=data.get('graph_id')
         )
         new_node.save()  # Save the node to the database
+        bump_graph_versions([new_node.node_id])  # A graph may already list this node id
         return jsonify({"message": "Node created successfully", "node_id": new_node.node_id}), 201
 
     except Exception as e:
@@ -71,40 +68,28 @@ def create_node():
 @crud_bp.route('/create_edges', methods=['POST'])
 def create_edge():
     data = request.json
-    required_fields = ['edge_id', 'src_node', 'dst_node', 'src_to_dst_data_keys']
-    
+
     # Check for required fields
-    for field in required_fields:
-        if field not in data:
-            return jsonify({"error": f"Missing required field: {field}"}), 400
+    error = missing_field_error(data, EDGE_REQUIRED_FIELDS)
+    if error:
+        return jsonify({"error": error}), 400
     
     src_node_id = data['src_node']
     dst_node_id = data['dst_node']
     src_to_dst_data_keys = data['src_to_dst_data_keys']
 
-    # Fetch source and destination nodes
-    src_node = Node.objects(node_id=src_node_id).first()
-    dst_node = Node.objects(node_id=dst_node_id).first()
+    # Fetch source and destination nodes in one query
+    nodes = get_nodes([src_node_id, dst_node_id])
+    src_node = nodes.get(src_node_id)
+    dst_node = nodes.get(dst_node_id)
 
     if not src_node or not dst_node:
         return jsonify({"error": "Source or destination node does not exist"}), 404
 
     # Validate that the keys in src_to_dst_data_keys match the data types
-    for src_key, dst_key in src_to_dst_data_keys.items():
-        if src_key not in src_node.data_out or dst_key not in dst_node.data_in:
-            return jsonify({"error": f"Key '{src_key}' not found in src_node data_out or "
-                                       f"key '{dst_key}' not found in dst_node data_in"}), 400
-        
-        # Get actual data types of the values
-        src_value_type = src_node.data_out[src_key]
-        dst_value_type = dst_node.data_in[dst_key]
-    
-        # Check if types match
-        if src_value_type != dst_value_type:
-            return jsonify({
-                "error": f"Data type mismatch for key '{src_key}': "
-                         f"{src_value_type} vs {dst_value_type}"
-            }), 400
+    error = validate_edge_keys(src_to_dst_data_keys, src_node.get('data_out', {}), dst_node.get('data_in', {}))
+    if error:
+        return jsonify({"error": error}), 400
 
     try:
         # Create a new Edge object
@@ -112,15 +97,17 @@ def create_edge():
             edge_id=data['edge_id'],
             src_node=src_node_id,
             dst_node=dst_node_id,
-            src_to_dst_data_keys=src_to_dst_data_keys
+            src_to_dst_data_keys=src_to_dst_data_keys,
+            graph_id=data.get('graph_id')
         )
         new_edge.save()  # Save the edge to the database
 
-        # Update the paths of the nodes
-        src_node.paths_out.append(new_edge)  # Add edge to src_node's outgoing paths
-        dst_node.paths_in.append(new_edge)    # Add edge to dst_node's incoming paths
-        src_node.save()  # Save the updated src_node
-        dst_node.save()  # Save the updated dst_node
+        # Push the edge_id onto the nodes' paths without loading and re-saving them
+        Node._get_collection().bulk_write([
+            UpdateOne({"node_id": src_node_id}, {"$push": {"paths_out": new_edge.edge_id}}),
+            UpdateOne({"node_id": dst_node_id}, {"$push": {"paths_in": new_edge.edge_id}})
+        ], ordered=False)
+        bump_graph_versions([src_node_id, dst_node_id])
 
         return jsonify({"message": "Edge created successfully", "edge_id": new_edge.edge_id}), 201
 
@@ -128,6 +115,207 @@ def create_edge():
         return jsonify({"error": str(e)}), 500  # Handle errors during save
 
 
+def read_batch():
+    """
+    Yields (index, item, error) for each item of a bulk request body: either a
+    JSON array, a MessagePack array (`Content-Type: application/msgpack`), or
+    NDJSON (one object per line, `Content-Type: application/x-ndjson`) which
+    is read line by line from the request stream.
+    """
+    if request.mimetype == 'application/x-ndjson':
+        index = 0
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield index, loads_json(line), None
+            except ValueError as e:
+                yield index, None, f"Invalid JSON: {e}"
+            index += 1
+        return
+
+    if is_msgpack_body():
+        data = loads_msgpack(request.get_data())
+    else:
+        data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array, a MessagePack array or an NDJSON body")
+    for index, item in enumerate(data):
+        yield index, item, None
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def insert_documents(document_cls, docs, indices, errors):
+    """
+    insert_many without aborting on the first failure.
+    Returns the positions (in `docs`) that were inserted and records the rest in `errors`.
+    """
+    if not docs:
+        return []
+    failed = {}
+    try:
+        document_cls._get_collection().insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details.get('writeErrors', []):
+            failed[write_error['index']] = write_error.get('errmsg', 'Write failed')
+    for position, message in failed.items():
+        errors.append({"index": indices[position], "error": message})
+    return [position for position in range(len(docs)) if position not in failed]
+
+
+def bulk_response(errors, id_field, ids):
+    errors.sort(key=lambda error: error["index"])
+    body = {"inserted": len(ids), id_field: ids, "errors": errors}
+    return jsonify(body), 207 if errors else 201
+
+
+@crud_bp.route('/bulk_create_nodes', methods=['POST'])
+def bulk_create_nodes():
+    """
+    Create many nodes in one request. Each chunk of the batch is validated in
+    memory and written with a single insert_many; invalid items are reported
+    per index without aborting the rest of the batch.
+    """
+    errors = []
+    inserted_ids = []
+    seen = set()
+    try:
+        for chunk in chunked(read_batch(), Config.BULK_BATCH_SIZE):
+            candidates = []
+            for index, data, error in chunk:
+                error = error or missing_field_error(data, NODE_REQUIRED_FIELDS)
+                # Ids are looked up in sets and dicts, an unhashable one must be reported, not raised
+                error = error or string_field_error(data, NODE_ID_FIELDS)
+                if not error:
+                    error = validate_node_data(data['data_in'], data['data_out'])
+                if not error and data['node_id'] in seen:
+                    error = f"Duplicate node_id '{data['node_id']}' in batch"
+                if error:
+                    errors.append({"index": index, "error": error})
+                    continue
+                seen.add(data['node_id'])
+                candidates.append((index, data))
+
+            # One query for the ids that already exist
+            existing = {node['node_id'] for node in Node.objects(
+                node_id__in=[data['node_id'] for _, data in candidates]
+            ).only('node_id').as_pymongo()}
+
+            docs, indices = [], []
+            for index, data in candidates:
+                if data['node_id'] in existing:
+                    errors.append({"index": index, "error": f"Node '{data['node_id']}' already exists"})
+                    continue
+                node = Node(node_id=data['node_id'], data_in=data['data_in'],
+                            data_out=data['data_out'], paths_in=[], paths_out=[],
+                            graph_id=data.get('graph_id'))
+                try:
+                    node.validate()
+                except ValidationError as e:
+                    errors.append({"index": index, "error": str(e)})
+                    continue
+                docs.append(node.to_mongo().to_dict())
+                indices.append(index)
+
+            positions = insert_documents(Node, docs, indices, errors)
+            chunk_ids = [docs[position]['node_id'] for position in positions]
+            if chunk_ids:
+                bump_graph_versions(chunk_ids)
+            inserted_ids.extend(chunk_ids)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return bulk_response(errors, "node_ids", inserted_ids)
+
+
+@crud_bp.route('/bulk_create_edges', methods=['POST'])
+def bulk_create_edges():
+    """
+    Create many edges in one request. Per chunk of the batch: one query for the
+    referenced nodes, one for existing edge ids, one insert_many for the edges
+    and one bulk_write of $push updates for the nodes' paths_in/paths_out.
+    Invalid items are reported per index without aborting the rest of the batch.
+    """
+    errors = []
+    inserted_ids = []
+    seen = set()
+    try:
+        for chunk in chunked(read_batch(), Config.BULK_BATCH_SIZE):
+            candidates = []
+            for index, data, error in chunk:
+                error = error or missing_field_error(data, EDGE_REQUIRED_FIELDS)
+                error = error or string_field_error(data, EDGE_ID_FIELDS)
+                if not error and data['edge_id'] in seen:
+                    error = f"Duplicate edge_id '{data['edge_id']}' in batch"
+                if error:
+                    errors.append({"index": index, "error": error})
+                    continue
+                seen.add(data['edge_id'])
+                candidates.append((index, data))
+
+            node_ids = {data['src_node'] for _, data in candidates} | {data['dst_node'] for _, data in candidates}
+            nodes = get_nodes(node_ids)
+            existing = {edge['edge_id'] for edge in Edge.objects(
+                edge_id__in=[data['edge_id'] for _, data in candidates]
+            ).only('edge_id').as_pymongo()}
+
+            docs, indices = [], []
+            for index, data in candidates:
+                src_node = nodes.get(data['src_node'])
+                dst_node = nodes.get(data['dst_node'])
+                if data['edge_id'] in existing:
+                    error = f"Edge '{data['edge_id']}' already exists"
+                elif not src_node or not dst_node:
+                    error = "Source or destination node does not exist"
+                else:
+                    error = validate_edge_keys(data['src_to_dst_data_keys'],
+                                               src_node.get('data_out', {}), dst_node.get('data_in', {}))
+                if error:
+                    errors.append({"index": index, "error": error})
+                    continue
+                edge = Edge(edge_id=data['edge_id'], src_node=data['src_node'], dst_node=data['dst_node'],
+                            src_to_dst_data_keys=data['src_to_dst_data_keys'], graph_id=data.get('graph_id'))
+                try:
+                    edge.validate()
+                except ValidationError as e:
+                    errors.append({"index": index, "error": str(e)})
+                    continue
+                docs.append(edge.to_mongo().to_dict())
+                indices.append(index)
+
+            positions = insert_documents(Edge, docs, indices, errors)
+
+            # Append the new edges to the nodes' paths, one update per touched node
+            paths = {}
+            for position in positions:
+                doc = docs[position]
+                paths.setdefault(doc['src_node'], {"paths_out": [], "paths_in": []})["paths_out"].append(doc['edge_id'])
+                paths.setdefault(doc['dst_node'], {"paths_out": [], "paths_in": []})["paths_in"].append(doc['edge_id'])
+            if paths:
+                Node._get_collection().bulk_write([
+                    UpdateOne({"node_id": node_id},
+                              {"$push": {field: {"$each": edge_ids} for field, edge_ids in node_paths.items() if edge_ids}})
+                    for node_id, node_paths in paths.items()
+                ], ordered=False)
+                bump_graph_versions(paths.keys())
+            inserted_ids.extend(docs[position]['edge_id'] for position in positions)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return bulk_response(errors, "edge_ids", inserted_ids)
+
+
 @crud_bp.route('/create_graph', methods=['POST'])
 def create_graph():
     data = request.json
@@ -138,24 +326,120 @@ def create_graph():
     node_ids = data['nodes']
     graph_id = data['graph_id']
 
-    # Validate that all nodes exist
-    nodes = []
+    # Validate that all nodes exist, in one query on the node_id index
+    existing = {node['node_id'] for node in Node.objects(node_id__in=node_ids).only('node_id').as_pymongo()}
     for node_id in node_ids:
-        node = Node.objects(node_id=node_id).first()
-        if not node:
+        if node_id not in existing:
             return jsonify({"error": f"Node with id '{node_id}' does not exist"}), 404
-        nodes.append(node['node_id'])
+    nodes = list(node_ids)
 
     try:
         # Create a new Graph object
-        new_graph = Graph(graph_id=graph_id,nodes=nodes)
+        new_graph = Graph(graph_id=graph_id,nodes=nodes,version=1)
         new_graph.save()  # Save the graph to the database
+        compiled_graphs.invalidate(graph_id)
 
         return jsonify({"message": "Graph created successfully", "graph_id": str(new_graph.id)}), 201
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500  # Handle errors during save
 
+@crud_bp.route('/patch_graph', methods=['POST'])
+def patch_graph():
+    """
+    Apply a batch of edits to a graph: {"graph_id", "ops": [...], "version"?}
+    with ops add_node, remove_node, add_edge, remove_edge and rewire_edge.
+    Every op is validated before anything is written, so an invalid op (400,
+    with its index) applies none of them. The graph's version is compared
+    and set, a concurrent edit or a stale "version" returns 409. A cached
+    compiled graph is updated rather than rebuilt on the next run.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    graph_id = data.get('graph_id')
+    ops = data.get('ops')
+    if not graph_id:
+        return jsonify({"error": "Missing graph_id in request body"}), 400
+    if not isinstance(ops, list) or not ops:
+        return jsonify({"error": "ops must be a non-empty list"}), 400
+
+    members = get_graph_members(graph_id)
+    if members is None:
+        return jsonify({"error": "Graph not found"}), 404
+    node_ids, version = members
+    if data.get('version', version) != version:
+        return jsonify({"error": "Graph version mismatch", "version": version}), 409
+
+    with phase("patch"):
+        try:
+            patch = plan_patch(graph_id, node_ids, ops)
+        except PatchError as e:
+            return jsonify({"error": e.message, "index": e.index}), 400
+        try:
+            new_version = apply_patch(patch, version)
+        except PatchConflict as e:
+            if patch.shared_nodes:
+                bump_graph_versions(patch.shared_nodes, exclude=graph_id)
+            return jsonify({"error": str(e)}), 409
+        if new_version is None:
+            return jsonify({"error": "Graph was modified concurrently, retry"}), 409
+        if patch.shared_nodes:
+            bump_graph_versions(patch.shared_nodes, exclude=graph_id)
+
+        # Carry the compiled graph over to the new version instead of rebuilding it,
+        # unless something else changed the graph while the patch was written
+        compiled = compiled_graphs.get(graph_id, version)
+        if compiled is not None and new_version == version + 2:
+            patched = patch_compiled(compiled, patch, new_version)
+            if patched is not None:
+                compiled_graphs.advance(graph_id, version, new_version, patched)
+
+    return jsonify({"message": "Graph patched successfully", "graph_id": graph_id,
+                    "version": new_version, "applied": len(ops)}), 200
+
+
+@crud_bp.route('/validate_graph', methods=['POST'])
+def validate_graph():
+    """
+    Validate every node schema and every edge of a graph in one pass:
+    {"graph_id", "force"?}. A valid graph is stamped with its version, which
+    is then trusted by runs (SCHEMA_CHECK_RUNS) and by this endpoint, unless
+    "force" is set. Node and edge errors are listed, not returned as a 400.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    graph_id = data.get('graph_id')
+    if not graph_id:
+        return jsonify({"error": "Missing graph_id in request body"}), 400
+
+    members = get_graph_members(graph_id)
+    if members is None:
+        return jsonify({"error": "Graph not found"}), 404
+    node_ids, version = members
+
+    if not data.get('force') and get_validated_version(graph_id) == version:
+        return jsonify({"graph_id": graph_id, "version": version, "cached": True, **VALID_SCHEMA}), 200
+
+    # A compiled copy of this version already holds the nodes and edges
+    compiled = compiled_graphs.get(graph_id, version)
+    with phase("load"):
+        if compiled is not None:
+            nodes, edge_list = compiled.nodes, compiled.edge_list
+        else:
+            nodes = get_nodes(node_ids)
+            edge_list = get_graph_edges(graph_id, nodes.keys())
+    with phase("schema"):
+        schema = validate_schema(nodes, edge_list)
+    if schema["valid"]:
+        mark_validated(graph_id, version)
+    if compiled is not None:
+        compiled.schema = schema
+
+    return jsonify({"graph_id": graph_id, "version": version, "cached": False, **schema}), 200
+
+
 @crud_bp.route('/get_graph', methods=['POST'])
 def get_graph():
     data = request.json
@@ -164,56 +448,96 @@ def get_graph():
     if not graph_id:
         return jsonify({"error": "Missing graph_id in request body"}), 400
 
-    # Fetch the graph by graph_id
-    graph = Graph.objects(graph_id=graph_id).first()
-    
-    if not graph:
+    # Stream one node per line, loading the graph chunk by chunk
+    if wants_ndjson():
+        node_ids = get_graph_node_ids(graph_id)
+        if node_ids is None:
+            return jsonify({"error": "Graph not found"}), 404
+        return ndjson_response(
+            {"node_id": node_id, **entry} for node_id, entry in iter_adjacency_list(node_ids)
+        )
+
+    # Fetch the graph, its nodes and their edges in a fixed number of queries
+    with phase("load"):
+        adjacency_list = load_adjacency_list(graph_id)
+
+    if adjacency_list is None:
         return jsonify({"error": "Graph not found"}), 404
 
-    # Construct the adjacency list
-    adjacency_list = {}
-    print(graph['graph_id'])
-    for node_ref in graph.nodes:
-        # Dereference the node reference to get the actual Node document
-        node = Node.objects(node_id=node_ref.id).first() 
-        print(node['node_id'])
-        # For each node, get its data_in and data_out
-        adjacency_list[node['node_id']] = {
-            "data_in": node.data_in,
-            "data_out": node.data_out,
-            "edges": []  # Initialize empty list for edges
-        }
-
-        # # Collect outgoing edges to build the adjacency representation
-        for edge in node.paths_out:
-            # Fetch the destination node object
-            dst_node = Node.objects(node_id=edge.dst_node).first()
-            if dst_node:
-                # Add the destination node and its data_in and data_out
-                adjacency_list[node.node_id]["edges"].append({
-                    "data_out": dst_node.data_out,
-                    "data_in": dst_node.data_in,
-                    "dst_node": edge.dst_node,
-                })
-
-    return jsonify(adjacency_list), 200
+    with phase("serialize"):
+        return jsonify(adjacency_list), 200
+
+EDGE_LIST_FIELDS = ('edge_id', 'src_node', 'dst_node', 'src_to_dst_data_keys', 'graph_id')
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
 
 @crud_bp.route('/get_edges', methods=['GET'])
 def get_edges():
-    # Fetch all edges from the database
-    edges = Edge.objects()  # Retrieve all Edge documents
-
-    # Format the edges as a list of dictionaries to return as JSON
-    edges_list = []
-    for edge in edges:
-        edges_list.append({
-            "edge_id": edge.edge_id,
-            "src_node": edge.src_node,
-            "dst_node": edge.dst_node,
-            "src_to_dst_data_keys": edge.src_to_dst_data_keys
-        })
-
-    return jsonify(edges_list), 200
+    """
+    List edges, optionally filtered by `src_node`, `dst_node` or `graph_id`, with a
+    `fields` projection (comma separated). Passing `limit` and/or `cursor` switches to
+    keyset pagination on edge_id: the response is {"edges": [...], "next_cursor": ...}
+    and the next page is requested with `cursor=<next_cursor>`.
+    Documents are read raw from the cursor and never hydrated into Edge objects.
+    """
+    args = request.args
+
+    # Projection, edge_id is always returned since it is the pagination key
+    fields = ['edge_id', 'src_node', 'dst_node', 'src_to_dst_data_keys']
+    if args.get('fields'):
+        fields = [field.strip() for field in args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in EDGE_LIST_FIELDS]
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+        if 'edge_id' not in fields:
+            fields.insert(0, 'edge_id')
+
+    # Filters
+    filters = {}
+    if args.get('src_node'):
+        filters['src_node'] = args['src_node']
+    if args.get('dst_node'):
+        filters['dst_node'] = args['dst_node']
+    if args.get('graph_id'):
+        node_ids = get_graph_node_ids(args['graph_id'])
+        if node_ids is None:
+            return jsonify({"error": "Graph not found"}), 404
+        # Same scoping as graph runs: both ends in the graph, untagged or tagged with it
+        filters['graph_id__in'] = [None, args['graph_id']]
+        filters.setdefault('src_node__in', node_ids)
+        filters.setdefault('dst_node__in', node_ids)
+
+    # Keyset pagination
+    paginate = 'limit' in args or 'cursor' in args
+    limit = None
+    if paginate:
+        try:
+            limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+
+    # Fetch one more edge than asked for to know whether there is a next page
+    edges = find_edges(fields, after=args.get('cursor') or None,
+                       limit=limit + 1 if paginate else None, **filters)
+
+    # Stream one edge per line straight from the cursor if asked to
+    if wants_ndjson():
+        if paginate:
+            edges = itertools.islice(edges, limit)
+        return ndjson_response(edges)
+
+    edges_list = list(edges)
+    if not paginate:
+        return jsonify(edges_list), 200
+
+    next_cursor = None
+    if len(edges_list) > limit:
+        edges_list = edges_list[:limit]
+        next_cursor = edges_list[-1]['edge_id']
+    return jsonify({"edges": edges_list, "next_cursor": next_cursor}), 200
 
 
 @crud_bp.route('/', methods=['GET'])
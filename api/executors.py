@@ -0,0 +1,133 @@
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import Config
+
+
+# Propagation work for one node of a level:
+#   (node_id, runtime_data, [(dst_node_id, src_to_dst_data_keys), ...])
+# and the writes it produces, in edge order:
+#   [(dst_node_id, dst_key, value), ...]
+NodeTask = Tuple[str, Dict[str, Any], List[Tuple[str, Dict[str, str]]]]
+Write = Tuple[str, str, Any]
+
+# Optional per-node computation run inside the executor before the node's data
+# is pushed downstream: transform(node_id, runtime_data) -> values to push.
+Transform = Callable[[str, Dict[str, Any]], Dict[str, Any]]
+
+
+def compute_writes(task: NodeTask, transform: Optional[Transform] = None) -> List[Write]:
+    """The writes one node makes to its downstream nodes. Pure, so it can run in any worker."""
+    node_id, runtime_data, out_edges = task
+    values = transform(node_id, runtime_data) if transform is not None else runtime_data
+    writes = []
+    for dst_node_id, src_to_dst_data_keys in out_edges:
+        for src_key, dst_key in src_to_dst_data_keys.items():
+            if src_key in values:
+                writes.append((dst_node_id, dst_key, values[src_key]))
+    return writes
+
+
+def _compute_chunk(tasks: List[NodeTask], transform: Optional[Transform] = None) -> List[List[Write]]:
+    return [compute_writes(task, transform) for task in tasks]
+
+
+class SerialExecutor:
+    """Runs the nodes of a level one after the other on the calling thread."""
+    name = "serial"
+
+    def __init__(self, transform: Optional[Transform] = None, min_level_width: int = 0):
+        self.transform = transform
+        self.min_level_width = min_level_width
+
+    def run_level(self, tasks: List[NodeTask]) -> List[List[Write]]:
+        """Returns the writes of every task, in task order."""
+        return _compute_chunk(tasks, self.transform)
+
+    def shutdown(self) -> None:
+        pass
+
+
+class _PoolExecutor(SerialExecutor):
+    """
+    Runs the nodes of a level concurrently on a pool. Tasks are split into one
+    chunk per worker to keep the per-task overhead low, and results come back
+    in task order so the merge into runtime_data is deterministic.
+    Levels narrower than min_level_width run on the calling thread.
+    """
+    pool_class = None
+
+    def __init__(self, workers: Optional[int] = None, transform: Optional[Transform] = None,
+                 min_level_width: int = 64):
+        super().__init__(transform, min_level_width)
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = self.pool_class(max_workers=self.workers)
+            return self._pool
+
+    def run_level(self, tasks: List[NodeTask]) -> List[List[Write]]:
+        if len(tasks) < max(self.min_level_width, 2) or self.workers < 2:
+            return _compute_chunk(tasks, self.transform)
+
+        size = -(-len(tasks) // self.workers)
+        chunks = [tasks[start:start + size] for start in range(0, len(tasks), size)]
+        compute = functools.partial(_compute_chunk, transform=self.transform)
+        results = []
+        for chunk_writes in self._get_pool().map(compute, chunks):
+            results.extend(chunk_writes)
+        return results
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+class ThreadPoolLevelExecutor(_PoolExecutor):
+    """Thread pool: helps when node work releases the GIL (I/O, hashing, NumPy, ...)."""
+    name = "thread"
+    pool_class = ThreadPoolExecutor
+
+
+class ProcessPoolLevelExecutor(_PoolExecutor):
+    """
+    Process pool: helps for CPU-bound transforms. Tasks and results are pickled,
+    so the transform must be a module-level function and payloads are copied.
+    """
+    name = "process"
+    pool_class = ProcessPoolExecutor
+
+
+EXECUTORS = {
+    "serial": SerialExecutor,
+    "thread": ThreadPoolLevelExecutor,
+    "process": ProcessPoolLevelExecutor
+}
+
+_default_executor = None
+_default_lock = threading.Lock()
+
+
+def get_default_executor() -> Optional[SerialExecutor]:
+    """
+    The executor configured with PROPAGATION_EXECUTOR, shared by all runs of this
+    process. Returns None for "serial", so runs keep the inline propagation path.
+    """
+    global _default_executor
+    if Config.PROPAGATION_EXECUTOR == "serial":
+        return None
+    with _default_lock:
+        if _default_executor is None:
+            _default_executor = EXECUTORS[Config.PROPAGATION_EXECUTOR](
+                workers=Config.PROPAGATION_WORKERS or None,
+                min_level_width=Config.PROPAGATION_MIN_LEVEL_WIDTH
+            )
+        return _default_executor
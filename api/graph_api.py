@@ -1,289 +1,676 @@
-from flask import Flask, request, jsonify,Blueprint
-from flask_mongoengine import MongoEngine
-from typing import Dict, List, Set, Optional, Tuple,Union, Any
-from collections import defaultdict, deque
+from flask import Response, request, jsonify, Blueprint
+from bson import ObjectId
+from typing import Dict, List, Set, FrozenSet, Optional, Tuple, Iterator, Iterable
 from dataclasses import dataclass, field
 from models import *
-from copy import deepcopy
 from config import Config
-import copy
+from .graph_loader import (load_adjacency_list, get_graph_node_ids, get_graph_version,
+                           get_validated_version, get_nodes, get_graph_edges)
+from .graph_cache import compiled_graphs, run_states, estimate_size
+from .result_cache import run_results, result_key
+from .graph_snapshot import load_snapshot, save_snapshot, encode_snapshot
+from .graph_engine import Graph_1
+from .compact_graph import CompactGraph
+from .connectivity import component_report
+from .schema_index import VALID_SCHEMA, validate_schema, mark_validated
+from .streaming import wants_ndjson, ndjson_response
+from .serialization import negotiate
+from .executors import get_default_executor
+from .metrics import phase, record_graph_size
+from .jobs import JobManager, JobCancelled, JobQueueFull, JOB_STORES, job_response
+import itertools
+import threading
+import uuid
 
+# Used by the app, the warmup, /metrics and the benchmarks
+__all__ = ["graph_bp", "GRAPH_BACKENDS", "Graph_1", "get_compiled_graph", "check_schema", "run_jobs"]
 
 graph_bp = Blueprint('graph', __name__)
 
+# Available in-memory graph representations, selected with Config.GRAPH_BACKEND
+GRAPH_BACKENDS = {
+    "dict": Graph_1,
+    "compact": CompactGraph
+}
+
 @graph_bp.route('/graph_run_config', methods=['POST'])
 def process_graph_endpoint():
     data = request.get_json()
     graph_id = data.get("graph_id")
-    input_values = data.get("root_inputs", {})
-    disabled_nodes=data.get("disable_list", [])
-    data_overwrites=data.get("data_overwrites", {})
-    edge_list=get_edges()
-    edge_list = copy.deepcopy(edge_list)
-    # Fetch the adjacancy list from the graph_id from the nodes and edges saved in database
-    adjacency_list = get_graph(graph_id)
-    adjacency_list = copy.deepcopy(adjacency_list)
-    
-     # Overwrite the adjacency list as per the data_overwrites field of graph run config
-    for node_key, new_data_in in data_overwrites.items():
-        if node_key in adjacency_list:
-            adjacency_list[node_key]["data_in"] = new_data_in
-    
-    for node, details in adjacency_list.items():
-        for edge in details.get("edges", []):
-            dst_node = edge.get("dst_node")
-            # Check if the `dst_node` is in `data_overwrites` and update `data_in` accordingly
-            if dst_node in data_overwrites:
-                edge["data_in"] = data_overwrites[dst_node]
-    
-    # Remove the nodes and edges from adjacancy list as per the disabled_nodes field of graph run config
-    for i in disabled_nodes:
-        edge_list = [edge for edge in edge_list if edge["src_node"] != i]
-        edge_list = [edge for edge in edge_list if edge["dst_node"] != i]
-        for node, details in adjacency_list.items():
-                details["edges"] = [edge for edge in details["edges"] if edge["dst_node"] != i]
-        if i in adjacency_list:
-            adjacency_list.pop(i)
-    key = next(iter(input_values.keys()))
-    
-    # Check whether input_data given is on root node or not
-    check_is_root_node = all(edge["dst_node"] != key for edge in edge_list)
-    
-    if check_is_root_node:
-        graph = Graph_1()
-        
-        # Add node from adjacancy list
-        for node_id, node_data in adjacency_list.items():
-            graph.add_node(str(node_id), node_data)
-            
-        # Add edges from edge list
-        for edge_data in edge_list:
-            graph.add_edge(edge_data)
-        
-        # Check if there is more than one island in graph
-        connectivity=graph.is_connected()
-        if connectivity== False:
-            return jsonify({"Result": "ISLANDS DETECTED"}), 200  
-        
-        # Check if there is cycle in graph 
-        topo_order,cyclic=graph.process_graph()
-        if cyclic==False:
-            return jsonify({"Result": "CYCLE DETECTED"}), 200
-    
-         
-        # Set initial input values for specified nodes
-        for node_id, values in input_values.items():
-            if node_id in graph.nodes:
-                for key, value in values.items():
-                    graph.set_node_data(node_id, key, value)
-        
-        # Run the transversal for making data transfer
-        graph.propagate_data()
-        
-        # Get data_in and data_out at all the nodes
-        all_nodes = graph.get_all_nodes()
-        return jsonify({"Toposort":topo_order,
-                        "Data":all_nodes}), 200
-    else:
-        return jsonify({"Result": "IT IS NOT A ROOT NODE"}), 200
-
-
-# Type definitions
-DataType = Union[int, str, bool, list, dict]
 
-@dataclass
-class Edge_1:
-    """Represents an edge in the graph with its properties."""
-    edge_id: str
-    src_node: str
-    dst_node: str
-    src_to_dst_data_keys: Dict[str, str]
+    if not graph_id:
+        return jsonify({"error": "Missing graph_id in request body"}), 400
+
+    config, error = parse_run_config(data)
+    if error:
+        return jsonify({"error": error}), 400
+    input_values = config["root_inputs"]
+    disabled_nodes = config["disable_list"]
+    data_overwrites = config["data_overwrites"]
+    outputs = config["outputs"]
+
+    # Run in the background and let the client poll /graph/jobs/<job_id>
+    if data.get("async"):
+        try:
+            job = run_jobs.submit(graph_id, config)
+        except JobQueueFull:
+            return jsonify({"error": "Job queue is full, retry later"}), 503
+        response = jsonify(job_response(job))
+        response.headers["Location"] = f"{request.script_root}/graph/jobs/{job['job_id']}"
+        return response, 202
+
+    # Stream one node per line as the topological levels are propagated
+    if wants_ndjson():
+        compiled = get_compiled_graph(graph_id)
+        if compiled is None:
+            return jsonify({"error": "Graph not found"}), 404
+        run, topo_order, result = prepare_run(compiled, input_values, disabled_nodes, data_overwrites,
+                                              outputs=outputs)
+        if result is not None:
+            return jsonify(result), 200
+        return ndjson_response(iter_run_records(run, topo_order, outputs))
+
+    # Identical configs of the same graph version are answered with the memoized response
+    if Config.RESULT_CACHE and not data.get("keep_state"):
+        with phase("version"):
+            version = get_graph_version(graph_id)
+        if version is None:
+            return jsonify({"error": "Graph not found"}), 404
+        fmt = negotiate()
+
+        def compute():
+            compiled = get_compiled_graph(graph_id, version)
+            if compiled is None:
+                return fmt.encode({"error": "Graph not found"}), 404
+            result, status = run_compiled_graph(compiled, input_values, disabled_nodes, data_overwrites,
+                                                outputs=outputs)
+            with phase("serialize"):
+                return fmt.encode(result), status
+
+        body, status, source = run_results.get_or_compute(
+            graph_id, version, result_key(graph_id, version, config, fmt.name), compute)
+        response = Response(body, status=status, mimetype=fmt.mimetype)
+        response.headers["X-Result-Cache"] = source
+        return response
+
+    # Reuse the compiled graph if it hasn't changed since the last run
+    compiled = get_compiled_graph(graph_id)
+    if compiled is None:
+        return jsonify({"error": "Graph not found"}), 404
+
+    result, status = run_compiled_graph(compiled, input_values, disabled_nodes, data_overwrites,
+                                        keep_state=bool(data.get("keep_state")), outputs=outputs)
+    with phase("serialize"):
+        return jsonify(result), status
+
+
+@graph_bp.route('/graph_run_incremental', methods=['POST'])
+def process_graph_incremental_endpoint():
+    """
+    Re-run a run that was made with "keep_state": true, changing some of its
+    root_inputs and/or data_overwrites (each given node's entry replaces the
+    previous one). Only the nodes downstream of a changed root input, and the
+    nodes whose overwrite changed, are recomputed; only the nodes whose data
+    changed are returned. The run state is updated, so edits can be chained.
+    """
+    data = request.get_json()
+    graph_id = data.get("graph_id")
+    run_id = data.get("run_id")
+
+    if not graph_id or not run_id:
+        return jsonify({"error": "Missing graph_id or run_id in request body"}), 400
+
+    changes = {key: data.get(key) or {} for key in ("root_inputs", "data_overwrites")}
+    for key, values in changes.items():
+        if not isinstance(values, dict) or not all(isinstance(value, dict) for value in values.values()):
+            return jsonify({"error": f"{key} must map node ids to objects"}), 400
+
+    version = get_graph_version(graph_id)
+    if version is None:
+        return jsonify({"error": "Graph not found"}), 404
+
+    # States are keyed by the graph version they ran against, edits to the graph drop them
+    state = run_states.get(run_id, version)
+    if state is None or state.compiled.graph_id != graph_id:
+        return jsonify({"error": "Run state not found, it expired or the graph changed since the run"}), 404
+
+    with state.lock:
+        result = rerun_incremental(state, changes["root_inputs"], changes["data_overwrites"])
+    result["RunId"] = run_id
+    return jsonify(result), 200
+
+
+@graph_bp.route('/graph_run_batch', methods=['POST'])
+def process_graph_batch_endpoint():
+    """
+    Run many run configs against one graph. The graph is loaded and compiled once
+    and its topology is shared by all runs (including the graphs rebuilt for a
+    given disable_list). Each entry of `runs` is either a run config object or
+    {"run_config_id": ...} referring to a saved GraphRunConfig. With "save": true
+    the inline configs are stored as GraphRunConfig documents.
+    Returns one result per run, in order.
+    """
+    data = request.get_json()
+    graph_id = data.get("graph_id")
+    runs = data.get("runs")
+
+    if not graph_id:
+        return jsonify({"error": "Missing graph_id in request body"}), 400
+    if not isinstance(runs, list) or not runs:
+        return jsonify({"error": "runs must be a non-empty list of run configs"}), 400
+
+    # Load any saved run configs in one query; malformed ids are reported per run below
+    saved_ids = [run["run_config_id"] for run in runs
+                 if isinstance(run, dict) and is_object_id(run.get("run_config_id"))]
+    saved = {}
+    if saved_ids:
+        saved = {str(doc["_id"]): doc for doc in
+                 GraphRunConfig.objects(id__in=saved_ids).as_pymongo()}
+
+    configs = []
+    for run in runs:
+        if isinstance(run, dict) and run.get("run_config_id"):
+            run_config_id = run["run_config_id"]
+            if not is_object_id(run_config_id):
+                configs.append((run_config_id, None, "Invalid run_config_id"))
+                continue
+            doc = saved.get(run_config_id)
+            if doc is None:
+                configs.append((run_config_id, None, "Run config not found"))
+                continue
+            if doc.get("graph_id") and doc["graph_id"] != graph_id:
+                configs.append((run_config_id, None, f"Run config belongs to graph '{doc['graph_id']}'"))
+                continue
+            config, error = parse_run_config(doc)
+            configs.append((run_config_id, config, error))
+        else:
+            config, error = parse_run_config(run)
+            configs.append((None, config, error))
+
+    compiled = get_compiled_graph(graph_id)
+    if compiled is None:
+        return jsonify({"error": "Graph not found"}), 404
+
+    # Save the valid inline configs with a single insert
+    if data.get("save"):
+        to_save = [index for index, (run_config_id, config, error) in enumerate(configs)
+                   if run_config_id is None and error is None]
+        if to_save:
+            docs = [GraphRunConfig(graph_id=graph_id, **configs[index][1]).to_mongo().to_dict()
+                    for index in to_save]
+            GraphRunConfig._get_collection().insert_many(docs)
+            for index, doc in zip(to_save, docs):
+                configs[index] = (str(doc["_id"]), configs[index][1], None)
+
+    topologies = {}
+    results = []
+    for index, (run_config_id, config, error) in enumerate(configs):
+        entry = {"index": index}
+        if run_config_id is not None:
+            entry["run_config_id"] = run_config_id
+        if error:
+            entry.update({"status": 400, "result": {"error": error}})
+        else:
+            result, status = run_compiled_graph(compiled, config["root_inputs"], config["disable_list"],
+                                                config["data_overwrites"], topologies, outputs=config["outputs"])
+            entry.update({"status": status, "result": result})
+        results.append(entry)
+
+    return jsonify({"graph_id": graph_id, "results": results}), 200
+
+
+@graph_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_run_job(job_id):
+    """
+    Status of an async run, with its result once it succeeded. `?wait=<seconds>`
+    long-polls until the job finishes (capped at JOB_MAX_WAIT).
+    """
+    try:
+        wait = min(float(request.args.get('wait', 0)), Config.JOB_MAX_WAIT)
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+
+    job = run_jobs.get(job_id, wait)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_response(job)), 200
+
+
+@graph_bp.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_run_job(job_id):
+    """Cancel a queued or running job. A running job stops between two topological levels."""
+    if not run_jobs.cancel(job_id):
+        job = run_jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify({"error": f"Job already {job['status']}"}), 409
+    return jsonify(job_response(run_jobs.get(job_id))), 202
+
+
+@graph_bp.route('/jobs/stats', methods=['GET'])
+def run_job_stats():
+    return jsonify(run_jobs.stats()), 200
+
+
+def is_object_id(value) -> bool:
+    """Whether `value` is an ObjectId in its 24 hex digit string form."""
+    return isinstance(value, str) and ObjectId.is_valid(value)
+
+
+def parse_run_config(data) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Extract root_inputs, disable_list, data_overwrites and outputs from a run config.
+    Returns (config, None) or (None, error message).
+    """
+    if not isinstance(data, dict):
+        return None, "Run config must be an object"
+    config = {
+        "root_inputs": data.get("root_inputs") or {},
+        "disable_list": data.get("disable_list") or [],
+        "data_overwrites": data.get("data_overwrites") or {},
+        "outputs": data.get("outputs") or None  # None: every node
+    }
+    if not config["root_inputs"]:
+        return None, "Missing root_inputs in request body"
+    for key in ("root_inputs", "data_overwrites"):
+        if not isinstance(config[key], dict) or not all(
+                isinstance(values, dict) for values in config[key].values()):
+            return None, f"{key} must map node ids to objects"
+    if not isinstance(config["disable_list"], list):
+        return None, "disable_list must be a list"
+    if config["outputs"] is not None and (not isinstance(config["outputs"], list) or not all(
+            isinstance(node_id, str) for node_id in config["outputs"])):
+        return None, "outputs must be a list of node ids"
+    return config, None
+
+
+@graph_bp.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(compiled_graphs.stats()), 200
+
+
+def compile_graph(node_ids: List[str], nodes: Dict[str, dict], edge_list: List[dict]) -> "Graph_1":
+    """Build a graph with the configured backend from loaded nodes and edges."""
+    graph = GRAPH_BACKENDS[Config.GRAPH_BACKEND]()
+
+    # Add node from the loaded node documents
+    for node_id in node_ids:
+        if node_id in nodes:
+            graph.add_node(str(node_id), nodes[node_id])
+
+    # Add edges from edge list
+    for edge_data in edge_list:
+        graph.add_edge(edge_data)
+    return graph
+
+
+def get_compiled_graph(graph_id: str, version: Optional[int] = None) -> Optional["CompiledGraph"]:
+    """
+    Returns the compiled graph for the current version of graph_id (or for
+    `version` when the caller already read it), loading, building and
+    validating it only on a cache miss. Returns None if the graph does not exist.
+    """
+    # Read the version before the data, so the cached data is never older than its key
+    if version is None:
+        with phase("version"):
+            version = get_graph_version(graph_id)
+    if version is None:
+        return None
+
+    compiled = compiled_graphs.get(graph_id, version)
+    if compiled is not None:
+        return compiled
+
+    # One read when a snapshot of this version exists, otherwise load and build it
+    if Config.GRAPH_SNAPSHOTS:
+        with phase("snapshot"):
+            snapshot = load_snapshot(graph_id, version)
+        if snapshot is not None:
+            record_graph_size(len(snapshot["nodes"]), len(snapshot["edge_list"]))
+            with phase("build"):
+                graph = compile_graph(snapshot["node_ids"], snapshot["nodes"], snapshot["edge_list"])
+            compiled = CompiledGraph(graph_id=graph_id, version=version, graph=graph, **snapshot)
+            compiled_graphs.put(graph_id, version, compiled)
+            return compiled
+
+    # Fetch only the nodes and edges of the requested graph
+    with phase("load"):
+        node_ids = get_graph_node_ids(graph_id)
+        if node_ids is None:
+            return None
+        nodes = get_nodes(node_ids)
+        edge_list = get_edges(graph_id, nodes.keys())
+    record_graph_size(len(nodes), len(edge_list))
+
+    with phase("build"):
+        graph = compile_graph(node_ids, nodes, edge_list)
+    with phase("connectivity"):
+        connected = graph.is_connected()
+    with phase("toposort"):
+        topo_order, is_not_cyclic = graph.process_graph()
+
+    compiled = CompiledGraph(
+        graph_id=graph_id,
+        version=version,
+        node_ids=node_ids,
+        nodes=nodes,
+        edge_list=edge_list,
+        graph=graph,
+        connected=connected,
+        topo_order=topo_order,
+        is_not_cyclic=is_not_cyclic
+    )
+    if Config.GRAPH_SNAPSHOTS:
+        with phase("snapshot"):
+            try:
+                data = encode_snapshot(node_ids, nodes, edge_list, connected, topo_order, is_not_cyclic)
+            except (TypeError, ValueError):
+                data = None  # Node data that isn't JSON serialisable, keep loading this graph from the collections
+            if data is not None:
+                save_snapshot(graph_id, version, data)
+    compiled_graphs.put(graph_id, version, compiled)
+    return compiled
+
+
+def get_topology(compiled: "CompiledGraph", disabled_nodes: List[str], topologies: Optional[dict] = None
+                 ) -> Tuple[Graph_1, bool, List[List[str]], bool, FrozenSet[str]]:
+    """
+    Returns (graph, is_connected, topo_order, is_not_cyclic, roots) for the
+    compiled graph with the given nodes disabled. `topologies` can be passed to
+    reuse the graphs built for the same disable_list across the runs of a batch.
+    """
+    nodes = compiled.graph.nodes
+    disabled = frozenset(node_id for node_id in disabled_nodes if node_id in nodes)
+    if not disabled:
+        return compiled.graph, compiled.connected, compiled.topo_order, compiled.is_not_cyclic, compiled.roots
+
+    if topologies is not None and disabled in topologies:
+        return topologies[disabled]
+
+    # Disabled nodes are masked out of the shared compiled graph, nothing is rebuilt
+    graph = compiled.graph.overlay(disabled)
+    topo_order, cyclic = graph.process_graph()
+    topology = (graph, graph.is_connected(), topo_order, cyclic, root_set(topo_order))
+
+    if topologies is not None:
+        topologies[disabled] = topology
+    return topology
+
+
+def prepare_run(compiled: "CompiledGraph", input_values: dict, disabled_nodes: List[str],
+                data_overwrites: dict, topologies: Optional[dict] = None, outputs: Optional[List[str]] = None
+                ) -> Tuple[Optional[Graph_1], Optional[List[List[str]]], Optional[dict]]:
+    """
+    Validate a run config against a compiled graph and set up its run copy.
+    Returns (run, topo_order, None), or (None, None, result) when the run is
+    rejected (inputs on non-root nodes, islands, cycle, invalid schemas with
+    SCHEMA_CHECK_RUNS). With `outputs`,
+    topo_order only holds the nodes those outputs depend on, so nothing else
+    is propagated.
+    """
+    with phase("topology"):
+        graph, connectivity, topo_order, cyclic, roots = get_topology(compiled, disabled_nodes, topologies)
+
+    # Every input must be given on a root node
+    not_roots = non_root_inputs(graph, roots, input_values)
+    if not_roots:
+        return None, None, {"Result": "IT IS NOT A ROOT NODE", "Nodes": not_roots}
+
+    # Check if there is more than one island in graph
+    if connectivity == False:
+        return None, None, {"Result": "ISLANDS DETECTED",
+                            "Components": component_report(graph.connected_components())}
+
+    # Check if there is cycle in graph
+    if cyclic == False:
+        return None, None, {"Result": "CYCLE DETECTED"}
+
+    # Node and edge schemas, checked once per graph version
+    if Config.SCHEMA_CHECK_RUNS:
+        schema = check_schema(compiled)
+        if not schema["valid"]:
+            return None, None, {"Result": "SCHEMA ERRORS", "NodeErrors": schema["node_errors"],
+                                "EdgeErrors": schema["edge_errors"]}
+
+    # Only the ancestors of the requested outputs need to be propagated
+    if outputs is not None:
+        with phase("prune"):
+            required = graph.upstream_cone(outputs)
+            topo_order = prune_levels(topo_order, required)
+
+    # Work on a copy of the node data, the compiled topology is shared between runs
+    with phase("fork"):
+        run = graph.fork(data_overwrites)
+
+    # Set initial input values for specified nodes
+    for node_id, values in input_values.items():
+        if run.is_active(node_id):
+            for key, value in values.items():
+                run.set_node_data(node_id, key, value)
+
+    return run, topo_order, None
+
+
+def check_schema(compiled: "CompiledGraph") -> dict:
+    """
+    The validate_schema() report of a compiled graph, computed on its first
+    checked run. A version already stamped as validated is trusted as is.
+    """
+    if compiled.schema is None:
+        with phase("schema"):
+            if get_validated_version(compiled.graph_id) == compiled.version:
+                schema = VALID_SCHEMA
+            else:
+                schema = validate_schema(compiled.nodes, compiled.edge_list)
+                if schema["valid"]:
+                    mark_validated(compiled.graph_id, compiled.version)
+        compiled.schema = schema
+    return compiled.schema
+
+
+def run_compiled_graph(compiled: "CompiledGraph", input_values: dict,
+                       disabled_nodes: List[str], data_overwrites: dict,
+                       topologies: Optional[dict] = None, keep_state: bool = False,
+                       outputs: Optional[List[str]] = None) -> Tuple[dict, int]:
+    """
+    Run one graph run config against a compiled graph.
+    Returns the response body and status code. With keep_state, the finished
+    run is kept for incremental re-runs and its id is returned as "RunId".
+    With `outputs`, only their ancestors are propagated and only they are
+    returned; a kept run is still propagated in full so it can be re-run.
+    """
+    run, topo_order, result = prepare_run(compiled, input_values, disabled_nodes, data_overwrites,
+                                          topologies, outputs=None if keep_state else outputs)
+    if result is not None:
+        return result, 200
+
+    # Run the transversal for making data transfer
+    with phase("propagate"):
+        run.propagate_data(topo_order, executor=get_default_executor())
+
+    # Get data_in and data_out at all the nodes
+    with phase("collect"):
+        all_nodes = run.get_all_nodes(outputs)
+    result = {"Toposort": topo_order,
+              "Data": all_nodes}
+    if keep_state:
+        result["RunId"] = save_run_state(compiled, run, topo_order, input_values, data_overwrites)
+    return result, 200
+
+
+def save_run_state(compiled: "CompiledGraph", run: Graph_1, topo_order: List[List[str]],
+                   input_values: dict, data_overwrites: dict) -> str:
+    """Keep a finished run for incremental re-runs. Returns its run id."""
+    run_id = uuid.uuid4().hex
+    state = RunState(
+        compiled=compiled,
+        run=run,
+        topo_order=topo_order,
+        root_inputs=dict(input_values),
+        data_overwrites=dict(data_overwrites),
+        roots=root_set(topo_order)
+    )
+    # Only the node data belongs to the state, the topology is shared with the compiled graph
+    run_states.put(run_id, compiled.version, state, estimate_size(list(run.nodes.values())))
+    return run_id
+
+
+def rerun_incremental(state: "RunState", input_values: dict, data_overwrites: dict) -> dict:
+    """
+    Apply changed root inputs and data overwrites to a kept run. The affected
+    nodes are reset to their initial data and recomputed in topological order
+    from their incoming edges, giving the same data as a full run with the
+    merged run config. Returns the nodes whose data changed.
+    """
+    run, base = state.run, state.compiled.graph
+
+    inputs_changed = [node_id for node_id, values in input_values.items()
+                      if run.is_active(node_id) and state.root_inputs.get(node_id) != values]
+    overwrites_changed = [node_id for node_id, values in data_overwrites.items()
+                          if run.is_active(node_id) and state.data_overwrites.get(node_id) != values]
+
+    not_roots = non_root_inputs(run, state.roots, inputs_changed)
+    if not_roots:
+        return {"Result": "IT IS NOT A ROOT NODE", "Nodes": not_roots}
+
+    state.root_inputs.update(input_values)
+    state.data_overwrites.update(data_overwrites)
+
+    if state.in_edges is None:
+        state.in_edges = run.in_edge_index(state.topo_order)
+        state.positions = {node_id: position for position, node_id
+                           in enumerate(itertools.chain.from_iterable(state.topo_order))}
+
+    # A changed input flows downstream, a changed overwrite only affects its own node
+    affected = run.downstream_cone(inputs_changed) | set(overwrites_changed)
+    order = sorted(affected, key=state.positions.__getitem__)
+
+    before = {}
+    for node_id in order:
+        output = run.get_node_output(node_id)
+        before[node_id] = {"data_in": dict(output["data_in"]), "data_out": dict(output["data_out"])}
+
+    for node_id in order:
+        node, base_node = run.nodes[node_id], base.nodes[node_id]
+        node.data_in = dict(state.data_overwrites.get(node_id, base_node.data_in))
+        node.data_out = dict(base_node.data_out)
+        node.runtime_data = dict(state.root_inputs.get(node_id, {}))
+        run.pull_data(node_id, state.in_edges.get(node_id, ()))
+
+    changed = {}
+    for node_id in order:
+        output = run.get_node_output(node_id)
+        if output != before[node_id]:
+            changed[node_id] = output
+    return {"Recomputed": len(order), "Data": changed}
+
+
+def execute_run_job(job: dict, is_cancelled) -> Tuple[dict, int]:
+    """Runner of the async jobs: run_compiled_graph, checking for cancellation between levels."""
+    config = job["config"]
+    compiled = get_compiled_graph(job["graph_id"])
+    if compiled is None:
+        return {"error": "Graph not found"}, 404
+
+    run, topo_order, result = prepare_run(compiled, config["root_inputs"], config["disable_list"],
+                                          config["data_overwrites"], outputs=config.get("outputs"))
+    if result is not None:
+        return result, 200
+
+    for _ in run.propagate_levels(topo_order, get_default_executor()):
+        if is_cancelled():
+            raise JobCancelled()
+
+    return {"Toposort": topo_order,
+            "Data": run.get_all_nodes(config.get("outputs"))}, 200
+
+
+# Background runs, bounded by JOB_WORKERS so they can't take every request thread
+run_jobs = JobManager(
+    execute_run_job,
+    JOB_STORES[Config.JOB_STORE],
+    workers=Config.JOB_WORKERS,
+    max_queue=Config.JOB_QUEUE_SIZE
+)
+
+
+def iter_run_records(run: Graph_1, topo_order: List[List[str]],
+                     outputs: Optional[List[str]] = None) -> Iterator[dict]:
+    """
+    Yields one record per node (or per requested output), level by level,
+    as soon as the node's data is final.
+    """
+    wanted = set(outputs) if outputs is not None else None
+    for level_index, level in run.propagate_levels(topo_order, get_default_executor()):
+        for node_id in level:
+            if wanted is None or node_id in wanted:
+                yield {"level": level_index, "node_id": node_id, **run.get_node_output(node_id)}
+
+
+def root_set(topo_order: List[List[str]]) -> FrozenSet[str]:
+    """The nodes without incoming edges from enabled nodes, which make up the first topological level."""
+    return frozenset(topo_order[0]) if topo_order else frozenset()
+
+
+def non_root_inputs(graph: Graph_1, roots: FrozenSet[str], node_ids: Iterable[str]) -> List[str]:
+    """
+    The given nodes that have incoming edges, sorted. Ids that are not
+    (enabled) nodes of the graph are accepted and ignored, as in a run.
+    """
+    return sorted(node_id for node_id in node_ids if node_id not in roots and graph.is_active(node_id))
+
+
+def prune_levels(topo_order: List[List[str]], required: Set[str]) -> List[List[str]]:
+    """The topological levels restricted to the required nodes, without the levels left empty."""
+    levels = [[node_id for node_id in level if node_id in required] for level in topo_order]
+    return [level for level in levels if level]
+
 
 @dataclass
-class Node_1:
-    """Represents a node in the graph with its properties."""
-    node_id: str
-    data_in: Dict[str, str] = field(default_factory=dict)
-    data_out: Dict[str, str] = field(default_factory=dict)
-    runtime_data: Dict[str, Any] = field(default_factory=dict)
-
-class Graph_1:
-    """A directed graph implementation with support for topological sorting and data flow."""
-    
-    def __init__(self):
-        self.nodes: Dict[str, Node_1] = {}
-        self.edges: Dict[str, Edge_1] = {}
-        self.directed_adj: Dict[str, List[str]] = defaultdict(list)
-        self.undirected_adj: Dict[str, List[str]] = defaultdict(list)
-        self.indegree: Dict[str, int] = defaultdict(int)
-        self.dependent_on: Dict[str, str] = {}
-
-    def add_node(self, node_id: str, node_data: dict) -> bool:
-        """
-        Add a new node to the graph.
-        Returns True if successful, False if node already exists.
-        """
-        if node_id in self.nodes:
-            return False
-        
-        node = Node_1(
-            node_id=node_id,
-            data_in=node_data.get('data_in', {}),
-            data_out=node_data.get('data_out', {})
-        )
-        self.nodes[node_id] = node
-        return True
+class CompiledGraph:
+    """A loaded, built and validated graph, shared between runs of the same graph version."""
+    graph_id: str
+    version: int
+    node_ids: List[str]
+    nodes: Dict[str, dict]
+    edge_list: List[dict]
+    graph: Graph_1
+    connected: bool
+    topo_order: List[List[str]]
+    is_not_cyclic: bool
+    levels: Optional[Dict[str, int]] = None  # node_id -> depth in topo_order, kept by patches
+    schema: Optional[dict] = None  # validate_schema() report, once checked
+    roots: FrozenSet[str] = field(init=False)
 
-    
+    def __post_init__(self):
+        # Derived once per graph version, inputs are checked against it in O(1) each
+        self.roots = root_set(self.topo_order)
 
-    def add_edge(self, edge_data: dict) -> bool:
-        """
-        Add a new edge to the graph.
-        Returns True if successful, False if edge already exists or nodes don't exist.
-        """
-        edge_id = edge_data['edge_id']
-        src_node = edge_data['src_node']
-        dst_node = edge_data['dst_node']
-        
-        if (edge_id in self.edges or 
-            src_node not in self.nodes or 
-            dst_node not in self.nodes):
-            return False
-
-        edge = Edge_1(
-            edge_id=edge_id,
-            src_node=src_node,
-            dst_node=dst_node,
-            src_to_dst_data_keys=edge_data['src_to_dst_data_keys']
-        )
-        
-        self.edges[edge_id] = edge
-        self.directed_adj[src_node].append(dst_node)
-        self.undirected_adj[src_node].append(dst_node)
-        self.undirected_adj[dst_node].append(src_node)
-        self.indegree[dst_node] += 1
-        
-        return True
-
-
-    def is_connected(self) -> bool:
-        """Check if the graph is connected."""
-        if not self.nodes:
-            return True
-            
-        start_node = next(iter(self.nodes))
-        visited = set()
-        
-        def dfs(node: str):
-            visited.add(node)
-            for neighbor in self.undirected_adj[node]:
-                if neighbor not in visited:
-                    dfs(neighbor)
-        
-        dfs(start_node)
-        return len(visited) == len(self.nodes)
-    
-    def get_all_nodes(self) -> Dict[str, Node_1]:
-        """Returns all nodes as Node objects."""
-        updated_nodes = {}
-        
-        for node_id, node in self.nodes.items():
-            # Update data_in and data_out with values from runtime_data, setting unmatched keys to None
-            for key in node.data_in:
-                node.data_in[key] = node.runtime_data.get(key, None)
-            for key in node.data_out:
-                node.data_out[key] = node.runtime_data.get(key, None)
-            
-            # Remove runtime_data from the node
-            updated_nodes[node_id] = {
-                "data_in": node.data_in,
-                "data_out": node.data_out
-            }
-        
-        return updated_nodes
-    
-    def propagate_data(self):
-        """Propagate data from each node's data_out to the data_in of downstream nodes."""
-        topo_order, is_not_cyclic = self.process_graph()
-        if not is_not_cyclic:
-            print("Error: Cycle detected")
-            return False
-        
-        # Perform data propagation
-        for level in topo_order:
-            for node_id in level:
-                node = self.nodes[node_id]
-                
-                # Propagate data_out to connected nodes' data_in
-                for dst_node_id in self.directed_adj[node_id]:
-                    dst_node = self.nodes[dst_node_id]
-                    edge = next(
-                        (e for e in self.edges.values() if e.src_node == node_id and e.dst_node == dst_node_id),
-                        None
-                    )
-                    if edge:
-                        for src_key, dst_key in edge.src_to_dst_data_keys.items():
-                            if src_key in node.runtime_data:
-                                value = node.runtime_data[src_key]
-                                dst_node.data_in[dst_key] = value
-                                dst_node.runtime_data[dst_key] = value
-                                dst_node.data_out[dst_key] = value
-    def process_graph(self) -> Tuple[List[List[str]], bool]:
-        """
-        Process the graph to get topological ordering and check for cycles.
-        Returns (topological_order, is_not_cyclic).
-        """
-        topo_order = []
-        is_not_cyclic = True
-        indegree_copy = deepcopy(self.indegree)
-        
-        current_nodes = [
-            node_id for node_id in self.nodes 
-            if indegree_copy[node_id] == 0
-        ]
-        
-        while current_nodes:
-            current_level_nodes = []
-            future_nodes = []
-            
-            current_nodes.sort()  # Lexicographical ordering
-            
-            while current_nodes:
-                current_node = current_nodes.pop()
-                current_level_nodes.append(current_node)
-            
-                for neighbor in self.directed_adj[current_node]:
-                    indegree_copy[neighbor] -= 1
-                    if indegree_copy[neighbor] == 0:
-                        self.dependent_on[neighbor] = current_node
-                        future_nodes.append(neighbor)
-            
-            topo_order.append(current_level_nodes)
-            current_nodes.extend(sorted(future_nodes))
-                
-        # Check for cycles
-        is_not_cyclic = all(indegree_copy[node_id] == 0 for node_id in self.nodes)
-                
-        return topo_order, is_not_cyclic
-    
 
-    def set_node_data(self, node_id: str, data_key: str, value: Any) -> bool:
-        """Set runtime data for a node."""
-        if node_id not in self.nodes:
-            return False
-        self.nodes[node_id].runtime_data[data_key] = value
-        return True
-    
+@dataclass
+class RunState:
+    """A finished run kept for incremental re-runs, along with its merged run config."""
+    compiled: CompiledGraph
+    run: Graph_1
+    topo_order: List[List[str]]
+    root_inputs: dict
+    data_overwrites: dict
+    roots: FrozenSet[str] = frozenset()
+    in_edges: Optional[Dict[str, list]] = None  # Built on the first incremental re-run
+    positions: Optional[Dict[str, int]] = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
 
-def get_edges():
-    edges = Edge.objects()  
+def get_edges(graph_id, node_ids):
+    # Only the edges of this graph are read, through the graph-scoped index
+    edges = get_graph_edges(graph_id, node_ids)
     edges_list = []
     for edge in edges:
         edges_list.append({
-            "dst_node": edge.dst_node,
-            "edge_id": edge.edge_id,
-            "src_node": edge.src_node,
-            "src_to_dst_data_keys": edge.src_to_dst_data_keys
+            "dst_node": edge["dst_node"],
+            "edge_id": edge["edge_id"],
+            "src_node": edge["src_node"],
+            "src_to_dst_data_keys": edge.get("src_to_dst_data_keys", {})
         })
 
     return(edges_list)
@@ -294,35 +681,11 @@ def get_graph(graph_id):
     if not graph_id:
         return jsonify({"error": "Missing graph_id in request body"}), 400
 
-    # Fetch the graph by graph_id
-    graph = Graph.objects(graph_id=graph_id).first()
-    
-    if not graph:
-        return jsonify({"error": "Graph not found"}), 404
+    # Fetch the graph, its nodes and their edges in a fixed number of queries
+    adjacency_list = load_adjacency_list(graph_id)
 
-    # Construct the adjacency list
-    adjacency_list = {}
-    for node_ref in graph.nodes:
-        # Dereference the node reference to get the actual Node document
-        node = Node.objects(node_id=node_ref.id).first() 
-        # For each node, get its data_in and data_out
-        adjacency_list[node['node_id']] = {
-            "data_in": node.data_in,
-            "data_out": node.data_out,
-            "edges": []  # Initialize empty list for edges
-        }
-
-        # # Collect outgoing edges to build the adjacency representation
-        for edge in node.paths_out:
-            # Fetch the destination node object
-            dst_node = Node.objects(node_id=edge.dst_node).first()
-            if dst_node:
-                # Add the destination node and its data_in and data_out
-                adjacency_list[node.node_id]["edges"].append({
-                    "data_out": dst_node.data_out,
-                    "data_in": dst_node.data_in,
-                    "dst_node": edge.dst_node,
-                })
+    if adjacency_list is None:
+        return jsonify({"error": "Graph not found"}), 404
 
     return (adjacency_list)
 
@@ -0,0 +1,148 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from config import Config
+
+
+def estimate_size(obj: Any) -> int:
+    """
+    Approximate deep size of an object in bytes.
+    Shared objects are only counted once; the walk is iterative so very
+    large graphs don't hit the recursion limit.
+    """
+    seen = set()
+    stack = [obj]
+    size = 0
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, type):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif hasattr(current, '__dict__'):
+            stack.append(vars(current))
+        if hasattr(current, '__slots__'):
+            stack.extend(getattr(current, slot) for slot in current.__slots__
+                         if hasattr(current, slot))
+    return size
+
+
+class CompiledGraphCache:
+    """
+    In-process LRU cache of compiled graphs keyed by (graph_id, version).
+    Only the latest version of each graph is kept. Entries are evicted in
+    least-recently-used order once either max_entries or max_bytes is exceeded.
+    """
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = 512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[int, Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, graph_id: str, version: int) -> Optional[Any]:
+        """Returns the compiled graph for this exact version, or None."""
+        with self._lock:
+            entry = self._entries.get(graph_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            cached_version, value, size = entry
+            if cached_version != version:
+                # The graph changed since it was compiled, drop the stale entry
+                self._remove(graph_id)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(graph_id)
+            self.hits += 1
+            return value
+
+    def put(self, graph_id: str, version: int, value: Any, size: Optional[int] = None) -> bool:
+        """
+        Stores a compiled graph. Returns False if it is too large to be cached at all.
+        """
+        if size is None:
+            size = estimate_size(value)
+        with self._lock:
+            self._remove(graph_id)
+            if size > self.max_bytes or self.max_entries <= 0:
+                return False
+            self._entries[graph_id] = (version, value, size)
+            self.current_bytes += size
+            while (len(self._entries) > self.max_entries or
+                   self.current_bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+            return True
+
+    def advance(self, graph_id: str, version: int, new_version: int, value: Any) -> bool:
+        """
+        Replaces the entry of `version` by `value` for `new_version`, keeping its
+        size estimate (for values derived from the cached one by a small edit).
+        Returns False if the cached entry is not for `version` anymore.
+        """
+        with self._lock:
+            entry = self._entries.get(graph_id)
+            if entry is None or entry[0] != version:
+                return False
+            self._entries[graph_id] = (new_version, value, entry[2])
+            return True
+
+    def invalidate(self, graph_id: str) -> None:
+        with self._lock:
+            if self._remove(graph_id):
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _remove(self, graph_id: str) -> bool:
+        entry = self._entries.pop(graph_id, None)
+        if entry is None:
+            return False
+        self.current_bytes -= entry[2]
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+
+# Shared by the run endpoints and the CRUD endpoints that invalidate it
+compiled_graphs = CompiledGraphCache(
+    max_entries=Config.GRAPH_CACHE_MAX_ENTRIES,
+    max_bytes=Config.GRAPH_CACHE_MAX_BYTES
+)
+
+# Run states kept with "keep_state", keyed by run id and the graph version they ran against
+run_states = CompiledGraphCache(
+    max_entries=Config.RUN_STATE_MAX_ENTRIES,
+    max_bytes=Config.RUN_STATE_MAX_BYTES
+)
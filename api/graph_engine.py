@@ -0,0 +1,481 @@
+from typing import Dict, List, Set, Optional, Tuple,Union, Any, Iterator, FrozenSet, Iterable
+from collections import defaultdict, deque, ChainMap
+from dataclasses import dataclass, field
+import copy
+
+from .connectivity import DisjointSet, DynamicComponents
+
+
+# Type definitions
+DataType = Union[int, str, bool, list, dict]
+
+@dataclass
+class Edge_1:
+    """Represents an edge in the graph with its properties."""
+    edge_id: str
+    src_node: str
+    dst_node: str
+    src_to_dst_data_keys: Dict[str, str]
+
+@dataclass
+class Node_1:
+    """Represents a node in the graph with its properties."""
+    node_id: str
+    data_in: Dict[str, str] = field(default_factory=dict)
+    data_out: Dict[str, str] = field(default_factory=dict)
+    runtime_data: Dict[str, Any] = field(default_factory=dict)
+
+def _without(items: List[str], item: str) -> List[str]:
+    """A copy of the list without the first occurrence of item."""
+    items = list(items)
+    items.remove(item)
+    return items
+
+
+class Graph_1:
+    """A directed graph implementation with support for topological sorting and data flow."""
+    
+    def __init__(self):
+        self.nodes: Dict[str, Node_1] = {}
+        self.edges: Dict[str, Edge_1] = {}
+        self.directed_adj: Dict[str, List[str]] = defaultdict(list)
+        self.reverse_adj: Dict[str, List[str]] = defaultdict(list)  # directed_adj reversed: sources per node
+        self.undirected_adj: Dict[str, List[str]] = defaultdict(list)
+        self.indegree: Dict[str, int] = defaultdict(int)
+        self.dependent_on: Dict[str, str] = {}
+        self.out_edges: Dict[str, List[Edge_1]] = defaultdict(list)  # Outgoing edges per source node
+        self.components = DisjointSet()  # Connected components, maintained as edges are added
+        self.disabled: FrozenSet[str] = frozenset()  # Nodes masked out by overlay()
+
+    def add_node(self, node_id: str, node_data: dict) -> bool:
+        """
+        Add a new node to the graph.
+        Returns True if successful, False if node already exists.
+        """
+        if node_id in self.nodes:
+            return False
+        
+        node = Node_1(
+            node_id=node_id,
+            data_in=node_data.get('data_in', {}),
+            data_out=node_data.get('data_out', {})
+        )
+        self.nodes[node_id] = node
+        self.components.add(node_id)
+        return True
+
+    
+
+    def add_edge(self, edge_data: dict) -> bool:
+        """
+        Add a new edge to the graph.
+        Returns True if successful, False if edge already exists or nodes don't exist.
+        """
+        edge_id = edge_data['edge_id']
+        src_node = edge_data['src_node']
+        dst_node = edge_data['dst_node']
+        
+        if (edge_id in self.edges or 
+            src_node not in self.nodes or 
+            dst_node not in self.nodes):
+            return False
+
+        edge = Edge_1(
+            edge_id=edge_id,
+            src_node=src_node,
+            dst_node=dst_node,
+            src_to_dst_data_keys=edge_data['src_to_dst_data_keys']
+        )
+        
+        self.edges[edge_id] = edge
+        self.out_edges[src_node].append(edge)
+        self.directed_adj[src_node].append(dst_node)
+        self.reverse_adj[dst_node].append(src_node)
+        self.undirected_adj[src_node].append(dst_node)
+        self.undirected_adj[dst_node].append(src_node)
+        self.indegree[dst_node] += 1
+        self.components.union(src_node, dst_node)
+        
+        return True
+
+
+    def remove_edge(self, edge_id: str) -> bool:
+        """
+        Remove an edge, keeping indegree, adjacency and connectivity up to date.
+        Returns False if the edge doesn't exist.
+        """
+        edge = self.edges.pop(edge_id, None)
+        if edge is None:
+            return False
+        src_node, dst_node = edge.src_node, edge.dst_node
+
+        # New lists rather than in-place removals, they may be shared with the graph this was copied from
+        self.out_edges[src_node] = [out_edge for out_edge in self.out_edges[src_node]
+                                    if out_edge.edge_id != edge_id]
+        self.directed_adj[src_node] = _without(self.directed_adj[src_node], dst_node)
+        self.reverse_adj[dst_node] = _without(self.reverse_adj[dst_node], src_node)
+        self.undirected_adj[src_node] = _without(self.undirected_adj[src_node], dst_node)
+        self.undirected_adj[dst_node] = _without(self.undirected_adj[dst_node], src_node)
+        self.indegree[dst_node] -= 1
+
+        detached = self._detached_side(src_node, dst_node)
+        if detached:
+            self._dynamic_components().split(detached)
+        return True
+
+    def remove_node(self, node_id: str) -> bool:
+        """
+        Remove a node and its incoming and outgoing edges.
+        Returns False if the node doesn't exist.
+        """
+        if node_id not in self.nodes:
+            return False
+        for edge_id in self.incident_edge_ids(node_id):
+            self.remove_edge(edge_id)
+
+        del self.nodes[node_id]
+        for adjacency in (self.directed_adj, self.reverse_adj, self.undirected_adj, self.out_edges,
+                          self.indegree, self.dependent_on):
+            adjacency.pop(node_id, None)
+        self._dynamic_components().discard(node_id)
+        return True
+
+    def incident_edge_ids(self, node_id: str) -> List[str]:
+        """The ids of the edges leaving or entering a node, each once."""
+        edge_ids = [edge.edge_id for edge in self.out_edges.get(node_id, ())]
+        for src_node in set(self.reverse_adj.get(node_id, ())):
+            if src_node != node_id:
+                edge_ids.extend(edge.edge_id for edge in self.out_edges.get(src_node, ())
+                                if edge.dst_node == node_id)
+        return edge_ids
+
+    def _dynamic_components(self) -> DynamicComponents:
+        """Union-find can't split components, switch to explicit labels on the first removal."""
+        if not isinstance(self.components, DynamicComponents):
+            self.components = DynamicComponents.from_groups(self.components.groups())
+        return self.components
+
+    def _detached_side(self, a: str, b: str) -> Optional[Set[str]]:
+        """
+        After an edge between a and b was removed: None if they are still connected,
+        otherwise the nodes of the side that got detached. Alternates a BFS from
+        each end, so it stops after exploring the smaller side (or where they meet).
+        """
+        if a == b:
+            return None
+        seen = ({a}, {b})
+        queues = (deque([a]), deque([b]))
+        while True:
+            for side in (0, 1):
+                if not queues[side]:
+                    return seen[side]
+                for neighbor in self.undirected_adj.get(queues[side].popleft(), ()):
+                    if neighbor in seen[1 - side]:
+                        return None
+                    if neighbor not in seen[side]:
+                        seen[side].add(neighbor)
+                        queues[side].append(neighbor)
+
+    def copy_topology(self, node_ids: Iterable[str]) -> "Graph_1":
+        """
+        Returns a copy that can be edited without changing this graph or the runs
+        sharing it. The maps are copied shallowly, and only the adjacency lists of
+        `node_ids` (the nodes that will get new edges, since add_edge appends in
+        place) are copied, so the Python-level work is proportional to the edit.
+        """
+        graph = copy.copy(self)
+        graph.nodes = dict(self.nodes)
+        graph.edges = dict(self.edges)
+        graph.indegree = defaultdict(int, self.indegree)
+        graph.dependent_on = dict(self.dependent_on)
+        graph.components = self.components.copy()
+        for name in ('directed_adj', 'reverse_adj', 'undirected_adj', 'out_edges'):
+            adjacency = defaultdict(list, getattr(self, name))
+            for node_id in node_ids:
+                if node_id in adjacency:
+                    adjacency[node_id] = list(adjacency[node_id])
+            setattr(graph, name, adjacency)
+        return graph
+
+    def is_connected(self) -> bool:
+        """Check if the graph is connected. O(1), components are tracked in add_node/add_edge."""
+        if self.disabled:
+            return len(self.connected_components()) <= 1
+        return self.components.count <= 1
+
+    def connected_components(self) -> List[List[str]]:
+        """Returns the node ids of each connected component, largest component first."""
+        if self.disabled:
+            return self._masked_components()
+        return self.components.groups()
+
+    def _masked_components(self) -> List[List[str]]:
+        """
+        Components of the enabled nodes by BFS over undirected_adj. Only used when
+        nodes are disabled, since the union-find can't take nodes out.
+        """
+        seen = set(self.disabled)
+        groups = []
+        for start in self.nodes:
+            if start in seen:
+                continue
+            seen.add(start)
+            group = [start]
+            queue = deque(group)
+            while queue:
+                for neighbor in self.undirected_adj.get(queue.popleft(), ()):
+                    if neighbor not in seen:
+                        seen.add(neighbor)
+                        group.append(neighbor)
+                        queue.append(neighbor)
+            groups.append(group)
+        return sorted(groups, key=len, reverse=True)
+
+    def overlay(self, disabled: Iterable[str]) -> "Graph_1":
+        """
+        Returns a view of this graph with the given nodes disabled, as if they and
+        their edges had been removed. Nodes, edges and adjacency are shared; only
+        the indegree of the disabled nodes' successors is overlaid, so the cost is
+        proportional to the disabled nodes and their outgoing edges.
+        """
+        view = copy.copy(self)
+        view.disabled = frozenset(node_id for node_id in disabled if node_id in self.nodes)
+        # A disabled node reads as indegree 0, like a node that isn't in the graph
+        indegree = {node_id: 0 for node_id in view.disabled}
+        for node_id in view.disabled:
+            for edge in self.out_edges.get(node_id, ()):
+                if edge.dst_node not in view.disabled:
+                    indegree[edge.dst_node] = indegree.get(edge.dst_node, self.indegree[edge.dst_node]) - 1
+        view.indegree = ChainMap(indegree, self.indegree)
+        view.dependent_on = {}
+        return view
+
+    def is_active(self, node_id: str) -> bool:
+        """True if the node is in the graph and not disabled."""
+        return node_id in self.nodes and node_id not in self.disabled
+    
+    def get_all_nodes(self, node_ids: Optional[Iterable[str]] = None) -> Dict[str, Node_1]:
+        """Returns all nodes, or only the given ones that are in the graph, as Node objects."""
+        updated_nodes = {}
+
+        if node_ids is not None:
+            for node_id in dict.fromkeys(node_ids):
+                if self.is_active(node_id):
+                    updated_nodes[node_id] = self.get_node_output(node_id)
+            return updated_nodes
+
+        for node_id in self.nodes:
+            if node_id not in self.disabled:
+                updated_nodes[node_id] = self.get_node_output(node_id)
+        
+        return updated_nodes
+
+    def get_node_output(self, node_id: str) -> Dict[str, dict]:
+        """Returns a node's data_in and data_out, filled in from its runtime_data."""
+        node = self.nodes[node_id]
+
+        # Update data_in and data_out with values from runtime_data, setting unmatched keys to None
+        for key in node.data_in:
+            node.data_in[key] = node.runtime_data.get(key, None)
+        for key in node.data_out:
+            node.data_out[key] = node.runtime_data.get(key, None)
+
+        # Remove runtime_data from the node
+        return {
+            "data_in": node.data_in,
+            "data_out": node.data_out
+        }
+    
+    def fork(self, data_overwrites: Optional[Dict[str, dict]] = None) -> "Graph_1":
+        """
+        Returns a copy for a single run. The topology (edges, adjacency lists,
+        indegree) is shared with this graph, only the node data is copied.
+        `data_overwrites` replaces the data_in of the given nodes in the copy.
+        """
+        data_overwrites = data_overwrites or {}
+        run = copy.copy(self)
+        run.nodes = {
+            node_id: Node_1(
+                node_id=node_id,
+                data_in=dict(data_overwrites.get(node_id, node.data_in)),
+                data_out=dict(node.data_out)
+            )
+            for node_id, node in self.nodes.items()
+        }
+        return run
+
+    def propagate_data(self, topo_order: Optional[List[List[str]]] = None, executor=None):
+        """
+        Propagate data from each node's data_out to the data_in of downstream nodes.
+        A topological order that was already computed for this topology can be passed in.
+        With an executor (see api/executors.py) the nodes of each level run concurrently.
+        """
+        if topo_order is None:
+            topo_order, is_not_cyclic = self.process_graph()
+            if not is_not_cyclic:
+                print("Error: Cycle detected")
+                return False
+
+        for _ in self.propagate_levels(topo_order, executor):
+            pass
+
+    def propagate_levels(self, topo_order: List[List[str]],
+                         executor=None) -> Iterator[Tuple[int, List[str]]]:
+        """
+        Propagate level by level, yielding (level_index, level) just before a
+        level pushes its data downstream. At that point every node of the level
+        has received all of its inputs, so its output is final.
+        """
+        for index, level in enumerate(topo_order):
+            yield index, level
+            self.propagate_level(level, executor)
+
+    def propagate_level(self, level: List[str], executor=None) -> None:
+        """Push the runtime data of every node in a level along its outgoing edges."""
+        if executor is not None:
+            self.apply_writes(executor.run_level(self.level_tasks(level)))
+            return
+
+        # O(E) over the outgoing edge index for the whole propagation
+        disabled = self.disabled
+        for node_id in level:
+            node = self.nodes[node_id]
+            
+            # Propagate data_out to connected nodes' data_in, once per edge
+            for edge in self.out_edges.get(node_id, ()):
+                if disabled and edge.dst_node in disabled:
+                    continue
+                dst_node = self.nodes[edge.dst_node]
+                for src_key, dst_key in edge.src_to_dst_data_keys.items():
+                    if src_key in node.runtime_data:
+                        value = node.runtime_data[src_key]
+                        dst_node.data_in[dst_key] = value
+                        dst_node.runtime_data[dst_key] = value
+                        dst_node.data_out[dst_key] = value
+
+    def level_tasks(self, level: List[str]) -> List[tuple]:
+        """
+        The propagation work of a level as independent per-node tasks:
+        (node_id, runtime_data, [(dst_node_id, src_to_dst_data_keys), ...]).
+        Nodes of a level never write to each other, so the tasks can run in any order.
+        """
+        return [
+            (node_id, self.nodes[node_id].runtime_data,
+             [(edge.dst_node, edge.src_to_dst_data_keys) for edge in self.out_edges.get(node_id, ())
+              if edge.dst_node not in self.disabled])
+            for node_id in level
+        ]
+
+    def apply_writes(self, level_writes: List[List[Tuple[str, str, Any]]]) -> None:
+        """
+        Merge the (dst_node_id, dst_key, value) writes of a level's tasks, in task
+        order and then edge order, which is the order the serial path writes in.
+        """
+        nodes = self.nodes
+        for writes in level_writes:
+            for dst_node_id, dst_key, value in writes:
+                dst_node = nodes[dst_node_id]
+                dst_node.data_in[dst_key] = value
+                dst_node.runtime_data[dst_key] = value
+                dst_node.data_out[dst_key] = value
+
+    def downstream_cone(self, node_ids: List[str]) -> Set[str]:
+        """The given nodes and every node reachable from them, found by BFS over out_edges."""
+        cone = {node_id for node_id in node_ids if self.is_active(node_id)}
+        queue = deque(cone)
+        while queue:
+            node_id = queue.popleft()
+            for edge in self.out_edges.get(node_id, ()):
+                if edge.dst_node not in cone and edge.dst_node not in self.disabled:
+                    cone.add(edge.dst_node)
+                    queue.append(edge.dst_node)
+        return cone
+
+    def upstream_cone(self, node_ids: Iterable[str]) -> Set[str]:
+        """The given nodes and every node they depend on, found by BFS over reverse_adj."""
+        cone = {node_id for node_id in node_ids if self.is_active(node_id)}
+        queue = deque(cone)
+        while queue:
+            for src_node in self.reverse_adj.get(queue.popleft(), ()):
+                if src_node not in cone and src_node not in self.disabled:
+                    cone.add(src_node)
+                    queue.append(src_node)
+        return cone
+
+    def in_edge_index(self, topo_order: List[List[str]]) -> Dict[str, List[Tuple[str, Dict[str, str]]]]:
+        """
+        The incoming (src_node, src_to_dst_data_keys) of every node, in the order
+        propagate_data applies them for this topological order.
+        """
+        in_edges = defaultdict(list)
+        for level in topo_order:
+            for node_id in level:
+                for edge in self.out_edges.get(node_id, ()):
+                    if edge.dst_node not in self.disabled:
+                        in_edges[edge.dst_node].append((node_id, edge.src_to_dst_data_keys))
+        return in_edges
+
+    def pull_data(self, node_id: str, in_edges: List[Tuple[str, Dict[str, str]]]) -> None:
+        """
+        Recompute one node's propagated data from its upstream nodes' runtime data.
+        With the upstream nodes final, this makes the same writes propagate_data does.
+        """
+        node = self.nodes[node_id]
+        for src_node, src_to_dst_data_keys in in_edges:
+            runtime_data = self.nodes[src_node].runtime_data
+            for src_key, dst_key in src_to_dst_data_keys.items():
+                if src_key in runtime_data:
+                    value = runtime_data[src_key]
+                    node.data_in[dst_key] = value
+                    node.runtime_data[dst_key] = value
+                    node.data_out[dst_key] = value
+
+    def process_graph(self) -> Tuple[List[List[str]], bool]:
+        """
+        Process the graph to get topological ordering and check for cycles.
+        Returns (topological_order, is_not_cyclic).
+        """
+        topo_order = []
+        is_not_cyclic = True
+        disabled = self.disabled
+        indegree_copy = defaultdict(int, self.indegree)
+        
+        current_nodes = [
+            node_id for node_id in self.nodes 
+            if indegree_copy[node_id] == 0 and node_id not in disabled
+        ]
+        
+        while current_nodes:
+            current_level_nodes = []
+            future_nodes = []
+            
+            current_nodes.sort()  # Lexicographical ordering
+            
+            while current_nodes:
+                current_node = current_nodes.pop()
+                current_level_nodes.append(current_node)
+            
+                for neighbor in self.directed_adj[current_node]:
+                    if neighbor in disabled:
+                        continue
+                    indegree_copy[neighbor] -= 1
+                    if indegree_copy[neighbor] == 0:
+                        self.dependent_on[neighbor] = current_node
+                        future_nodes.append(neighbor)
+            
+            topo_order.append(current_level_nodes)
+            current_nodes.extend(sorted(future_nodes))
+                
+        # Check for cycles
+        is_not_cyclic = all(indegree_copy[node_id] == 0 for node_id in self.nodes
+                            if node_id not in disabled)
+                
+        return topo_order, is_not_cyclic
+    
+
+    def set_node_data(self, node_id: str, data_key: str, value: Any) -> bool:
+        """Set runtime data for a node."""
+        if node_id not in self.nodes:
+            return False
+        self.nodes[node_id].runtime_data[data_key] = value
+        return True
@@ -0,0 +1,183 @@
+from typing import Dict, List, Optional, Iterable, Iterator, Tuple
+from bson import DBRef
+from models import Node, Edge, Graph
+
+
+# Every loader below issues a fixed number of queries no matter how many
+# nodes or edges the graph has: documents are fetched with `$in` filters and
+# returned as raw dicts (`as_pymongo`) so that no ReferenceField is ever
+# dereferenced lazily.
+
+NODE_FIELDS = ('node_id', 'data_in', 'data_out')
+EDGE_FIELDS = ('edge_id', 'src_node', 'dst_node', 'src_to_dst_data_keys')
+
+# Documents per cursor batch / per chunk of nodes when streaming
+STREAM_BATCH_SIZE = 1000
+
+
+def _ref_id(ref):
+    """Graph.nodes holds node_id strings, but documents not yet migrated (migrate.py) may hold DBRefs."""
+    if isinstance(ref, DBRef):
+        return ref.id
+    return ref
+
+
+def _strip(doc: dict) -> dict:
+    doc.pop('_id', None)
+    return doc
+
+
+def get_graph_node_ids(graph_id: str) -> Optional[List[str]]:
+    """Returns the node ids of a graph, or None if the graph does not exist. One query."""
+    graph = Graph.objects(graph_id=graph_id).only('nodes').as_pymongo().first()
+    if graph is None:
+        return None
+    return [_ref_id(ref) for ref in graph.get('nodes', [])]
+
+
+def get_graph_members(graph_id: str) -> Optional[Tuple[List[str], int]]:
+    """Returns (node ids, version) of a graph, or None if the graph does not exist. One query."""
+    graph = Graph.objects(graph_id=graph_id).only('nodes', 'version').as_pymongo().first()
+    if graph is None:
+        return None
+    return [_ref_id(ref) for ref in graph.get('nodes', [])], graph.get('version', 0)
+
+
+def get_graph_version(graph_id: str) -> Optional[int]:
+    """Returns the current version of a graph, or None if the graph does not exist. One query."""
+    graph = Graph.objects(graph_id=graph_id).only('version').as_pymongo().first()
+    if graph is None:
+        return None
+    return graph.get('version', 0)
+
+
+def get_validated_version(graph_id: str) -> Optional[int]:
+    """Returns the last version of a graph that passed schema validation, or None. One query."""
+    graph = Graph.objects(graph_id=graph_id).only('validated_version').as_pymongo().first()
+    if graph is None:
+        return None
+    return graph.get('validated_version')
+
+
+def get_nodes(node_ids: Iterable[str]) -> Dict[str, dict]:
+    """Fetches nodes by id in a single `$in` query, keyed by node_id."""
+    node_ids = list(node_ids)
+    if not node_ids:
+        return {}
+    nodes = Node.objects(node_id__in=node_ids).only(*NODE_FIELDS).as_pymongo()
+    return {node['node_id']: _strip(node) for node in nodes}
+
+
+def get_outgoing_edges(node_ids: Iterable[str]) -> List[dict]:
+    """Fetches every edge leaving the given nodes in a single `$in` query."""
+    node_ids = list(node_ids)
+    if not node_ids:
+        return []
+    edges = Edge.objects(src_node__in=node_ids).only(*EDGE_FIELDS).as_pymongo()
+    return [_strip(edge) for edge in edges]
+
+
+def get_graph_edges(graph_id: str, node_ids: Iterable[str]) -> List[dict]:
+    """
+    Fetches only the edges of one graph: edges whose src_node and dst_node
+    both belong to it and that are either untagged or tagged with this graph_id.
+    Served by the (graph_id, src_node, dst_node) index with a projection.
+    """
+    node_ids = list(node_ids)
+    if not node_ids:
+        return []
+    edges = Edge.objects(
+        graph_id__in=[None, graph_id],
+        src_node__in=node_ids,
+        dst_node__in=node_ids
+    ).only(*EDGE_FIELDS).as_pymongo()
+    return [_strip(edge) for edge in edges]
+
+
+def find_edges(fields: Iterable[str] = EDGE_FIELDS, after: Optional[str] = None,
+               limit: Optional[int] = None, **filters) -> Iterator[dict]:
+    """
+    Streams raw edge documents matching `filters` from an uncached cursor, so
+    memory stays flat whatever the collection size. Only `fields` are projected.
+    With `after`/`limit` the edges are paged by edge_id (keyset pagination):
+    the next page starts after the last edge_id of the previous one.
+    """
+    edges = Edge.objects(**filters)
+    if after is not None or limit is not None:
+        if after is not None:
+            edges = edges.filter(edge_id__gt=after)
+        edges = edges.order_by('edge_id')
+        if limit is not None:
+            edges = edges.limit(limit)
+    edges = edges.only(*fields).as_pymongo().no_cache()
+    for edge in edges.batch_size(STREAM_BATCH_SIZE):
+        yield _strip(edge)
+
+
+def build_adjacency_list(node_ids: List[str], nodes: Dict[str, dict], edges: List[dict]) -> dict:
+    """
+    Builds the adjacency list in memory.
+    `nodes` must contain the graph nodes and every destination node referenced by `edges`.
+    """
+    edges_by_src = {}
+    for edge in edges:
+        edges_by_src.setdefault(edge['src_node'], []).append(edge)
+
+    adjacency_list = {}
+    for node_id in node_ids:
+        node = nodes.get(node_id)
+        if node is None:
+            continue
+        adjacency_list[node_id] = {
+            "data_in": node.get('data_in', {}),
+            "data_out": node.get('data_out', {}),
+            "edges": []
+        }
+        for edge in edges_by_src.get(node_id, []):
+            dst_node = nodes.get(edge['dst_node'])
+            if dst_node:
+                adjacency_list[node_id]["edges"].append({
+                    "data_out": dst_node.get('data_out', {}),
+                    "data_in": dst_node.get('data_in', {}),
+                    "dst_node": edge['dst_node'],
+                })
+    return adjacency_list
+
+
+def load_adjacency_list(graph_id: str) -> Optional[dict]:
+    """
+    Loads the adjacency list of a graph with at most four queries:
+    the graph, its nodes, their outgoing edges and any destination
+    nodes that live outside the graph.
+    Returns None if the graph does not exist.
+    """
+    node_ids = get_graph_node_ids(graph_id)
+    if node_ids is None:
+        return None
+
+    nodes = get_nodes(node_ids)
+    edges = get_outgoing_edges(nodes.keys())
+
+    missing_dst_ids = {edge['dst_node'] for edge in edges} - nodes.keys()
+    if missing_dst_ids:
+        nodes.update(get_nodes(missing_dst_ids))
+
+    return build_adjacency_list(node_ids, nodes, edges)
+
+
+def iter_adjacency_list(node_ids: List[str], chunk_size: int = STREAM_BATCH_SIZE) -> Iterator[Tuple[str, dict]]:
+    """
+    Yields (node_id, adjacency entry) for the given graph nodes, loading them in
+    chunks of `chunk_size` nodes so only one chunk is held in memory at a time.
+    Costs a fixed number of queries per chunk.
+    """
+    for start in range(0, len(node_ids), chunk_size):
+        chunk = node_ids[start:start + chunk_size]
+        nodes = get_nodes(chunk)
+        edges = get_outgoing_edges(nodes.keys())
+
+        missing_dst_ids = {edge['dst_node'] for edge in edges} - nodes.keys()
+        if missing_dst_ids:
+            nodes.update(get_nodes(missing_dst_ids))
+
+        yield from build_adjacency_list(chunk, nodes, edges).items()
@@ -0,0 +1,539 @@
+import dataclasses
+import heapq
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from mongoengine import ValidationError
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from models import Node, Edge, Graph
+from .graph_loader import get_nodes
+from .compact_graph import CompactGraph
+from .validation import (NODE_REQUIRED_FIELDS, EDGE_REQUIRED_FIELDS, missing_field_error,
+                         validate_node_data, validate_edge_keys)
+
+
+# Incremental graph edits.
+#
+# A patch is a list of operations (add_node, remove_node, add_edge,
+# remove_edge, rewire_edge) applied to one graph as a unit. plan_patch
+# validates every operation against the graph's current documents, simulating
+# the earlier operations, so nothing is written unless the whole batch is
+# valid. apply_patch claims and locks the graph with a compare-and-set of its
+# version before writing, so concurrent patches of the same graph can't
+# interleave, and bumps the version again once everything is written. Finally
+# patch_compiled applies the same edits to a copy of the cached compiled graph
+# and updates its levels and connectivity for the nodes the edits reach,
+# instead of rebuilding and re-sorting the whole graph.
+
+PATCH_OPS = ('add_node', 'remove_node', 'add_edge', 'remove_edge', 'rewire_edge')
+
+# How long a claimed graph stays locked if the process writing the patch dies
+PATCH_LOCK_SECONDS = 60
+
+
+class PatchError(Exception):
+    """An operation of a patch that can't be applied. `index` is its position in the batch."""
+
+    def __init__(self, index: int, message: str):
+        super().__init__(message)
+        self.index = index
+        self.message = message
+
+
+class PatchConflict(Exception):
+    """A patch whose writes collided with a concurrent change, after the graph's version moved on."""
+
+
+@dataclass
+class GraphPatch:
+    """The writes of a validated patch, and the edits to replay on a compiled graph."""
+    graph_id: str
+    added_members: List[str] = field(default_factory=list)
+    removed_members: List[str] = field(default_factory=list)
+    new_nodes: Dict[str, dict] = field(default_factory=dict)
+    new_edges: Dict[str, dict] = field(default_factory=dict)
+    deleted_edges: Set[str] = field(default_factory=set)
+    rewired_edges: Dict[str, dict] = field(default_factory=dict)
+    # (node_id, paths field) -> edge_ids, net of operations cancelling each other
+    path_pulls: Dict[Tuple[str, str], Set[str]] = field(default_factory=dict)
+    path_pushes: Dict[Tuple[str, str], Set[str]] = field(default_factory=dict)
+    # Endpoints of changed untagged edges, which other graphs may contain too
+    shared_nodes: Set[str] = field(default_factory=set)
+    # ("add_node", node_id, node), ("remove_node", node_id), ("add_edge", edge), ("remove_edge", edge_id)
+    engine_ops: List[tuple] = field(default_factory=list)
+    nodes: Dict[str, dict] = field(default_factory=dict)
+
+    def pull_path(self, node_id: str, path_field: str, edge_id: str) -> None:
+        pushes = self.path_pushes.get((node_id, path_field), set())
+        if edge_id in pushes:
+            pushes.discard(edge_id)
+        else:
+            self.path_pulls.setdefault((node_id, path_field), set()).add(edge_id)
+
+    def push_path(self, node_id: str, path_field: str, edge_id: str) -> None:
+        pulls = self.path_pulls.get((node_id, path_field), set())
+        if edge_id in pulls:
+            pulls.discard(edge_id)
+        else:
+            self.path_pushes.setdefault((node_id, path_field), set()).add(edge_id)
+
+
+def _referenced_ids(ops: List[dict]) -> Tuple[Set[str], Set[str], Set[str]]:
+    """(node ids, edge ids, ids of the nodes added or removed) mentioned by well-formed operations."""
+    node_ids, edge_ids, membership = set(), set(), set()
+    for op in ops:
+        if not isinstance(op, dict):
+            continue
+        for key in ('node_id', 'src_node', 'dst_node'):
+            if isinstance(op.get(key), str):
+                node_ids.add(op[key])
+        if isinstance(op.get('edge_id'), str):
+            edge_ids.add(op['edge_id'])
+        if op.get('op') in ('add_node', 'remove_node') and isinstance(op.get('node_id'), str):
+            membership.add(op['node_id'])
+    return node_ids, edge_ids, membership
+
+
+def plan_patch(graph_id: str, member_ids: List[str], ops: List[dict]) -> GraphPatch:
+    """
+    Validates the operations in order against the graph and returns the
+    resulting writes. Raises PatchError for the first invalid operation.
+    Three queries: the referenced nodes, the referenced edges and the edges
+    incident to the nodes being added or removed.
+    """
+    node_ids, edge_ids, membership = _referenced_ids(ops)
+    nodes = get_nodes(node_ids)
+    edges: Dict[str, Optional[dict]] = {}
+    if edge_ids or membership:
+        query = [{"edge_id": {"$in": list(edge_ids)}}]
+        if membership:
+            query += [{"src_node": {"$in": list(membership)}}, {"dst_node": {"$in": list(membership)}}]
+        for edge in Edge.objects(__raw__={"$or": query}).only(
+                'edge_id', 'src_node', 'dst_node', 'src_to_dst_data_keys', 'graph_id').as_pymongo():
+            edge.pop('_id', None)
+            edges[edge['edge_id']] = edge
+    stored_edges = set(edges)
+
+    # Edges per node, for the nodes being added or removed
+    incident: Dict[str, Set[str]] = {node_id: set() for node_id in membership}
+    for edge in edges.values():
+        for endpoint in (edge['src_node'], edge['dst_node']):
+            if endpoint in incident:
+                incident[endpoint].add(edge['edge_id'])
+
+    members = set(member_ids)
+    patch = GraphPatch(graph_id=graph_id, nodes=nodes)
+
+    def in_graph(edge: Optional[dict]) -> bool:
+        return (edge is not None and edge.get('graph_id') in (None, graph_id)
+                and edge['src_node'] in members and edge['dst_node'] in members)
+
+    def link(edge: dict) -> None:
+        edges[edge['edge_id']] = edge
+        patch.push_path(edge['src_node'], 'paths_out', edge['edge_id'])
+        patch.push_path(edge['dst_node'], 'paths_in', edge['edge_id'])
+        for endpoint in (edge['src_node'], edge['dst_node']):
+            if endpoint in incident:
+                incident[endpoint].add(edge['edge_id'])
+
+    def unlink(edge: dict) -> None:
+        patch.pull_path(edge['src_node'], 'paths_out', edge['edge_id'])
+        patch.pull_path(edge['dst_node'], 'paths_in', edge['edge_id'])
+        for endpoint in (edge['src_node'], edge['dst_node']):
+            if endpoint in incident:
+                incident[endpoint].discard(edge['edge_id'])
+        if edge.get('graph_id') is None:
+            patch.shared_nodes.update((edge['src_node'], edge['dst_node']))
+
+    def delete_edge(edge: dict) -> None:
+        unlink(edge)
+        edges[edge['edge_id']] = None
+        if edge['edge_id'] in stored_edges:
+            patch.deleted_edges.add(edge['edge_id'])
+            patch.rewired_edges.pop(edge['edge_id'], None)
+        else:
+            patch.new_edges.pop(edge['edge_id'], None)
+
+    def check_edge(index: int, src_node: str, dst_node: str, keys) -> None:
+        if src_node not in members or dst_node not in members:
+            raise PatchError(index, "Source and destination nodes must be in the graph")
+        if src_node not in nodes or dst_node not in nodes:
+            raise PatchError(index, "Source or destination node does not exist")
+        error = validate_edge_keys(keys, nodes[src_node].get('data_out', {}), nodes[dst_node].get('data_in', {}))
+        if error:
+            raise PatchError(index, error)
+
+    for index, op in enumerate(ops):
+        if not isinstance(op, dict) or op.get('op') not in PATCH_OPS:
+            raise PatchError(index, f"op must be one of {', '.join(PATCH_OPS)}")
+        kind = op['op']
+
+        if kind in ('add_node', 'remove_node'):
+            node_id = op.get('node_id')
+            if not isinstance(node_id, str):
+                raise PatchError(index, "node_id must be a string")
+
+            if kind == 'add_node':
+                if node_id in members:
+                    raise PatchError(index, f"Node '{node_id}' is already in the graph")
+                if node_id in nodes:
+                    if 'data_in' in op or 'data_out' in op:
+                        raise PatchError(index, f"Node '{node_id}' already exists, add it without data_in/data_out")
+                else:
+                    error = (missing_field_error(op, NODE_REQUIRED_FIELDS)
+                             or validate_node_data(op['data_in'], op['data_out']))
+                    if error:
+                        raise PatchError(index, error)
+                    try:
+                        node = Node(node_id=node_id, data_in=op['data_in'], data_out=op['data_out'],
+                                    paths_in=[], paths_out=[], graph_id=graph_id)
+                        node.validate()
+                    except ValidationError as e:
+                        raise PatchError(index, str(e))
+                    patch.new_nodes[node_id] = node.to_mongo().to_dict()
+                    nodes[node_id] = {"node_id": node_id, "data_in": op['data_in'], "data_out": op['data_out']}
+
+                members.add(node_id)
+                if node_id in patch.removed_members:
+                    patch.removed_members.remove(node_id)
+                else:
+                    patch.added_members.append(node_id)
+                patch.engine_ops.append(("add_node", node_id, nodes[node_id]))
+                # Stored edges between the node and the graph become part of it
+                for edge_id in sorted(incident[node_id]):
+                    if in_graph(edges[edge_id]):
+                        patch.engine_ops.append(("add_edge", edges[edge_id]))
+            else:
+                if node_id not in members:
+                    raise PatchError(index, f"Node '{node_id}' is not in the graph")
+                # The graph's own edges go with the node, untagged ones may belong to other graphs
+                for edge_id in sorted(incident[node_id]):
+                    edge = edges[edge_id]
+                    if in_graph(edge) and edge.get('graph_id') == graph_id:
+                        delete_edge(edge)
+                members.discard(node_id)
+                if node_id in patch.new_nodes:
+                    # Created earlier in this patch, don't create it at all
+                    del patch.new_nodes[node_id]
+                    del nodes[node_id]
+                if node_id in patch.added_members:
+                    patch.added_members.remove(node_id)
+                else:
+                    patch.removed_members.append(node_id)
+                patch.engine_ops.append(("remove_node", node_id))
+            continue
+
+        edge_id = op.get('edge_id')
+        if not isinstance(edge_id, str):
+            raise PatchError(index, "edge_id must be a string")
+
+        if kind == 'add_edge':
+            error = missing_field_error(op, EDGE_REQUIRED_FIELDS)
+            if error:
+                raise PatchError(index, error)
+            if edges.get(edge_id) is not None:
+                raise PatchError(index, f"Edge '{edge_id}' already exists")
+            check_edge(index, op['src_node'], op['dst_node'], op['src_to_dst_data_keys'])
+            try:
+                Edge(edge_id=edge_id, src_node=op['src_node'], dst_node=op['dst_node'],
+                     src_to_dst_data_keys=op['src_to_dst_data_keys'], graph_id=graph_id).validate()
+            except ValidationError as e:
+                raise PatchError(index, str(e))
+            edge = {"edge_id": edge_id, "src_node": op['src_node'], "dst_node": op['dst_node'],
+                    "src_to_dst_data_keys": op['src_to_dst_data_keys'], "graph_id": graph_id}
+            if edge_id in stored_edges:
+                # Deleted earlier in this patch and added again
+                patch.deleted_edges.discard(edge_id)
+                patch.rewired_edges[edge_id] = edge
+            else:
+                patch.new_edges[edge_id] = edge
+            link(edge)
+            patch.engine_ops.append(("add_edge", edge))
+            continue
+
+        edge = edges.get(edge_id)
+        if not in_graph(edge):
+            raise PatchError(index, f"Edge '{edge_id}' is not in the graph")
+
+        if kind == 'remove_edge':
+            delete_edge(edge)
+            patch.engine_ops.append(("remove_edge", edge_id))
+        else:
+            rewired = dict(edge,
+                           src_node=op.get('src_node', edge['src_node']),
+                           dst_node=op.get('dst_node', edge['dst_node']),
+                           src_to_dst_data_keys=op.get('src_to_dst_data_keys', edge['src_to_dst_data_keys']))
+            if not isinstance(rewired['src_node'], str) or not isinstance(rewired['dst_node'], str):
+                raise PatchError(index, "src_node and dst_node must be strings")
+            check_edge(index, rewired['src_node'], rewired['dst_node'], rewired['src_to_dst_data_keys'])
+            unlink(edge)
+            link(rewired)
+            if rewired.get('graph_id') is None:
+                patch.shared_nodes.update((rewired['src_node'], rewired['dst_node']))
+            if edge_id in stored_edges:
+                patch.rewired_edges[edge_id] = rewired
+            else:
+                patch.new_edges[edge_id] = rewired
+            patch.engine_ops.append(("remove_edge", edge_id))
+            patch.engine_ops.append(("add_edge", rewired))
+
+    return patch
+
+
+def apply_patch(patch: GraphPatch, version: int) -> Optional[int]:
+    """
+    Writes a planned patch and returns the graph's new version, or None
+    without writing anything if the graph changed since it was planned (or
+    another patch of it is being written).
+
+    The graph is claimed first: its version is moved from `version` to
+    `version + 1` and locked until PATCH_LOCK_SECONDS from now, in one
+    conditional update. The documents are written next, and the version is
+    bumped once more when they all are. A run that reads the version while
+    the documents are half written compiles (and caches, or snapshots) that
+    intermediate version, which no run reads once the patch is done.
+    Raises PatchConflict, once the version has moved on, if a write fails
+    because a document was created concurrently.
+    """
+    graphs = Graph._get_collection()
+    now = datetime.utcnow()
+    # Graphs saved before versioning have no version field, which reads as 0
+    expected = version if version else {"$in": [0, None]}
+    claimed = graphs.update_one(
+        {"graph_id": patch.graph_id, "version": expected,
+         "$or": [{"patch_lock": None}, {"patch_lock": {"$lt": now}}]},
+        {"$inc": {"version": 1}, "$set": {"patch_lock": now + timedelta(seconds=PATCH_LOCK_SECONDS)}}
+    )
+    if claimed.matched_count == 0:
+        return None
+
+    try:
+        _write_patch(patch)
+    except (BulkWriteError, DuplicateKeyError):
+        _release(patch.graph_id)
+        raise PatchConflict("Patch partially applied, a node or edge it creates was created concurrently")
+
+    new_version = _release(patch.graph_id)
+    # Every op was validated against the graph, so a graph with valid schemas stays valid
+    graphs.update_one({"graph_id": patch.graph_id, "version": new_version, "validated_version": version},
+                      {"$set": {"validated_version": new_version}})
+    return new_version
+
+
+def _release(graph_id: str) -> int:
+    """Unlocks a claimed graph and bumps its version past the intermediate one. Returns the new version."""
+    graph = Graph._get_collection().find_one_and_update(
+        {"graph_id": graph_id},
+        {"$inc": {"version": 1}, "$unset": {"patch_lock": ""}},
+        projection={"version": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return graph["version"]
+
+
+def _write_patch(patch: GraphPatch) -> None:
+    graphs = Graph._get_collection()
+    if patch.removed_members:
+        graphs.update_one({"graph_id": patch.graph_id}, {"$pull": {"nodes": {"$in": patch.removed_members}}})
+    if patch.added_members:
+        graphs.update_one({"graph_id": patch.graph_id}, {"$push": {"nodes": {"$each": patch.added_members}}})
+
+    if patch.new_nodes:
+        Node._get_collection().insert_many(list(patch.new_nodes.values()), ordered=False)
+    edges = Edge._get_collection()
+    if patch.deleted_edges:
+        edges.delete_many({"edge_id": {"$in": list(patch.deleted_edges)}})
+    if patch.new_edges:
+        edges.insert_many([dict(edge) for edge in patch.new_edges.values()], ordered=False)
+    if patch.rewired_edges:
+        edges.bulk_write([
+            UpdateOne({"edge_id": edge_id}, {"$set": {
+                "src_node": edge['src_node'],
+                "dst_node": edge['dst_node'],
+                "src_to_dst_data_keys": edge['src_to_dst_data_keys'],
+                "graph_id": edge.get('graph_id')
+            }}) for edge_id, edge in patch.rewired_edges.items()
+        ], ordered=False)
+
+    # Pulls first, a rewired edge can be pulled from and pushed onto the same node's paths
+    path_updates = [UpdateOne({"node_id": node_id}, {"$pull": {path_field: {"$in": sorted(edge_ids)}}})
+                    for (node_id, path_field), edge_ids in patch.path_pulls.items() if edge_ids]
+    path_updates += [UpdateOne({"node_id": node_id}, {"$push": {path_field: {"$each": sorted(edge_ids)}}})
+                     for (node_id, path_field), edge_ids in patch.path_pushes.items() if edge_ids]
+    if path_updates:
+        Node._get_collection().bulk_write(path_updates, ordered=True)
+
+
+def patch_compiled(compiled, patch: GraphPatch, version: int):
+    """
+    The compiled graph of `version` (the one the patch produced), derived from
+    the compiled graph of the version it was planned against. The graph is
+    edited on a copy, so runs still holding the old compiled graph are not
+    affected. Returns None for backends that can't be edited.
+    """
+    if isinstance(compiled.graph, CompactGraph) or compiled.graph.disabled:
+        return None
+
+    touched = set()
+    for op in patch.engine_ops:
+        if op[0] == "add_edge":
+            touched.update((op[1]['src_node'], op[1]['dst_node']))
+    graph = compiled.graph.copy_topology(touched)
+
+    # Destinations of changed edges, whose level has to be checked again
+    dirty: Set[str] = set()
+    removed_nodes: Set[str] = set()
+    added_edges: Dict[str, dict] = {}
+    removed_edges: Set[str] = set()
+    for op in patch.engine_ops:
+        kind = op[0]
+        if kind == "add_node":
+            graph.add_node(op[1], op[2])
+            dirty.add(op[1])
+            removed_nodes.discard(op[1])
+        elif kind == "remove_node":
+            dirty.update(graph.directed_adj.get(op[1], ()))
+            removed_edges.update(graph.incident_edge_ids(op[1]))
+            graph.remove_node(op[1])
+            removed_nodes.add(op[1])
+        elif kind == "add_edge":
+            graph.add_edge(op[1])
+            added_edges[op[1]['edge_id']] = op[1]
+            dirty.add(op[1]['dst_node'])
+        else:
+            edge = graph.edges.get(op[1])
+            if edge is not None:
+                dirty.add(edge.dst_node)
+            removed_edges.add(op[1])
+            graph.remove_edge(op[1])
+    dirty -= removed_nodes
+
+    levels = None
+    topo_order = None
+    if compiled.is_not_cyclic:
+        levels = compiled.levels
+        if levels is None:
+            levels = {node_id: depth for depth, level in enumerate(compiled.topo_order) for node_id in level}
+        insertions = sum(1 for op in patch.engine_ops if op[0] in ("add_node", "add_edge"))
+        result = relevel(graph, levels, dirty, removed_nodes,
+                         (insertions + 1) * (len(compiled.topo_order) + insertions + 1))
+        if result is not None:
+            levels, moved = result
+            topo_order = reorder_levels(compiled.topo_order, moved)
+    if topo_order is None:
+        # A cycle, before or after the patch: sort from scratch
+        topo_order, is_not_cyclic = graph.process_graph()
+        levels = None
+    else:
+        is_not_cyclic = True
+
+    # The lists are only filtered when something was removed from them
+    removed = set(patch.removed_members)
+    node_ids = compiled.node_ids
+    if removed:
+        node_ids = [node_id for node_id in node_ids if node_id not in removed]
+    node_ids = node_ids + patch.added_members
+    nodes = dict(compiled.nodes)
+    for node_id in removed:
+        nodes.pop(node_id, None)
+    for node_id in patch.added_members:
+        nodes[node_id] = patch.nodes[node_id]
+    edge_list = compiled.edge_list
+    stale = removed_edges | added_edges.keys()
+    if stale:
+        edge_list = [edge for edge in edge_list if edge['edge_id'] not in stale]
+    edge_list = edge_list + [
+        {"dst_node": edge['dst_node'], "edge_id": edge_id, "src_node": edge['src_node'],
+         "src_to_dst_data_keys": edge['src_to_dst_data_keys']}
+        for edge_id, edge in added_edges.items() if edge_id in graph.edges
+    ]
+
+    return dataclasses.replace(
+        compiled,
+        version=version,
+        node_ids=node_ids,
+        nodes=nodes,
+        edge_list=edge_list,
+        graph=graph,
+        connected=graph.is_connected(),
+        topo_order=topo_order,
+        is_not_cyclic=is_not_cyclic,
+        levels=levels,
+        schema=compiled.schema if compiled.schema is not None and compiled.schema["valid"] else None
+    )
+
+
+def relevel(graph, levels: Dict[str, int], dirty: Set[str], removed: Set[str],
+            limit: int) -> Optional[Tuple[Dict[str, int], Dict[str, Tuple[Optional[int], Optional[int]]]]]:
+    """
+    Recomputes the level (longest path from a root) of the dirty nodes and of
+    whatever they push up or pull down, visiting nodes by increasing current
+    level, after the `removed` nodes left the graph. Returns (levels, moved)
+    with moved mapping each node whose level changed to (old, new), None
+    meaning absent; or None if a level passes `limit`, which a cycle always
+    does (the caller then sorts the whole graph).
+    """
+    levels = dict(levels)
+    moved: Dict[str, Tuple[Optional[int], Optional[int]]] = {}
+    for node_id in removed:
+        if node_id in levels:
+            moved[node_id] = (levels.pop(node_id), None)
+
+    heap = [(levels.get(node_id, 0), node_id) for node_id in dirty]
+    heapq.heapify(heap)
+    while heap:
+        _, node_id = heapq.heappop(heap)
+        if node_id not in graph.nodes:
+            continue
+        level = max((levels.get(src_node, 0) + 1 for src_node in graph.reverse_adj.get(node_id, ())), default=0)
+        old = levels.get(node_id)
+        if level == old:
+            continue
+        if level > limit:
+            return None
+        levels[node_id] = level
+        moved[node_id] = (moved[node_id][0] if node_id in moved else old, level)
+        for dst_node in graph.directed_adj.get(node_id, ()):
+            heapq.heappush(heap, (levels.get(dst_node, level + 1), dst_node))
+    return levels, moved
+
+
+def reorder_levels(topo_order: List[List[str]],
+                   moved: Dict[str, Tuple[Optional[int], Optional[int]]]) -> List[List[str]]:
+    """
+    Moves nodes between topological levels, copying only the levels that
+    change. Each level keeps process_graph's descending node_id order.
+    """
+    topo_order = list(topo_order)
+    copied = set()
+
+    def level_at(depth: int) -> List[str]:
+        while len(topo_order) <= depth:
+            topo_order.append([])
+            copied.add(len(topo_order) - 1)
+        if depth not in copied:
+            topo_order[depth] = list(topo_order[depth])
+            copied.add(depth)
+        return topo_order[depth]
+
+    for node_id, (old, new) in moved.items():
+        if old == new:
+            continue
+        if old is not None:
+            level_at(old).remove(node_id)
+        if new is not None:
+            level = level_at(new)
+            # Descending order: insert before the first smaller node_id
+            low, high = 0, len(level)
+            while low < high:
+                middle = (low + high) // 2
+                if level[middle] > node_id:
+                    low = middle + 1
+                else:
+                    high = middle
+            level.insert(low, node_id)
+
+    while topo_order and not topo_order[-1]:
+        topo_order.pop()
+    return topo_order
@@ -0,0 +1,104 @@
+import json
+import zlib
+from typing import Dict, List, Optional
+import gridfs
+from models import GraphSnapshot
+from config import Config
+
+
+# Materialized graph snapshots.
+#
+# A snapshot holds everything needed to rebuild a compiled graph without
+# touching the nodes and edges collections: the graph's node ids, the
+# data_in/data_out schema of each node, the edges as interned source and
+# destination indices with their key mappings, and the connectivity and
+# toposort results. It is stored as zlib-compressed JSON in one GraphSnapshot
+# document, or in GridFS when larger than SNAPSHOT_INLINE_MAX_BYTES.
+# Snapshots are tagged with the graph version they were built from; a version
+# bump makes them stale and the next load rebuilds and replaces them.
+
+SNAPSHOT_FORMAT = 1
+GRIDFS_COLLECTION = 'graph_snapshots_fs'
+
+
+def encode_snapshot(node_ids: List[str], nodes: Dict[str, dict], edge_list: List[dict],
+                    connected: bool, topo_order: List[List[str]], is_not_cyclic: bool) -> bytes:
+    index = {node_id: position for position, node_id in enumerate(node_ids)}
+    payload = {
+        "format": SNAPSHOT_FORMAT,
+        "node_ids": node_ids,
+        # [position, data_in, data_out] of the nodes that exist
+        "nodes": [[index[node_id], node.get('data_in', {}), node.get('data_out', {})]
+                  for node_id, node in nodes.items() if node_id in index],
+        "edge_ids": [edge['edge_id'] for edge in edge_list],
+        "edge_src": [index[edge['src_node']] for edge in edge_list],
+        "edge_dst": [index[edge['dst_node']] for edge in edge_list],
+        "edge_keys": [edge.get('src_to_dst_data_keys', {}) for edge in edge_list],
+        "connected": connected,
+        "is_not_cyclic": is_not_cyclic,
+        "topo_order": [[index[node_id] for node_id in level] for level in topo_order]
+    }
+    return zlib.compress(json.dumps(payload, separators=(',', ':')).encode(), 1)
+
+
+def decode_snapshot(data: bytes) -> Optional[dict]:
+    """
+    Returns node_ids, nodes, edge_list, connected, topo_order and is_not_cyclic
+    as get_compiled_graph builds them, or None for an unknown format.
+    """
+    payload = json.loads(zlib.decompress(data))
+    if payload.get("format") != SNAPSHOT_FORMAT:
+        return None
+    node_ids = payload["node_ids"]
+    nodes = {node_ids[position]: {"node_id": node_ids[position], "data_in": data_in, "data_out": data_out}
+             for position, data_in, data_out in payload["nodes"]}
+    edge_list = [
+        {"edge_id": edge_id, "src_node": node_ids[src], "dst_node": node_ids[dst], "src_to_dst_data_keys": keys}
+        for edge_id, src, dst, keys in zip(payload["edge_ids"], payload["edge_src"],
+                                           payload["edge_dst"], payload["edge_keys"])
+    ]
+    return {
+        "node_ids": node_ids,
+        "nodes": nodes,
+        "edge_list": edge_list,
+        "connected": payload["connected"],
+        "topo_order": [[node_ids[position] for position in level] for level in payload["topo_order"]],
+        "is_not_cyclic": payload["is_not_cyclic"]
+    }
+
+
+def _gridfs() -> gridfs.GridFS:
+    return gridfs.GridFS(GraphSnapshot._get_db(), collection=GRIDFS_COLLECTION)
+
+
+def load_snapshot(graph_id: str, version: int) -> Optional[dict]:
+    """The decoded snapshot of this graph version, or None if there is none. One read (two from GridFS)."""
+    doc = GraphSnapshot.objects(graph_id=graph_id, version=version).as_pymongo().first()
+    if doc is None:
+        return None
+    if doc.get('gridfs_id') is not None:
+        try:
+            data = _gridfs().get(doc['gridfs_id']).read()
+        except gridfs.NoFile:
+            return None
+    else:
+        data = doc['data']
+    return decode_snapshot(data)
+
+
+def save_snapshot(graph_id: str, version: int, data: bytes) -> None:
+    """Store a snapshot, replacing the graph's previous one (and its GridFS file)."""
+    previous = GraphSnapshot.objects(graph_id=graph_id).only('gridfs_id').as_pymongo().first()
+
+    fields = {"version": version, "format": SNAPSHOT_FORMAT, "size": len(data)}
+    if len(data) > Config.SNAPSHOT_INLINE_MAX_BYTES:
+        fields["gridfs_id"] = _gridfs().put(data, filename=f"{graph_id}:{version}")
+        fields["data"] = None
+    else:
+        fields["gridfs_id"] = None
+        fields["data"] = data
+
+    GraphSnapshot._get_collection().update_one({"graph_id": graph_id}, {"$set": fields}, upsert=True)
+
+    if previous and previous.get('gridfs_id') is not None:
+        _gridfs().delete(previous['gridfs_id'])
@@ -0,0 +1,287 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+from config import Config
+
+# Job lifecycle: queued -> running -> succeeded | failed | cancelled
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+# runner(job, is_cancelled) -> (result, status_code)
+Runner = Callable[[dict, Callable[[], bool]], Tuple[dict, int]]
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """Raised by a runner that noticed the job was cancelled."""
+
+
+class JobQueueFull(Exception):
+    """Raised by JobManager.submit when the queue is at its limit."""
+
+
+class InMemoryJobStore:
+    """
+    Keeps jobs in a dict of this process. Finished jobs beyond max_finished are
+    dropped oldest first. Waiters are woken up on every status change.
+    """
+
+    def __init__(self, max_finished: int = 1000):
+        self.max_finished = max_finished
+        self._jobs: Dict[str, dict] = {}
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+        self._changed = threading.Condition()
+
+    def create(self, job: dict) -> None:
+        with self._changed:
+            self._jobs[job["job_id"]] = dict(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._changed:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._apply(job_id, job, fields)
+
+    def transition(self, job_id: str, from_status: str, **fields) -> bool:
+        """Update the job only if its status is still from_status. Returns whether it was."""
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != from_status:
+                return False
+            self._apply(job_id, job, fields)
+            return True
+
+    def _apply(self, job_id: str, job: dict, fields: dict) -> None:
+        job.update(fields)
+        if job["status"] in FINISHED and job_id not in self._finished:
+            self._finished[job_id] = None
+            while len(self._finished) > self.max_finished:
+                self._jobs.pop(self._finished.popitem(last=False)[0], None)
+        self._changed.notify_all()
+
+    def request_cancel(self, job_id: str) -> bool:
+        """Flag the job for cancellation. Returns False if it doesn't exist or already finished."""
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] in FINISHED:
+                return False
+            job["cancel_requested"] = True
+            return True
+
+    def cancel_requested(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        return bool(job and job.get("cancel_requested"))
+
+    def wait(self, job_id: str, timeout: float) -> Optional[dict]:
+        """Block until the job is finished or the timeout expires, then return it."""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                job = self._jobs.get(job_id)
+                remaining = deadline - time.monotonic()
+                if job is None or job["status"] in FINISHED or remaining <= 0:
+                    return dict(job) if job is not None else None
+                self._changed.wait(remaining)
+
+
+class MongoJobStore:
+    """
+    Keeps jobs in the `run_jobs` collection, so every app process can report
+    their status and results. Jobs still run on the process that accepted them.
+    """
+    POLL_INTERVAL = 0.2
+
+    def __init__(self):
+        from models import RunJob
+        self.collection = RunJob._get_collection()
+
+    def create(self, job: dict) -> None:
+        self.collection.insert_one(dict(job))
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self.collection.find_one({"job_id": job_id}, {"_id": 0})
+
+    def update(self, job_id: str, **fields) -> None:
+        self.collection.update_one({"job_id": job_id}, {"$set": fields})
+
+    def transition(self, job_id: str, from_status: str, **fields) -> bool:
+        result = self.collection.update_one({"job_id": job_id, "status": from_status}, {"$set": fields})
+        return result.matched_count > 0
+
+    def request_cancel(self, job_id: str) -> bool:
+        result = self.collection.update_one(
+            {"job_id": job_id, "status": {"$nin": list(FINISHED)}},
+            {"$set": {"cancel_requested": True}}
+        )
+        return result.matched_count > 0
+
+    def cancel_requested(self, job_id: str) -> bool:
+        job = self.collection.find_one({"job_id": job_id}, {"cancel_requested": 1})
+        return bool(job and job.get("cancel_requested"))
+
+    def wait(self, job_id: str, timeout: float) -> Optional[dict]:
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in FINISHED or time.monotonic() >= deadline:
+                return job
+            time.sleep(self.POLL_INTERVAL)
+
+
+JOB_STORES = {
+    "memory": lambda: InMemoryJobStore(Config.JOB_MAX_FINISHED),
+    "mongo": MongoJobStore
+}
+
+
+class JobManager:
+    """
+    Runs jobs on a fixed number of worker threads fed by a bounded queue.
+    The worker count caps how many runs execute at once, so heavy runs can't
+    take every request thread; submissions beyond max_queue are rejected.
+    Workers are started on the first submission.
+    """
+
+    def __init__(self, runner: Runner, store_factory: Callable[[], Any],
+                 workers: int = 2, max_queue: int = 100):
+        self.runner = runner
+        self.store_factory = store_factory
+        self.workers = workers
+        self.max_queue = max_queue
+        self._store = None
+        self._queue: "queue.Queue[str]" = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+        self.running = 0
+        self.counts = {"submitted": 0, "rejected": 0, SUCCEEDED: 0, FAILED: 0, CANCELLED: 0}
+
+    @property
+    def store(self):
+        with self._lock:
+            if self._store is None:
+                self._store = self.store_factory()
+            return self._store
+
+    def submit(self, graph_id: str, config: dict) -> dict:
+        """Queue a run and return its job record. Raises JobQueueFull."""
+        self._start_workers()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "graph_id": graph_id,
+            "config": config,
+            "status": QUEUED,
+            "cancel_requested": False,
+            "submitted_at": datetime.utcnow()
+        }
+        self.store.create(job)
+        try:
+            self._queue.put_nowait(job["job_id"])
+        except queue.Full:
+            self.store.update(job["job_id"], status=FAILED, error="Job queue is full",
+                              finished_at=datetime.utcnow())
+            with self._lock:
+                self.counts["rejected"] += 1
+            raise JobQueueFull()
+        with self._lock:
+            self.counts["submitted"] += 1
+        return job
+
+    def get(self, job_id: str, wait: float = 0) -> Optional[dict]:
+        """The job record; with wait > 0, long-poll until it finishes or wait seconds pass."""
+        if wait > 0:
+            return self.store.wait(job_id, wait)
+        return self.store.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Request cancellation. A queued job is cancelled before it starts, a running
+        one stops at its next cancellation point (between topological levels).
+        """
+        store = self.store
+        if not store.request_cancel(job_id):
+            return False
+        # Report a job that is still queued as cancelled right away, the worker will skip it.
+        # Conditional, so a worker starting it meanwhile isn't overwritten.
+        if store.transition(job_id, QUEUED, status=CANCELLED, finished_at=datetime.utcnow()):
+            with self._lock:
+                self.counts[CANCELLED] += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queued": self._queue.qsize(),
+                "running": self.running,
+                **self.counts
+            }
+
+    def _start_workers(self) -> None:
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"run-job-{len(self._threads)}",
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._execute(job_id)
+            except Exception:
+                # A store failure must not take the worker down with the job
+                logger.exception("Run job %s failed", job_id)
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, job_id: str) -> None:
+        store = self.store
+        job = store.get(job_id)
+        # Skips jobs cancelled (or rejected) while queued
+        if job is None or not store.transition(job_id, QUEUED, status=RUNNING, started_at=datetime.utcnow()):
+            return
+
+        with self._lock:
+            self.running += 1
+        try:
+            result, status_code = self.runner(job, lambda: store.cancel_requested(job_id))
+        except JobCancelled:
+            self._finish(job_id, CANCELLED)
+        except Exception as e:
+            self._finish(job_id, FAILED, error=str(e))
+        else:
+            self._finish(job_id, SUCCEEDED, result=result, status_code=status_code)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def _finish(self, job_id: str, status: str, **fields) -> None:
+        self.store.update(job_id, status=status, finished_at=datetime.utcnow(), **fields)
+        with self._lock:
+            self.counts[status] += 1
+
+
+def job_response(job: dict) -> dict:
+    """A job record as returned by the API: no run config, timestamps in ISO format."""
+    response = {key: value for key, value in job.items() if key not in ("config", "cancel_requested")}
+    for key in ("submitted_at", "started_at", "finished_at"):
+        if isinstance(response.get(key), datetime):
+            response[key] = response[key].isoformat()
+    return response
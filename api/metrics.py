@@ -0,0 +1,198 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Tuple
+from flask import Response, g, has_request_context, request
+from pymongo import monitoring
+from config import Config
+
+
+# Instrumentation, enabled with METRICS_ENABLED.
+#
+# phase("load") times a block of a request; the totals go to the
+# graph_phase_seconds summary and, with SERVER_TIMING, into the response's
+# Server-Timing header. A pymongo command listener counts Mongo commands per
+# request and in total. When disabled, phase() returns a shared no-op context
+# manager and no hooks or listeners are installed.
+
+Labels = Tuple[Tuple[str, str], ...]
+
+METRICS = {
+    "http_requests_total": ("counter", "HTTP requests by endpoint, method and status."),
+    "http_request_seconds": ("summary", "HTTP request latency by endpoint."),
+    "graph_phase_seconds": ("summary", "Time spent in each phase of loading and running graphs."),
+    "graph_run_nodes": ("summary", "Nodes of the graphs that were compiled."),
+    "graph_run_edges": ("summary", "Edges of the graphs that were compiled."),
+    "mongo_commands_total": ("counter", "Mongo commands sent, by command name."),
+    "mongo_command_seconds": ("summary", "Mongo command latency, by command name."),
+    "mongo_command_failures_total": ("counter", "Failed Mongo commands, by command name."),
+}
+
+
+class MetricsRegistry:
+    """Thread-safe counters and summaries (as _sum/_count pairs), rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, Labels], float] = defaultdict(float)
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1) -> None:
+        with self._lock:
+            self._values[(name, labels)] += value
+
+    def observe(self, name: str, labels: Labels, value: float) -> None:
+        with self._lock:
+            self._values[(name + "_sum", labels)] += value
+            self._values[(name + "_count", labels)] += 1
+
+    def render(self, gauges: Dict[str, Dict[str, float]]) -> str:
+        """Prometheus text exposition of the registry plus the given {name: {help, value}} gauges."""
+        with self._lock:
+            values = sorted(self._values.items())
+
+        lines = []
+        for name, (kind, help_text) in sorted(METRICS.items()):
+            samples = [(sample, labels, value) for (sample, labels), value in values
+                       if sample == name or sample in (name + "_sum", name + "_count")]
+            if not samples:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample, labels, value in samples:
+                lines.append(f"{sample}{format_labels(labels)} {format_value(value)}")
+        for name, gauge in sorted(gauges.items()):
+            lines.append(f"# HELP {name} {gauge['help']}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {format_value(gauge['value'])}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+def format_value(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"') for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+registry = MetricsRegistry()
+_NOOP = nullcontext()
+
+
+def phase(name: str):
+    """Context manager timing one phase of the current request. A no-op unless METRICS_ENABLED."""
+    if not Config.METRICS_ENABLED:
+        return _NOOP
+    return _timed_phase(name)
+
+
+@contextmanager
+def _timed_phase(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe("graph_phase_seconds", (("phase", name),), elapsed)
+        if has_request_context():
+            phases = g.setdefault("metrics_phases", {})
+            phases[name] = phases.get(name, 0) + elapsed
+
+
+def record_graph_size(num_nodes: int, num_edges: int) -> None:
+    if not Config.METRICS_ENABLED:
+        return
+    registry.observe("graph_run_nodes", (), num_nodes)
+    registry.observe("graph_run_edges", (), num_edges)
+    if has_request_context():
+        g.metrics_graph_size = (num_nodes, num_edges)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Counts and times Mongo commands, per request and in total."""
+
+    def started(self, event) -> None:
+        registry.inc("mongo_commands_total", (("command", event.command_name),))
+        if has_request_context():
+            g.metrics_mongo_commands = g.get("metrics_mongo_commands", 0) + 1
+
+    def succeeded(self, event) -> None:
+        registry.observe("mongo_command_seconds", (("command", event.command_name),),
+                         event.duration_micros / 1e6)
+
+    def failed(self, event) -> None:
+        registry.inc("mongo_command_failures_total", (("command", event.command_name),))
+
+
+def _start_request() -> None:
+    g.metrics_start = time.perf_counter()
+
+
+def _finish_request(response: Response) -> Response:
+    elapsed = time.perf_counter() - g.get("metrics_start", time.perf_counter())
+    endpoint = request.endpoint or "unmatched"
+    registry.inc("http_requests_total", (("endpoint", endpoint), ("method", request.method),
+                                         ("status", str(response.status_code))))
+    registry.observe("http_request_seconds", (("endpoint", endpoint),), elapsed)
+
+    if Config.SERVER_TIMING:
+        entries = [f"{name};dur={seconds * 1e3:.2f}"
+                   for name, seconds in g.get("metrics_phases", {}).items()]
+        entries.append(f'mongo;desc="{g.get("metrics_mongo_commands", 0)} commands"')
+        if "metrics_graph_size" in g:
+            entries.append('graph;desc="{} nodes, {} edges"'.format(*g.metrics_graph_size))
+        entries.append(f"total;dur={elapsed * 1e3:.2f}")
+        response.headers["Server-Timing"] = ", ".join(entries)
+    return response
+
+
+def metrics_endpoint() -> Response:
+    """Prometheus text format: request, phase and Mongo metrics plus cache and job gauges."""
+    from .graph_cache import compiled_graphs, run_states
+    from .result_cache import run_results
+    from .graph_api import run_jobs
+
+    gauges = {}
+    for prefix, stats in (("graph_cache", compiled_graphs.stats()), ("run_state_cache", run_states.stats()),
+                          ("result_cache", run_results.stats())):
+        for key in ("entries", "bytes", "hits", "misses", "hit_rate", "evictions", "invalidations",
+                    "store_hits", "shared"):
+            if key not in stats:
+                continue
+            gauges[f"{prefix}_{key}"] = {"help": f"{prefix.replace('_', ' ').capitalize()} {key.replace('_', ' ')}.",
+                                         "value": stats[key]}
+    for key, value in run_jobs.stats().items():
+        gauges[f"run_jobs_{key}"] = {"help": f"Async run jobs: {key}.", "value": value}
+    return Response(registry.render(gauges), mimetype="text/plain; version=0.0.4")
+
+
+_listener_lock = threading.Lock()
+_listener_registered = False
+
+
+def init_app(app) -> None:
+    """
+    Register /metrics and, if METRICS_ENABLED, the request hooks and the Mongo
+    command listener. Call before the Mongo client is created (the listener is
+    only attached to clients created afterwards). pymongo listeners are global,
+    so the listener is registered once per process, however many apps are created.
+    """
+    global _listener_registered
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
+    if not Config.METRICS_ENABLED:
+        return
+    with _listener_lock:
+        if not _listener_registered:
+            monitoring.register(MongoCommandListener())
+            _listener_registered = True
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
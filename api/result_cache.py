@@ -0,0 +1,156 @@
+import hashlib
+import json
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+from config import Config
+from .graph_cache import CompiledGraphCache
+
+
+# Memoized run responses.
+#
+# A run's response only depends on the graph version and its run config, so
+# identical configs of an unchanged graph are answered from the serialized
+# response bytes of the first one, without compiling, propagating or calling
+# jsonify. Entries live in an in-process LRU and, with RESULT_CACHE_MONGO, in
+# the run_results collection (expired by a TTL index) so other processes and
+# restarts share them. Concurrent identical requests are collapsed: the first
+# one computes, the others wait for its response.
+
+# Documents are limited to 16MB, larger responses are only cached in memory
+MONGO_MAX_BYTES = 15 * 1024 * 1024
+
+# (response body, status code)
+CachedResponse = Tuple[bytes, int]
+
+
+def result_key(graph_id: str, version: int, config: dict, response_format: str = "json") -> str:
+    """
+    Stable hash of a run config for one graph version and response format.
+    Object keys are canonicalized; disable_list and outputs order and
+    duplicates don't matter.
+    """
+    payload = {
+        "graph_id": graph_id,
+        "version": version,
+        "format": response_format,
+        "root_inputs": config["root_inputs"],
+        "data_overwrites": config["data_overwrites"],
+        "disable_list": sorted({json.dumps(node_id, sort_keys=True) for node_id in config["disable_list"]}),
+        "outputs": sorted(set(config["outputs"])) if config.get("outputs") is not None else None
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+class MongoResultStore:
+    """Second tier kept in the `run_results` collection, expired after RESULT_CACHE_TTL seconds."""
+
+    def __init__(self):
+        from models import RunResult
+        self.collection = RunResult._get_collection()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        doc = self.collection.find_one({"key": key}, {"body": 1, "status": 1})
+        if doc is None:
+            return None
+        return bytes(doc["body"]), doc["status"]
+
+    def put(self, key: str, graph_id: str, version: int, body: bytes, status: int) -> None:
+        if len(body) > MONGO_MAX_BYTES:
+            return
+        self.collection.update_one({"key": key}, {"$set": {
+            "graph_id": graph_id,
+            "version": version,
+            "body": body,
+            "status": status,
+            "created_at": datetime.utcnow()
+        }}, upsert=True)
+
+
+class _Flight:
+    """One computation in progress, waited on by identical concurrent requests."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response: Optional[CachedResponse] = None
+
+
+class ResultCache:
+    """
+    Serialized run responses keyed by result_key, in an LRU (entries and bytes
+    bounded) backed by an optional store, with single-flight computation.
+    Only 200 responses are cached.
+    """
+
+    def __init__(self, memory: CompiledGraphCache, store_factory: Optional[Callable[[], MongoResultStore]] = None):
+        self.memory = memory
+        self.store_factory = store_factory
+        self._store = None
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.store_hits = 0
+        self.shared = 0
+
+    @property
+    def store(self) -> Optional[MongoResultStore]:
+        if self.store_factory is not None and self._store is None:
+            self._store = self.store_factory()
+        return self._store
+
+    def get_or_compute(self, graph_id: str, version: int, key: str,
+                       compute: Callable[[], CachedResponse]) -> Tuple[bytes, int, str]:
+        """
+        Returns (body, status, source) where source is "hit" (memory or store),
+        "shared" (computed by a concurrent identical request) or "miss".
+        """
+        with self._lock:
+            cached = self.memory.get(key, version)
+            if cached is not None:
+                return cached[0], cached[1], "hit"
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.response is not None:
+                with self._lock:
+                    self.shared += 1
+                return flight.response[0], flight.response[1], "shared"
+            # The computation failed, try on our own
+            body, status = compute()
+            return body, status, "miss"
+
+        try:
+            source = "hit"
+            response = self.store.get(key) if self.store is not None else None
+            if response is None:
+                source = "miss"
+                response = compute()
+                if response[1] == 200 and self.store is not None:
+                    self.store.put(key, graph_id, version, *response)
+            else:
+                with self._lock:
+                    self.store_hits += 1
+            if response[1] == 200:
+                self.memory.put(key, version, response, size=len(response[0]))
+            flight.response = response
+            return response[0], response[1], source
+        finally:
+            # The response is in memory before the flight ends, so no request computes it twice
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self) -> Dict[str, float]:
+        stats = self.memory.stats()
+        with self._lock:
+            stats.update(store_hits=self.store_hits, shared=self.shared, in_flight=len(self._flights))
+        return stats
+
+
+run_results = ResultCache(
+    CompiledGraphCache(max_entries=Config.RESULT_CACHE_MAX_ENTRIES, max_bytes=Config.RESULT_CACHE_MAX_BYTES),
+    MongoResultStore if Config.RESULT_CACHE_MONGO else None
+)
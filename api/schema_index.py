@@ -0,0 +1,125 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from models import Graph
+from .validation import validate_node_data, validate_edge_keys
+
+
+# Whole-graph schema validation.
+#
+# Most nodes of a graph share a handful of schemas, so SchemaIndex interns
+# each distinct data_in/data_out table once and keeps node_id -> table id.
+# A node is then checked once per distinct (data_in, data_out) pair and an
+# edge once per distinct (source data_out, destination data_in, key mapping),
+# with validate_node_data/validate_edge_keys, so the reported messages are the
+# ones create_nodes/create_edges give. Every other node or edge costs a few
+# dict lookups.
+#
+# A graph that passes is stamped with Graph.validated_version; runs and later
+# validations of that version trust the stamp instead of checking again.
+
+# Report of a graph version stamped as validated
+VALID_SCHEMA = {"valid": True, "node_errors": [], "edge_errors": []}
+
+# Table id of a data_in/data_out that isn't an object
+_NOT_A_TABLE = -1
+
+
+def _symbol(value: Any) -> Any:
+    # Types are meant to be strings, anything else (unhashable lists, ...) is told apart by its repr
+    return value if isinstance(value, str) else ('repr', repr(value))
+
+
+class SchemaIndex:
+    """node_id -> interned data_in and data_out tables, with memoized checks."""
+
+    def __init__(self):
+        self._ids: Dict[tuple, int] = {}
+        self.tables: List[dict] = []
+        self.data_in: Dict[str, int] = {}
+        self.data_out: Dict[str, int] = {}
+        self._node_checks: Dict[Tuple[int, int], Optional[str]] = {}
+        self._edge_checks: Dict[tuple, Optional[str]] = {}
+
+    @classmethod
+    def from_nodes(cls, nodes: Dict[str, dict]) -> "SchemaIndex":
+        index = cls()
+        for node_id, node in nodes.items():
+            index.add_node(node_id, node.get('data_in', {}), node.get('data_out', {}))
+        return index
+
+    def intern(self, table) -> int:
+        """The id of a {key: type} table, equal for equal tables (in the same key order)."""
+        if not isinstance(table, dict):
+            return _NOT_A_TABLE
+        try:
+            symbol = tuple(table.items())
+            table_id = self._ids.get(symbol)
+        except TypeError:
+            symbol = tuple((key, _symbol(value)) for key, value in table.items())
+            table_id = self._ids.get(symbol)
+        if table_id is None:
+            table_id = self._ids[symbol] = len(self.tables)
+            self.tables.append(table)
+        return table_id
+
+    def add_node(self, node_id: str, data_in, data_out) -> None:
+        self.data_in[node_id] = self.intern(data_in)
+        self.data_out[node_id] = self.intern(data_out)
+
+    def _table(self, table_id: int):
+        return self.tables[table_id] if table_id != _NOT_A_TABLE else None
+
+    def node_error(self, node_id: str) -> Optional[str]:
+        pair = (self.data_in[node_id], self.data_out[node_id])
+        checks = self._node_checks
+        if pair not in checks:
+            checks[pair] = validate_node_data(self._table(pair[0]), self._table(pair[1]))
+        return checks[pair]
+
+    def edge_error(self, edge: dict) -> Optional[str]:
+        src_table = self.data_out.get(edge['src_node'])
+        dst_table = self.data_in.get(edge['dst_node'])
+        if src_table is None or dst_table is None:
+            return "Source or destination node does not exist"
+        keys = edge.get('src_to_dst_data_keys')
+        try:
+            check = (src_table, dst_table, tuple(keys.items()))
+        except (AttributeError, TypeError):
+            return validate_edge_keys(keys, self._table(src_table) or {}, self._table(dst_table) or {})
+        checks = self._edge_checks
+        if check not in checks:
+            checks[check] = validate_edge_keys(keys, self._table(src_table) or {}, self._table(dst_table) or {})
+        return checks[check]
+
+    def node_errors(self) -> List[dict]:
+        """[{"node_id", "error"}] for every node whose data_in/data_out don't agree."""
+        errors = []
+        for node_id in self.data_in:
+            error = self.node_error(node_id)
+            if error:
+                errors.append({"node_id": node_id, "error": error})
+        return errors
+
+    def edge_errors(self, edges: Iterable[dict]) -> List[dict]:
+        """[{"edge_id", "error"}] for every edge whose key mapping doesn't fit its nodes, in edge order."""
+        errors = []
+        for edge in edges:
+            error = self.edge_error(edge)
+            if error:
+                errors.append({"edge_id": edge['edge_id'], "error": error})
+        return errors
+
+
+def validate_schema(nodes: Dict[str, dict], edge_list: Iterable[dict]) -> dict:
+    """Checks every node schema and every edge of a loaded graph: {"valid", "node_errors", "edge_errors"}."""
+    index = SchemaIndex.from_nodes(nodes)
+    node_errors = index.node_errors()
+    edge_errors = index.edge_errors(edge_list)
+    return {"valid": not node_errors and not edge_errors, "node_errors": node_errors, "edge_errors": edge_errors}
+
+
+def mark_validated(graph_id: str, version: int) -> bool:
+    """Stamps `version` as validated, unless the graph has moved past it meanwhile."""
+    expected = version if version else {"$in": [0, None]}
+    result = Graph._get_collection().update_one({"graph_id": graph_id, "version": expected},
+                                                {"$set": {"validated_version": version}})
+    return result.matched_count == 1
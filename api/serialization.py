@@ -0,0 +1,174 @@
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+from flask import Response, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from config import Config
+
+try:
+    import orjson
+except ImportError:  # Falls back to the standard library encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # MessagePack is only offered when installed
+    msgpack = None
+
+
+# Response serialization.
+#
+# Every response built with jsonify() (so every blueprint in api/) goes
+# through the format negotiated from the Accept header:
+#
+#   application/json                                  orjson when installed (FAST_JSON), else the json module
+#   application/msgpack, application/x-msgpack        MessagePack (needs the msgpack package)
+#   application/vnd.datagraph.columnar+json           run "Data" maps stored column-wise, as JSON
+#   application/vnd.datagraph.columnar+msgpack        the same, as MessagePack
+#
+# JSON stays the default for `*/*` or no Accept header. Keys are sorted in
+# every format, as jsonify always did.
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+COLUMNAR_JSON_MIMETYPE = 'application/vnd.datagraph.columnar+json'
+COLUMNAR_MSGPACK_MIMETYPE = 'application/vnd.datagraph.columnar+msgpack'
+
+
+def dumps_json(obj: Any) -> bytes:
+    """Compact JSON with sorted keys, through orjson unless it can't encode the value (e.g. ints over 64 bits)."""
+    if orjson is not None and Config.FAST_JSON:
+        try:
+            return orjson.dumps(obj, default=DefaultJSONProvider.default,
+                                option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), default=DefaultJSONProvider.default).encode()
+
+
+def loads_json(data) -> Any:
+    if orjson is not None and Config.FAST_JSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_msgpack(obj: Any) -> bytes:
+    return msgpack.packb(_sorted_keys(obj), use_bin_type=True, default=DefaultJSONProvider.default)
+
+
+def loads_msgpack(data: bytes) -> Any:
+    """Decodes a MessagePack body. Raises ValueError if it is invalid or msgpack isn't installed."""
+    if msgpack is None:
+        raise ValueError("MessagePack bodies need the msgpack package")
+    try:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+    except (msgpack.UnpackException, ValueError) as e:
+        raise ValueError(f"Invalid MessagePack body: {str(e) or type(e).__name__}")
+
+
+def _sorted_keys(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {key: _sorted_keys(obj[key]) for key in sorted(obj, key=str)}
+    if isinstance(obj, (list, tuple)):
+        return [_sorted_keys(item) for item in obj]
+    return obj
+
+
+def to_columnar(obj: Any) -> Any:
+    """
+    Rewrites every "Data" map of node outputs ({node_id: {"data_in", "data_out"}})
+    column-wise: {"node_ids": [...], "data_in": {key: column}, "data_out": {key: column}}
+    where a column is {"values": [...]} aligned with node_ids, or
+    {"index": [...], "values": [...]} when only the nodes at those positions have the key.
+    """
+    if isinstance(obj, dict):
+        return {key: _columnar_nodes(value) if key == "Data" and _is_node_map(value) else to_columnar(value)
+                for key, value in obj.items()}
+    if isinstance(obj, list) and obj and isinstance(obj[0], (dict, list)):
+        return [to_columnar(item) for item in obj]
+    return obj
+
+
+def _is_node_map(value: Any) -> bool:
+    if not isinstance(value, dict):
+        return False
+    first = next(iter(value.values()), None)
+    return first is None or (isinstance(first, dict) and "data_in" in first)
+
+
+def _columnar_nodes(nodes: Dict[str, dict]) -> dict:
+    node_ids = list(nodes)
+    result = {"node_ids": node_ids}
+    for side in ("data_in", "data_out"):
+        columns: Dict[str, tuple] = {}
+        for position, node_id in enumerate(node_ids):
+            for key, value in nodes[node_id].get(side, {}).items():
+                column = columns.get(key)
+                if column is None:
+                    column = columns[key] = ([], [])
+                column[0].append(position)
+                column[1].append(value)
+        result[side] = {key: {"values": values} if len(positions) == len(node_ids)
+                        else {"index": positions, "values": values}
+                        for key, (positions, values) in columns.items()}
+    return result
+
+
+@dataclass(frozen=True)
+class ResponseFormat:
+    name: str
+    mimetype: str
+    encode: Callable[[Any], bytes]
+
+
+JSON_FORMAT = ResponseFormat("json", JSON_MIMETYPE, lambda obj: dumps_json(obj) + b"\n")
+
+# Listed in order of preference, JSON first so that */* gets JSON
+RESPONSE_FORMATS: List[ResponseFormat] = [
+    JSON_FORMAT,
+    ResponseFormat("columnar", COLUMNAR_JSON_MIMETYPE, lambda obj: dumps_json(to_columnar(obj)) + b"\n"),
+]
+if msgpack is not None:
+    RESPONSE_FORMATS += [
+        ResponseFormat("msgpack", MSGPACK_MIMETYPES[0], dumps_msgpack),
+        ResponseFormat("columnar-msgpack", COLUMNAR_MSGPACK_MIMETYPE, lambda obj: dumps_msgpack(to_columnar(obj))),
+    ]
+
+_BY_MIMETYPE: Dict[str, ResponseFormat] = {fmt.mimetype: fmt for fmt in RESPONSE_FORMATS}
+if msgpack is not None:
+    _BY_MIMETYPE[MSGPACK_MIMETYPES[1]] = _BY_MIMETYPE[MSGPACK_MIMETYPES[0]]
+
+
+def negotiate() -> ResponseFormat:
+    """The response format of the current request, from its Accept header. JSON outside of a request."""
+    if not has_request_context():
+        return JSON_FORMAT
+    return _BY_MIMETYPE[request.accept_mimetypes.best_match(list(_BY_MIMETYPE), default=JSON_MIMETYPE)]
+
+
+def is_msgpack_body() -> bool:
+    return request.mimetype in MSGPACK_MIMETYPES
+
+
+class GraphJSONProvider(DefaultJSONProvider):
+    """Sends jsonify() responses in the negotiated format, and uses orjson for JSON when available."""
+
+    def dumps(self, obj: Any, **kwargs) -> str:
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps_json(obj).decode()
+
+    def loads(self, s, **kwargs) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return loads_json(s)
+
+    def response(self, *args, **kwargs) -> Response:
+        fmt = negotiate()
+        return self._app.response_class(fmt.encode(self._prepare_response_obj(args, kwargs)),
+                                        mimetype=fmt.mimetype)
+
+
+def init_app(app) -> None:
+    """Serialize the app's jsonify() responses through the negotiated format."""
+    app.json = GraphJSONProvider(app)
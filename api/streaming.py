@@ -0,0 +1,27 @@
+from typing import Iterable
+from flask import Response, request, stream_with_context
+from .serialization import dumps_json
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def wants_ndjson() -> bool:
+    """
+    Streaming is opt-in: `Accept: application/x-ndjson` or the `?stream=1` query flag.
+    """
+    if request.args.get('stream', '').lower() in ('1', 'true', 'ndjson'):
+        return True
+    # JSON is listed first so that `*/*` and missing Accept headers keep getting JSON
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def ndjson_response(records: Iterable[dict], status: int = 200) -> Response:
+    """
+    Stream records as newline-delimited JSON. Records are serialised one at a
+    time as the generator produces them, so the full payload is never built.
+    """
+    def generate():
+        for record in records:
+            yield dumps_json(record) + b'\n'
+
+    return Response(stream_with_context(generate()), status=status, mimetype=NDJSON_MIMETYPE)
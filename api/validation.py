@@ -0,0 +1,78 @@
+# Data type validation mapping
+TYPE_MAPPING = {
+    "int": int,
+    "float": float,
+    "str": str,
+    "bool": bool,
+    "list": list,
+    "dict": dict
+}
+
+NODE_REQUIRED_FIELDS = ['node_id', 'data_in', 'data_out']
+EDGE_REQUIRED_FIELDS = ['edge_id', 'src_node', 'dst_node', 'src_to_dst_data_keys']
+NODE_ID_FIELDS = ['node_id']
+EDGE_ID_FIELDS = ['edge_id', 'src_node', 'dst_node']
+
+
+def missing_field_error(data, required_fields):
+    """Returns the error message for the first missing required field, or None."""
+    if not isinstance(data, dict):
+        return "Expected a JSON object"
+    for field in required_fields:
+        if field not in data:
+            return f"Missing required field: {field}"
+    return None
+
+
+def string_field_error(data, fields):
+    """Returns the error message for the first of `fields` that isn't a string, or None."""
+    for field in fields:
+        if not isinstance(data[field], str):
+            return f"{field} must be a string"
+    return None
+
+
+def validate_node_data(data_in, data_out):
+    """Validate a node's data_in/data_out schemas. Returns an error message, or None."""
+    if not isinstance(data_in, dict) or not isinstance(data_out, dict):
+        return "data_in and data_out must be objects"
+
+    # Check if all keys in data_out are present in data_in
+    for key in data_out.keys():
+        if key not in data_in:
+            return f"Key '{key}' in data_out is not present in data_in"
+
+    # Check if data types for the same keys in data_in and data_out match
+    for key, expected_type_str in data_in.items():
+        if key in data_out:
+            expected_type = TYPE_MAPPING.get(expected_type_str)
+            actual_type = TYPE_MAPPING.get(data_out[key])
+
+            if expected_type is None or actual_type is None:
+                return f"Invalid type for key '{key}'"
+
+            if expected_type != actual_type:
+                return (f"Data type mismatch for key '{key}': "
+                        f"{expected_type_str} in data_in vs {data_out[key]} in data_out")
+    return None
+
+
+def validate_edge_keys(src_to_dst_data_keys, src_data_out, dst_data_in):
+    """Validate an edge's key mapping against its nodes' schemas. Returns an error message, or None."""
+    if not isinstance(src_to_dst_data_keys, dict):
+        return "src_to_dst_data_keys must be an object"
+
+    for src_key, dst_key in src_to_dst_data_keys.items():
+        if src_key not in src_data_out or dst_key not in dst_data_in:
+            return (f"Key '{src_key}' not found in src_node data_out or "
+                    f"key '{dst_key}' not found in dst_node data_in")
+
+        # Get actual data types of the values
+        src_value_type = src_data_out[src_key]
+        dst_value_type = dst_data_in[dst_key]
+
+        # Check if types match
+        if src_value_type != dst_value_type:
+            return (f"Data type mismatch for key '{src_key}': "
+                    f"{src_value_type} vs {dst_value_type}")
+    return None
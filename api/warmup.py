@@ -0,0 +1,62 @@
+import time
+from typing import Dict, Iterable, List
+from pymongo.errors import PyMongoError
+from config import Config
+from models import GraphRunConfig
+from .graph_api import get_compiled_graph, check_schema
+
+
+# Cache warmup.
+#
+# Compiled graphs are cached per process, so the first run of every graph in a
+# fresh worker pays for loading, building and sorting it. init_app compiles
+# the configured graphs (WARMUP_GRAPHS, plus the WARMUP_TOP_GRAPHS graphs with
+# the most saved run configs) when the app is created, i.e. before a worker
+# serves its first request. A graph that fails to load is skipped, a
+# warmup never prevents the app from starting.
+
+
+def most_used_graphs(limit: int) -> List[str]:
+    """The `limit` graph ids with the most saved run configs, most used first. One aggregation."""
+    if limit <= 0:
+        return []
+    pipeline = [
+        {"$match": {"graph_id": {"$ne": None}}},
+        {"$group": {"_id": "$graph_id", "configs": {"$sum": 1}}},
+        {"$sort": {"configs": -1, "_id": 1}},
+        {"$limit": limit}
+    ]
+    return [group["_id"] for group in GraphRunConfig._get_collection().aggregate(pipeline)]
+
+
+def warmup_graphs(graph_ids: Iterable[str]) -> Dict[str, float]:
+    """
+    Compiles the given graphs into the compiled graph cache. Returns the
+    seconds spent per graph id, for the graphs that exist.
+    """
+    timings = {}
+    for graph_id in graph_ids:
+        start = time.perf_counter()
+        compiled = get_compiled_graph(graph_id)
+        if compiled is None:
+            continue
+        if Config.SCHEMA_CHECK_RUNS:
+            check_schema(compiled)
+        timings[graph_id] = time.perf_counter() - start
+    return timings
+
+
+def init_app(app) -> Dict[str, float]:
+    """Warm the compiled graph cache of this process up, if WARMUP_GRAPHS or WARMUP_TOP_GRAPHS is set."""
+    if not Config.WARMUP_GRAPHS and Config.WARMUP_TOP_GRAPHS <= 0:
+        return {}
+    start = time.perf_counter()
+    with app.app_context():
+        try:
+            graph_ids = list(dict.fromkeys(Config.WARMUP_GRAPHS + most_used_graphs(Config.WARMUP_TOP_GRAPHS)))
+            timings = warmup_graphs(graph_ids)
+        except PyMongoError as e:
+            app.logger.warning("Graph warmup failed: %s", e)
+            return {}
+    app.logger.info("Warmed up %d graphs in %.2fs", len(timings), time.perf_counter() - start)
+    return timings
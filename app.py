@@ -1,31 +1,77 @@
 from flask import Flask, jsonify
 from flask_mongoengine import MongoEngine
+from pymongo import ReadPreference
 from config import Config
 from api import crud_bp, graph_bp
+from api.metrics import init_app as init_metrics
+from api.serialization import init_app as init_serialization
+from api.warmup import init_app as init_warmup
 
-# Initialize the Flask app and database
-app = Flask(__name__)
-app.config["MONGODB_SETTINGS"] = {
-    "host": Config.MONGO_URI
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
 }
-db = MongoEngine(app)
 
-# Check the connection by pinging the database within the application context
-with app.app_context():
-    try:
-        db.connection.admin.command('ping')
-        print("Connected to MongoDB!")
-    except Exception as e:
-        print("Failed to connect to MongoDB:", e)
+db = MongoEngine()
 
-# Register blueprints
-app.register_blueprint(crud_bp, url_prefix='/crud')
-app.register_blueprint(graph_bp, url_prefix='/graph')
 
-# Root endpoint
-@app.route('/', methods=['GET'])
-def home():
-    return jsonify({"message": "SERVER IS RUNNING"}), 200
+def mongo_settings() -> dict:
+    """
+    MONGODB_SETTINGS for flask-mongoengine. The client is created with
+    connect=False, so nothing is sent to MongoDB until the first query and
+    each process opens its own pool of at most MONGO_MAX_POOL_SIZE connections.
+    """
+    if Config.MONGO_READ_PREFERENCE not in READ_PREFERENCES:
+        raise ValueError(f"Unknown MONGO_READ_PREFERENCE '{Config.MONGO_READ_PREFERENCE}', "
+                         f"expected one of {', '.join(READ_PREFERENCES)}")
+    settings = {
+        "host": Config.MONGO_URI,
+        "connect": False,
+        "maxPoolSize": Config.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": Config.MONGO_MIN_POOL_SIZE,
+        "connectTimeoutMS": Config.MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "read_preference": READ_PREFERENCES[Config.MONGO_READ_PREFERENCE],
+    }
+    # 0 leaves pymongo's default (no limit)
+    optional = {
+        "maxIdleTimeMS": Config.MONGO_MAX_IDLE_TIME_MS,
+        "socketTimeoutMS": Config.MONGO_SOCKET_TIMEOUT_MS,
+        "waitQueueTimeoutMS": Config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    }
+    settings.update({name: value for name, value in optional.items() if value})
+    return settings
+
+
+def create_app() -> Flask:
+    """
+    Build the app. Nothing connects to MongoDB here unless a warmup is
+    configured (WARMUP_GRAPHS / WARMUP_TOP_GRAPHS), in which case those graphs
+    are compiled before the app is returned.
+    """
+    app = Flask(__name__)
+    app.config["MONGODB_SETTINGS"] = mongo_settings()
+    # Before the Mongo client is created, so its commands are counted
+    init_metrics(app)
+    init_serialization(app)
+    db.init_app(app)
+
+    # Register blueprints
+    app.register_blueprint(crud_bp, url_prefix='/crud')
+    app.register_blueprint(graph_bp, url_prefix='/graph')
+
+    # Root endpoint
+    @app.route('/', methods=['GET'])
+    def home():
+        return jsonify({"message": "SERVER IS RUNNING"}), 200
+
+    init_warmup(app)
+    return app
+
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    # Development server only, serve with gunicorn (see wsgi.py) in production
+    create_app().run(debug=Config.FLASK_DEBUG)
@@ -0,0 +1,67 @@
+"""
+Compare the in-memory graph backends (Graph_1 dicts vs CompactGraph CSR arrays).
+
+For each size, reports the memory held by the built graph (tracemalloc) and
+the time taken by is_connected, process_graph and propagate_data.
+
+    python benchmarks/bench_backends.py
+    python benchmarks/bench_backends.py --sizes 100000 1000000 --fanout 2
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.graph_api import GRAPH_BACKENDS  # noqa: E402
+from benchmarks.synthetic import layered_dag, build_graph  # noqa: E402
+
+
+def measure(graph_cls, node_ids, edges):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    graph = build_graph(graph_cls, node_ids, edges)
+    graph.process_graph()  # builds any lazy index structures
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    timings = {}
+    start = time.perf_counter()
+    graph.is_connected()
+    timings["is_connected"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    topo_order, _ = graph.process_graph()
+    timings["process_graph"] = time.perf_counter() - start
+
+    run = graph.fork()
+    for node_id in topo_order[0]:
+        run.set_node_data(node_id, "value", 1)
+    start = time.perf_counter()
+    run.propagate_data(topo_order)
+    timings["propagate_data"] = time.perf_counter() - start
+    return held, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--fanout", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'backend':>8} {'nodes':>9} {'edges':>9} {'MB':>8} {'connect s':>10} {'toposort s':>11} {'propagate s':>12}")
+    for size in args.sizes:
+        node_ids, edges = layered_dag(size, args.fanout)
+        for name, graph_cls in sorted(GRAPH_BACKENDS.items()):
+            held, timings = measure(graph_cls, node_ids, edges)
+            print(f"{name:>8} {len(node_ids):>9} {len(edges):>9} {held / 1e6:>8.1f} "
+                  f"{timings['is_connected']:>10.4f} {timings['process_graph']:>11.4f} "
+                  f"{timings['propagate_data']:>12.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Compare the propagation executors (serial, thread pool, process pool) on wide
+layered DAGs where every node runs a simulated heavy transform.
+
+    hash  sha256 over the node's payload, releases the GIL (thread pool helps)
+    cpu   pure Python arithmetic, holds the GIL (only the process pool helps)
+
+Each run checks that the parallel result matches the serial one.
+
+    python benchmarks/bench_executors.py
+    python benchmarks/bench_executors.py --nodes 4000 --width 1000 --payload 1048576 --workers 8
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.executors import EXECUTORS  # noqa: E402
+from api.graph_api import GRAPH_BACKENDS  # noqa: E402
+from benchmarks.synthetic import layered_dag, build_graph  # noqa: E402
+
+HASH_ROUNDS = 4
+CPU_ROUNDS = 20000
+
+
+def hash_transform(node_id, runtime_data):
+    payload = runtime_data.get("value")
+    if isinstance(payload, bytes):
+        for _ in range(HASH_ROUNDS):
+            hashlib.sha256(payload).digest()
+    return runtime_data
+
+
+def cpu_transform(node_id, runtime_data):
+    total = 0
+    for i in range(CPU_ROUNDS):
+        total = (total * 31 + i) % 1000003
+    return runtime_data
+
+
+TRANSFORMS = {"hash": hash_transform, "cpu": cpu_transform}
+
+
+def run_once(graph, topo_order, payload, executor):
+    run = graph.fork()
+    for node_id in topo_order[0]:
+        run.set_node_data(node_id, "value", payload)
+    start = time.perf_counter()
+    run.propagate_data(topo_order, executor=executor)
+    elapsed = time.perf_counter() - start
+    return elapsed, {node_id: node.runtime_data for node_id, node in run.nodes.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=2000)
+    parser.add_argument("--width", type=int, default=500, help="nodes per level")
+    parser.add_argument("--fanout", type=int, default=2)
+    parser.add_argument("--payload", type=int, default=256 * 1024, help="bytes per node value")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--backend", choices=sorted(GRAPH_BACKENDS), default="dict")
+    parser.add_argument("--transforms", nargs="+", choices=sorted(TRANSFORMS), default=sorted(TRANSFORMS))
+    args = parser.parse_args()
+
+    node_ids, edges = layered_dag(args.nodes, args.fanout, width=args.width)
+    graph = build_graph(GRAPH_BACKENDS[args.backend], node_ids, edges)
+    topo_order, _ = graph.process_graph()
+    payload = os.urandom(args.payload)
+    print(f"{len(node_ids)} nodes, {len(edges)} edges, {len(topo_order)} levels, "
+          f"{args.payload} byte payload, {args.workers} workers")
+
+    print(f"{'transform':>9} {'executor':>8} {'seconds':>9} {'speedup':>8}")
+    failed = False
+    for transform_name in args.transforms:
+        transform = TRANSFORMS[transform_name]
+        baseline = None
+        for name in ("serial", "thread", "process"):
+            if name == "serial":
+                executor = EXECUTORS[name](transform=transform)
+            else:
+                executor = EXECUTORS[name](workers=args.workers, transform=transform, min_level_width=1)
+            try:
+                elapsed, result = run_once(graph, topo_order, payload, executor)
+            finally:
+                executor.shutdown()
+            if baseline is None:
+                baseline = (elapsed, result)
+            elif result != baseline[1]:
+                print(f"{name} executor produced a different result than serial")
+                failed = True
+            print(f"{transform_name:>9} {name:>8} {elapsed:>9.3f} {baseline[0] / elapsed:>7.2f}x")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Regression benchmark for Graph_1.propagate_data.
+
+Builds layered random DAGs of growing size and times propagation on each.
+Propagation should be O(V + E): the time per node+edge must stay roughly flat
+as the graph grows. Exits with status 1 if the largest graph is more than
+--max-ratio times slower per node+edge than the smallest one.
+
+    python benchmarks/bench_propagate.py
+    python benchmarks/bench_propagate.py --sizes 1000 10000 100000 --fanout 4
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.graph_api import GRAPH_BACKENDS  # noqa: E402
+from benchmarks.synthetic import layered_dag, build_graph  # noqa: E402
+
+
+def time_propagation(graph, topo_order, repeat: int) -> float:
+    """Best of `repeat` propagation runs, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        run = graph.fork()
+        for node_id in topo_order[0]:
+            run.set_node_data(node_id, "value", 1)
+        start = time.perf_counter()
+        run.propagate_data(topo_order)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 4000, 16000, 64000])
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backend", choices=sorted(GRAPH_BACKENDS), default="dict")
+    parser.add_argument("--max-ratio", type=float, default=3.0,
+                        help="allowed slowdown per node+edge between the smallest and largest size")
+    args = parser.parse_args()
+
+    print(f"{'nodes':>10} {'edges':>10} {'seconds':>10} {'ns/(V+E)':>10}")
+    per_item = []
+    for size in args.sizes:
+        graph = build_graph(GRAPH_BACKENDS[args.backend], *layered_dag(size, args.fanout))
+        topo_order, _ = graph.process_graph()
+        seconds = time_propagation(graph, topo_order, args.repeat)
+        cost = seconds * 1e9 / (len(graph.nodes) + len(graph.edges))
+        per_item.append(cost)
+        print(f"{len(graph.nodes):>10} {len(graph.edges):>10} {seconds:>10.4f} {cost:>10.1f}")
+
+    ratio = per_item[-1] / per_item[0]
+    print(f"scaling ratio (largest/smallest ns per node+edge): {ratio:.2f}")
+    if ratio > args.max_ratio:
+        print("FAIL: propagation is scaling worse than linearly")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
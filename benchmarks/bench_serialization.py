@@ -0,0 +1,78 @@
+"""
+Compare the response formats on the body of a finished run: Flask's jsonify
+encoder (the json module), orjson, MessagePack and the columnar layout, with
+encoded sizes. Each node gets `--keys` data_in/data_out keys.
+
+    python benchmarks/bench_serialization.py
+    python benchmarks/bench_serialization.py --nodes 100000 --keys 10
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from api import serialization  # noqa: E402
+from api.serialization import dumps_json, dumps_msgpack, to_columnar  # noqa: E402
+from benchmarks.synthetic import layered_dag  # noqa: E402
+
+
+def run_response(num_nodes: int, num_keys: int) -> dict:
+    node_ids, _ = layered_dag(num_nodes)
+    keys = [f"key{k}" for k in range(num_keys)]
+    data = {node_id: {"data_in": {key: position * 7 + k for k, key in enumerate(keys)},
+                      "data_out": {key: position * 7 + k for k, key in enumerate(keys)}}
+            for position, node_id in enumerate(node_ids)}
+    return {"Toposort": [node_ids], "Data": data}
+
+
+def measure(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=20000)
+    parser.add_argument("--keys", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    result = run_response(args.nodes, args.keys)
+    app = Flask(__name__)
+    with app.app_context():
+        from flask import json as flask_json
+        encoders = {"jsonify (json)": lambda: flask_json.dumps(result).encode()}
+    if serialization.orjson is not None:
+        encoders["orjson"] = lambda: dumps_json(result)
+    encoders["columnar (json)"] = lambda: dumps_json(to_columnar(result))
+    if serialization.msgpack is not None:
+        encoders["msgpack"] = lambda: dumps_msgpack(result)
+        encoders["columnar (msgpack)"] = lambda: dumps_msgpack(to_columnar(result))
+
+    print(f"{args.nodes} nodes, {args.keys} keys per side")
+    print(f"{'format':>20} {'ms':>10} {'speedup':>8} {'KB':>10}")
+    baseline = None
+    with app.app_context():
+        for name, encode in encoders.items():
+            seconds = measure(encode, args.repeat)
+            size = len(encode())
+            baseline = baseline or seconds
+            print(f"{name:>20} {seconds * 1e3:>10.1f} {baseline / seconds:>7.1f}x {size / 1024:>10.0f}")
+
+    # The row formats must decode back to the same run
+    assert json.loads(dumps_json(result)) == result
+    if serialization.msgpack is not None:
+        assert serialization.loads_msgpack(dumps_msgpack(result)) == result
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Cold start of an app process:
+
+    create_app  import app.py and create_app() in a fresh interpreter, as a
+                gunicorn worker does (against --uri, or an address that never
+                answers, so the time is the same with or without a server)
+    first query the first Mongo command, which opens the pool (only with --uri)
+    first run   the first /graph/graph_run_config of a graph in a process,
+                without and with a warmup of that graph (against mongomock)
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --uri mongodb://localhost:27017/bench --nodes 20000
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_suite import ApiBench, measure  # noqa: E402
+from benchmarks.synthetic import layered_dag  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Nothing listens there: a blocking connect would hang until the timeout
+UNREACHABLE_URI = "mongodb://10.255.255.1:27017/bench"
+
+CREATE_APP = """
+import time
+start = time.perf_counter()
+from app import create_app
+app = create_app()
+created = time.perf_counter()
+if {query}:
+    import mongoengine
+    mongoengine.get_db().command('ping')
+print(created - start, time.perf_counter() - created)
+"""
+
+
+def bench_create_app(uri: str, repeat: int, query: bool):
+    env = dict(os.environ, MONGO_URI=uri, WARMUP_GRAPHS="", WARMUP_TOP_GRAPHS="0",
+               MONGO_SERVER_SELECTION_TIMEOUT_MS="5000")
+    create_times, query_times = [], []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", CREATE_APP.format(query=query)], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout.split()
+        create_times.append(float(output[0]))
+        query_times.append(float(output[1]))
+    return sorted(create_times)[len(create_times) // 2], sorted(query_times)[len(query_times) // 2]
+
+
+def bench_first_run(num_nodes: int, repeat: int):
+    from api.graph_cache import compiled_graphs
+    from api.result_cache import run_results
+    from api.warmup import warmup_graphs
+
+    api = ApiBench()
+    api.reset()
+    node_ids, edges = layered_dag(num_nodes)
+    api.post('/crud/bulk_create_nodes', [{"node_id": node_id, "data_in": {"value": "int"},
+                                          "data_out": {"value": "int"}} for node_id in node_ids])
+    api.post('/crud/bulk_create_edges', edges)
+    api.post('/crud/create_graph', {"graph_id": "bench", "nodes": node_ids})
+    run = lambda: api.post('/graph/graph_run_config',  # noqa: E731
+                           {"graph_id": "bench", "root_inputs": {node_ids[0]: {"value": 1}}})
+
+    def fresh_process():
+        compiled_graphs.clear()
+        run_results.memory.clear()
+
+    def warmed_up():
+        fresh_process()
+        warmup_graphs(["bench"])
+
+    return {
+        "cold": measure(run, repeat, setup=fresh_process, trace_memory=False),
+        "warmup": measure(lambda: warmup_graphs(["bench"]), repeat, setup=fresh_process, trace_memory=False),
+        "warmed up": measure(run, repeat, setup=warmed_up, trace_memory=False),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", help="a MongoDB to connect to, for the first query timing")
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    create_time, query_time = bench_create_app(args.uri or UNREACHABLE_URI, args.repeat, args.uri is not None)
+    print(f"{'create_app':>12} {create_time * 1e3:>10.1f} ms")
+    if args.uri:
+        print(f"{'first query':>12} {query_time * 1e3:>10.1f} ms")
+
+    print(f"first run of a {args.nodes}-node graph")
+    for name, result in bench_first_run(args.nodes, args.repeat).items():
+        print(f"{name:>12} {result['p50_ms']:>10.1f} ms {result['queries']:>4} Mongo calls")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+Benchmark suite for the graph engine and the HTTP pipeline.
+
+For every graph shape in benchmarks/synthetic.py (chain, fan-out/fan-in, random
+DAG, islands, cycle) and every size, it measures:
+
+    engine  build, connectivity, toposort and propagation on Graph_1 (or --backend)
+    api     bulk ingest through /crud/*, a cold, a warm and a memoized
+            /graph/graph_run_config and /crud/get_graph, against an in-process
+            mongomock database
+
+Each phase reports latency percentiles over --repeat runs, the number of Mongo
+calls made by one run and the peak memory allocated by one run (tracemalloc,
+measured in a separate pass so it doesn't skew the timings).
+
+Results can be saved as a JSON baseline and later runs compared against it:
+a phase fails if its p50 is more than --tolerance times the baseline (and
+more than --min-delta-ms slower), or if it makes more Mongo calls than the
+baseline did.
+
+    python benchmarks/bench_suite.py
+    python benchmarks/bench_suite.py --sizes 10 1000 100000 1000000 --api-max-nodes 1000
+    python benchmarks/bench_suite.py --save benchmarks/baselines/suite.json
+    python benchmarks/bench_suite.py --compare benchmarks/baselines/suite.json
+"""
+import argparse
+import collections
+import gc
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.graph_api import GRAPH_BACKENDS  # noqa: E402
+from benchmarks.synthetic import GENERATORS, SCHEMA, build_graph  # noqa: E402
+
+MONGO_CALLS = ('find', 'find_one', 'insert_one', 'insert_many', 'update_one', 'update_many',
+               'bulk_write', 'aggregate', 'count_documents', 'delete_one', 'delete_many')
+QUERY_COUNTS = collections.Counter()
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def measure(fn: Callable[[], None], repeat: int, setup: Optional[Callable[[], None]] = None,
+            trace_memory: bool = True) -> Dict[str, float]:
+    """Times fn over `repeat` runs (setup is not timed), then runs it once more under tracemalloc."""
+    times = []
+    queries = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        before = sum(QUERY_COUNTS.values())
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+        if queries is None:
+            queries = sum(QUERY_COUNTS.values()) - before
+
+    result = {
+        "runs": repeat,
+        "p50_ms": percentile(times, 50) * 1e3,
+        "p95_ms": percentile(times, 95) * 1e3,
+        "p99_ms": percentile(times, 99) * 1e3,
+        "queries": queries
+    }
+    if trace_memory:
+        if setup:
+            setup()
+        gc.collect()
+        tracemalloc.start()
+        fn()
+        result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def bench_engine(graph_cls, node_ids, edges, repeat: int, trace_memory: bool) -> Dict[str, dict]:
+    results = {"build": measure(lambda: build_graph(graph_cls, node_ids, edges), repeat,
+                                trace_memory=trace_memory)}
+    graph = build_graph(graph_cls, node_ids, edges)
+    results["connectivity"] = measure(graph.is_connected, repeat, trace_memory=trace_memory)
+    results["toposort"] = measure(graph.process_graph, repeat, trace_memory=trace_memory)
+
+    topo_order, is_not_cyclic = graph.process_graph()
+    if is_not_cyclic and topo_order:
+        def propagate():
+            run = graph.fork()
+            for node_id in topo_order[0]:
+                run.set_node_data(node_id, "value", 1)
+            run.propagate_data(topo_order)
+        results["propagate"] = measure(propagate, repeat, trace_memory=trace_memory)
+    return results
+
+
+class ApiBench:
+    """Drives the CRUD and run endpoints of the blueprints against mongomock."""
+
+    def __init__(self):
+        import mongoengine
+        import mongomock
+        from mongomock.collection import Collection
+        from flask import Flask
+        from api import crud_bp, graph_bp
+
+        # Count every Mongo call made through the mongomock collections
+        for name in MONGO_CALLS:
+            method = getattr(Collection, name)
+
+            def counted(self, *args, _method=method, _name=name, **kwargs):
+                QUERY_COUNTS[_name] += 1
+                return _method(self, *args, **kwargs)
+            setattr(Collection, name, counted)
+
+        mongoengine.disconnect()
+        mongoengine.connect("bench", host="mongodb://localhost", mongo_client_class=mongomock.MongoClient)
+        app = Flask(__name__)
+        app.register_blueprint(crud_bp, url_prefix='/crud')
+        app.register_blueprint(graph_bp, url_prefix='/graph')
+        self.client = app.test_client()
+
+    def reset(self) -> None:
+        from models import Node, Edge, Graph, GraphRunConfig, GraphSnapshot, RunResult
+        from api.graph_cache import compiled_graphs
+        from api.result_cache import run_results
+        for document in (Node, Edge, Graph, GraphRunConfig, GraphSnapshot, RunResult):
+            document.drop_collection()
+        compiled_graphs.clear()
+        run_results.memory.clear()
+
+    def post(self, url: str, body) -> dict:
+        response = self.client.post(url, json=body)
+        if response.status_code >= 300:
+            raise RuntimeError(f"{url} answered {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response.get_json()
+
+    def run(self, node_ids, edges, repeat: int, trace_memory: bool) -> Dict[str, dict]:
+        nodes = [{"node_id": node_id, **SCHEMA} for node_id in node_ids]
+        run_config = {"graph_id": "bench", "root_inputs": {node_ids[0]: {"value": 1}}}
+
+        def ingest():
+            self.post('/crud/bulk_create_nodes', nodes)
+            if edges:
+                self.post('/crud/bulk_create_edges', edges)
+            self.post('/crud/create_graph', {"graph_id": "bench", "nodes": node_ids})
+
+        results = {"ingest": measure(ingest, repeat, setup=self.reset, trace_memory=trace_memory)}
+        self.reset()
+        ingest()
+
+        from api.graph_cache import compiled_graphs
+        from api.result_cache import run_results
+
+        def cold():
+            compiled_graphs.clear()
+            run_results.memory.clear()
+
+        run = lambda: self.post('/graph/graph_run_config', run_config)  # noqa: E731
+        results["run_cold"] = measure(run, repeat, setup=cold, trace_memory=trace_memory)
+        run()
+        # Compiled graph cached, response recomputed
+        results["run_warm"] = measure(run, repeat, setup=run_results.memory.clear, trace_memory=trace_memory)
+        run()
+        results["run_memoized"] = measure(run, repeat, trace_memory=trace_memory)
+        results["get_graph"] = measure(lambda: self.post('/crud/get_graph', {"graph_id": "bench"}),
+                                       repeat, trace_memory=trace_memory)
+        return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float,
+            min_delta_ms: float) -> List[str]:
+    """Regressions of results against a baseline, as printable lines."""
+    failures = []
+    for key, expected in baseline.items():
+        actual = results.get(key)
+        if actual is None:
+            continue
+        if actual["p50_ms"] > expected["p50_ms"] * tolerance and actual["p50_ms"] - expected["p50_ms"] > min_delta_ms:
+            failures.append(f"{key}: p50 {actual['p50_ms']:.2f} ms vs baseline {expected['p50_ms']:.2f} ms")
+        if expected.get("queries") is not None and actual["queries"] > expected["queries"]:
+            failures.append(f"{key}: {actual['queries']} Mongo calls vs baseline {expected['queries']}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 200, 10000])
+    parser.add_argument("--shapes", nargs="+", choices=sorted(GENERATORS), default=sorted(GENERATORS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--backend", choices=sorted(GRAPH_BACKENDS), default="dict")
+    parser.add_argument("--api-max-nodes", type=int, default=200,
+                        help="largest size driven through the endpoints (mongomock is slow)")
+    parser.add_argument("--no-api", action="store_true", help="only benchmark the engine")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare with a JSON file written by --save")
+    parser.add_argument("--tolerance", type=float, default=2.0,
+                        help="allowed p50 slowdown factor against the baseline")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0,
+                        help="p50 differences below this are treated as noise")
+    args = parser.parse_args()
+
+    api = None
+    if not args.no_api:
+        try:
+            api = ApiBench()
+        except ImportError as e:
+            print(f"Skipping the api benchmarks: {e}")
+
+    trace_memory = not args.no_memory
+    results = {}
+    print(f"{'target':>6} {'shape':>10} {'nodes':>8} {'phase':>12} {'p50 ms':>10} {'p95 ms':>10} "
+          f"{'p99 ms':>10} {'queries':>8} {'peak KB':>10}")
+    for shape in args.shapes:
+        for size in args.sizes:
+            node_ids, edges = GENERATORS[shape](size)
+            phases = {"engine": bench_engine(GRAPH_BACKENDS[args.backend], node_ids, edges,
+                                             args.repeat, trace_memory)}
+            if api is not None and size <= args.api_max_nodes:
+                phases["api"] = api.run(node_ids, edges, args.repeat, trace_memory)
+
+            for target, target_results in phases.items():
+                for phase, result in target_results.items():
+                    results[f"{target}/{shape}/{size}/{phase}"] = result
+                    peak = f"{result['peak_bytes'] / 1024:>10.0f}" if "peak_bytes" in result else f"{'-':>10}"
+                    print(f"{target:>6} {shape:>10} {size:>8} {phase:>12} {result['p50_ms']:>10.2f} "
+                          f"{result['p95_ms']:>10.2f} {result['p99_ms']:>10.2f} {result['queries']:>8} {peak}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump({
+                "meta": {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "backend": args.backend,
+                    "repeat": args.repeat
+                },
+                "results": results
+            }, f, indent=2, sort_keys=True)
+        print(f"Saved {len(results)} results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        failures = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        print(f"{len(failures)} regressions against {args.compare}")
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
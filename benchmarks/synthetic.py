@@ -0,0 +1,114 @@
+"""Synthetic graph generators shared by the benchmarks."""
+import random
+from typing import Callable, Dict, List, Tuple
+
+SCHEMA = {"data_in": {"value": "int"}, "data_out": {"value": "int"}}
+
+GraphData = Tuple[List[str], List[dict]]
+
+
+def make_edge(edges: List[dict], src: str, dst: str) -> None:
+    edges.append({
+        "edge_id": f"e{len(edges)}",
+        "src_node": src,
+        "dst_node": dst,
+        "src_to_dst_data_keys": {"value": "value"}
+    })
+
+
+def layered_dag(num_nodes: int, fanout: int = 3, width: int = 50,
+                seed: int = 0) -> GraphData:
+    """Nodes are split into layers of `width`; every node gets `fanout` edges to the next layer."""
+    rng = random.Random(seed)
+    node_ids = [f"n{i}" for i in range(num_nodes)]
+    edges = []
+    for i in range(num_nodes - width):
+        layer_start = (i // width + 1) * width
+        layer_end = min(layer_start + width, num_nodes)
+        for dst in rng.sample(range(layer_start, layer_end), min(fanout, layer_end - layer_start)):
+            make_edge(edges, node_ids[i], node_ids[dst])
+    return node_ids, edges
+
+
+def chain(num_nodes: int) -> GraphData:
+    """n0 -> n1 -> ... -> n(num_nodes - 1): one node per topological level."""
+    node_ids = [f"n{i}" for i in range(num_nodes)]
+    edges = []
+    for i in range(num_nodes - 1):
+        make_edge(edges, node_ids[i], node_ids[i + 1])
+    return node_ids, edges
+
+
+def fan_out_in(num_nodes: int) -> GraphData:
+    """One root feeding num_nodes - 2 middle nodes that all feed one sink: a single very wide level."""
+    node_ids = [f"n{i}" for i in range(num_nodes)]
+    edges = []
+    root, sink = node_ids[0], node_ids[-1]
+    for middle in node_ids[1:-1]:
+        make_edge(edges, root, middle)
+        make_edge(edges, middle, sink)
+    return node_ids, edges
+
+
+def random_dag(num_nodes: int, edge_factor: int = 2, seed: int = 0) -> GraphData:
+    """
+    Random DAG with about edge_factor * num_nodes edges, all pointing from a lower
+    to a higher node index. Every node after n0 gets an edge from an earlier node,
+    so the graph is connected with n0 as its only guaranteed root.
+    """
+    rng = random.Random(seed)
+    node_ids = [f"n{i}" for i in range(num_nodes)]
+    edges = []
+    for i in range(1, num_nodes):
+        make_edge(edges, node_ids[rng.randrange(i)], node_ids[i])
+    for _ in range(max(0, (edge_factor - 1) * num_nodes)):
+        a, b = rng.randrange(num_nodes), rng.randrange(num_nodes)
+        if a != b:
+            make_edge(edges, node_ids[min(a, b)], node_ids[max(a, b)])
+    return node_ids, edges
+
+
+def islands(num_nodes: int, num_islands: int = 4) -> GraphData:
+    """num_islands disconnected chains, rejected by the islands check."""
+    node_ids = [f"n{i}" for i in range(num_nodes)]
+    edges = []
+    for i in range(num_nodes - 1):
+        if (i + 1) % max(1, num_nodes // num_islands):
+            make_edge(edges, node_ids[i], node_ids[i + 1])
+    return node_ids, edges
+
+
+def with_cycle(num_nodes: int) -> GraphData:
+    """
+    A random DAG plus one back edge closing a cycle below the root n0, so it
+    passes the root and islands checks and is rejected by the cycle check.
+    """
+    node_ids, edges = random_dag(num_nodes)
+    if num_nodes > 1:
+        # The first num_nodes - 1 edges give every node its parent, walk up to a child of n0
+        parent = {edge["dst_node"]: edge["src_node"] for edge in edges[:num_nodes - 1]}
+        ancestor = node_ids[-1]
+        while parent[ancestor] != node_ids[0]:
+            ancestor = parent[ancestor]
+        make_edge(edges, node_ids[-1], ancestor)
+    return node_ids, edges
+
+
+# Shapes used by bench_suite.py, called as generator(num_nodes)
+GENERATORS: Dict[str, Callable[[int], GraphData]] = {
+    "chain": chain,
+    "fan_out_in": fan_out_in,
+    "random": random_dag,
+    "islands": islands,
+    "cycle": with_cycle
+}
+
+
+def build_graph(graph_cls, node_ids: List[str], edges: List[dict]):
+    """Load generated nodes and edges into a Graph_1-compatible class."""
+    graph = graph_cls()
+    for node_id in node_ids:
+        graph.add_node(node_id, SCHEMA)
+    for edge in edges:
+        graph.add_edge(edge)
+    return graph
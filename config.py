@@ -5,3 +5,68 @@ load_dotenv()
 
 class Config:
     MONGO_URI = os.getenv("MONGO_URI")
+    # MongoDB connection pool, created lazily on the first query. Timeouts in ms, 0 = no limit
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 0))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 20000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 30000))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 0))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 0))
+    # primary, primaryPreferred, secondary, secondaryPreferred or nearest
+    MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+
+    # Graphs compiled by each app process before it serves requests: the ids in
+    # WARMUP_GRAPHS (comma-separated) and the WARMUP_TOP_GRAPHS graphs with the most saved run configs
+    WARMUP_GRAPHS = [graph_id.strip() for graph_id in os.getenv("WARMUP_GRAPHS", "").split(",") if graph_id.strip()]
+    WARMUP_TOP_GRAPHS = int(os.getenv("WARMUP_TOP_GRAPHS", 0))
+
+    # Flask debug mode for `python app.py` (the reloader and debugger, never in production)
+    FLASK_DEBUG = os.getenv("FLASK_DEBUG", "false").lower() in ("1", "true", "yes")
+
+    # Compiled graph cache limits (per process)
+    GRAPH_CACHE_MAX_ENTRIES = int(os.getenv("GRAPH_CACHE_MAX_ENTRIES", 128))
+    GRAPH_CACHE_MAX_BYTES = int(os.getenv("GRAPH_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+    # Materialized graph snapshots, loaded in one read on a compiled graph cache miss
+    GRAPH_SNAPSHOTS = os.getenv("GRAPH_SNAPSHOTS", "true").lower() in ("1", "true", "yes")
+    SNAPSHOT_INLINE_MAX_BYTES = int(os.getenv("SNAPSHOT_INLINE_MAX_BYTES", 15 * 1024 * 1024))  # Larger ones go to GridFS
+
+    # Memoized run responses: per-process LRU, plus an optional shared tier in Mongo expired after RESULT_CACHE_TTL seconds
+    RESULT_CACHE = os.getenv("RESULT_CACHE", "true").lower() in ("1", "true", "yes")
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 1024))
+    RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+    RESULT_CACHE_MONGO = os.getenv("RESULT_CACHE_MONGO", "false").lower() in ("1", "true", "yes")
+    RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", 3600))
+
+    # Run states kept for incremental re-runs (per process)
+    RUN_STATE_MAX_ENTRIES = int(os.getenv("RUN_STATE_MAX_ENTRIES", 256))
+    RUN_STATE_MAX_BYTES = int(os.getenv("RUN_STATE_MAX_BYTES", 256 * 1024 * 1024))
+
+    # In-memory graph representation used for runs: "dict" (Graph_1) or "compact" (CSR arrays)
+    GRAPH_BACKEND = os.getenv("GRAPH_BACKEND", "dict")
+
+    # Number of items validated and written together by the bulk endpoints
+    BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 1000))
+
+    # How the nodes of a topological level are propagated: "serial", "thread" or "process"
+    PROPAGATION_EXECUTOR = os.getenv("PROPAGATION_EXECUTOR", "serial")
+    PROPAGATION_WORKERS = int(os.getenv("PROPAGATION_WORKERS", 0))  # 0 = one per CPU
+    PROPAGATION_MIN_LEVEL_WIDTH = int(os.getenv("PROPAGATION_MIN_LEVEL_WIDTH", 64))
+
+    # Asynchronous run jobs: concurrent runs, queued runs and where job records live ("memory" or "mongo")
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+    JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 100))
+    JOB_STORE = os.getenv("JOB_STORE", "memory")
+    JOB_MAX_FINISHED = int(os.getenv("JOB_MAX_FINISHED", 1000))  # Finished jobs kept by the memory store
+    JOB_MAX_WAIT = int(os.getenv("JOB_MAX_WAIT", 30))  # Longest long-poll, in seconds
+
+    # Reject runs of graphs whose node/edge schemas don't validate (checked once per graph version)
+    SCHEMA_CHECK_RUNS = os.getenv("SCHEMA_CHECK_RUNS", "false").lower() in ("1", "true", "yes")
+
+    # Encode JSON responses with orjson when it is installed
+    FAST_JSON = os.getenv("FAST_JSON", "true").lower() in ("1", "true", "yes")
+
+    # Instrumentation: phase timers, Mongo command counts and /metrics; Server-Timing response header
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")
+    SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
@@ -0,0 +1,19 @@
+# gunicorn settings for `gunicorn -c gunicorn.conf.py wsgi:app`, overridable from the environment
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# Threads per worker share the worker's compiled graph cache and Mongo pool
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", 4))
+# Warmups can take a while on large graphs, don't let the arbiter kill a booting worker
+timeout = int(os.getenv("WEB_TIMEOUT", 120))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("WEB_KEEPALIVE", 5))
+# Recycle workers now and then, jittered so they don't all restart (and warm up) at once
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", 0))
+# The app is loaded in each worker, after the fork: MongoClient is not fork-safe
+preload_app = False
+accesslog = os.getenv("WEB_ACCESS_LOG", "-")
@@ -0,0 +1,151 @@
+"""
+Migrates existing data to the current schema:
+
+    graphs.nodes            DBRefs / ObjectIds  ->  node_id strings
+    nodes.paths_in/out      DBRefs / ObjectIds  ->  edge_id strings
+    nodes.graph_id          set for nodes listed in exactly one graph (unless already set)
+
+then creates every index declared on the models. Documents already in the new
+format are left alone, so the command can be run again safely.
+
+    python migrate.py
+    python migrate.py --dry-run
+"""
+import argparse
+import sys
+from typing import Dict, Iterable, List
+from bson import DBRef, ObjectId
+from mongoengine import connect
+from pymongo import UpdateOne
+from config import Config
+from models import Node, Edge, Graph, GraphRunConfig, GraphSnapshot, RunJob, RunResult
+
+
+def chunked(items: List, size: int) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _is_reference(value) -> bool:
+    return isinstance(value, (DBRef, ObjectId))
+
+
+def _resolve(refs: Iterable, collection, id_field: str) -> Dict:
+    """Maps the ObjectIds behind `refs` to the `id_field` of the referenced documents, in one query."""
+    object_ids = {ref.id if isinstance(ref, DBRef) else ref for ref in refs}
+    object_ids = [object_id for object_id in object_ids if isinstance(object_id, ObjectId)]
+    if not object_ids:
+        return {}
+    return {doc['_id']: doc[id_field] for doc in collection.find({"_id": {"$in": object_ids}}, {id_field: 1})}
+
+
+def _to_id(ref, resolved: Dict):
+    """A reference as a plain id string, or None if it points to a missing document."""
+    if isinstance(ref, DBRef):
+        ref = ref.id
+    if isinstance(ref, ObjectId):
+        return resolved.get(ref)
+    return ref
+
+
+def migrate_graph_nodes(dry_run: bool) -> int:
+    """Rewrites Graph.nodes as node_id strings. Returns the number of graphs changed."""
+    graphs = Graph._get_collection()
+    nodes = Node._get_collection()
+    updates = []
+    for graph in graphs.find({}, {"nodes": 1}):
+        refs = graph.get('nodes', [])
+        if not any(_is_reference(ref) for ref in refs):
+            continue
+        resolved = _resolve(refs, nodes, 'node_id')
+        node_ids = [_to_id(ref, resolved) for ref in refs]
+        updates.append(UpdateOne({"_id": graph['_id']},
+                                 {"$set": {"nodes": [node_id for node_id in node_ids if node_id is not None]},
+                                  "$inc": {"version": 1}}))
+    if updates and not dry_run:
+        for batch in chunked(updates, Config.BULK_BATCH_SIZE):
+            graphs.bulk_write(batch, ordered=False)
+    return len(updates)
+
+
+def migrate_node_paths(dry_run: bool) -> int:
+    """Rewrites Node.paths_in/paths_out as edge_id strings. Returns the number of nodes changed."""
+    nodes = Node._get_collection()
+    edges = Edge._get_collection()
+    changed = 0
+    batch = []
+
+    def flush():
+        resolved = _resolve([ref for node in batch for field in ('paths_in', 'paths_out')
+                             for ref in node.get(field, [])], edges, 'edge_id')
+        updates = []
+        for node in batch:
+            fields = {}
+            for field in ('paths_in', 'paths_out'):
+                edge_ids = [_to_id(ref, resolved) for ref in node.get(field, [])]
+                fields[field] = [edge_id for edge_id in edge_ids if edge_id is not None]
+            updates.append(UpdateOne({"_id": node['_id']}, {"$set": fields}))
+        if not dry_run:
+            nodes.bulk_write(updates, ordered=False)
+        batch.clear()
+
+    for node in nodes.find({}, {"paths_in": 1, "paths_out": 1}).batch_size(Config.BULK_BATCH_SIZE):
+        if not any(_is_reference(ref) for field in ('paths_in', 'paths_out') for ref in node.get(field, [])):
+            continue
+        batch.append(node)
+        changed += 1
+        if len(batch) >= Config.BULK_BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+    return changed
+
+
+def migrate_node_graph_ids(dry_run: bool) -> int:
+    """Tags untagged nodes with their graph when they belong to exactly one. Returns the number tagged."""
+    owners: Dict[str, set] = {}
+    for graph in Graph._get_collection().find({}, {"graph_id": 1, "nodes": 1}):
+        for node_id in graph.get('nodes', []):
+            if isinstance(node_id, str):
+                owners.setdefault(node_id, set()).add(graph['graph_id'])
+
+    by_graph: Dict[str, List[str]] = {}
+    for node_id, graph_ids in owners.items():
+        if len(graph_ids) == 1:
+            by_graph.setdefault(next(iter(graph_ids)), []).append(node_id)
+
+    nodes = Node._get_collection()
+    tagged = 0
+    for graph_id, node_ids in by_graph.items():
+        for batch in chunked(node_ids, Config.BULK_BATCH_SIZE):
+            query = {"node_id": {"$in": batch}, "graph_id": None}
+            if dry_run:
+                tagged += nodes.count_documents(query)
+            else:
+                tagged += nodes.update_many(query, {"$set": {"graph_id": graph_id}}).modified_count
+    return tagged
+
+
+def ensure_indexes() -> None:
+    for document in (Node, Edge, Graph, GraphRunConfig, GraphSnapshot, RunJob, RunResult):
+        document.ensure_indexes()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    args = parser.parse_args()
+
+    connect(host=Config.MONGO_URI)
+    print(f"graphs.nodes rewritten as node_ids: {migrate_graph_nodes(args.dry_run)}")
+    print(f"nodes.paths_in/out rewritten as edge_ids: {migrate_node_paths(args.dry_run)}")
+    # After the graphs, so graph_id is inferred from plain node_ids
+    print(f"nodes tagged with their graph_id: {migrate_node_graph_ids(args.dry_run)}")
+    if not args.dry_run:
+        ensure_indexes()
+        print("Indexes created")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
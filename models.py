@@ -1,6 +1,8 @@
 # models.py
 
-from mongoengine import Document, StringField, ListField, ReferenceField, MapField, DynamicField
+from mongoengine import (Document, StringField, ListField, MapField, DynamicField, IntField,
+                         BooleanField, DictField, DateTimeField, BinaryField, ObjectIdField)
+from config import Config
 
 # Define the compatible DataType types for MongoDB (int, float, str, bool, list, dict)
 DataType = DynamicField()  # Allows any data type
@@ -11,8 +13,22 @@ class Edge(Document):
     src_node = StringField(required=True)
     dst_node = StringField(required=True)
     src_to_dst_data_keys = MapField(StringField())  # Maps `str` keys to `str` values
+    graph_id = StringField()  # Optional, scopes the edge to a single graph
 
-    meta = {'collection': 'edges'}  
+    meta = {
+        'collection': 'edges',
+        'indexes': [
+            # Graph-scoped edge lookups used by graph runs (also serves graph_id + src_node)
+            ('graph_id', 'src_node', 'dst_node'),
+            # Graph-scoped incoming edge lookups
+            ('graph_id', 'dst_node'),
+            # Outgoing/incoming edge lookups by node
+            ('src_node', 'dst_node'),
+            # Edge listings filtered by node and paged by edge_id
+            ('src_node', 'edge_id'),
+            ('dst_node', 'edge_id'),
+        ]
+    }
 
 
 ### Node Model ###
@@ -20,25 +36,90 @@ class Node(Document):
     node_id = StringField(required=True, unique=True)
     data_in = MapField(DataType)  # Maps `str` keys to any DataType as value
     data_out = MapField(DataType)  # Maps `str` keys to any DataType as value
-    paths_in = ListField(ReferenceField(Edge))  # List of incoming edges
-    paths_out = ListField(ReferenceField(Edge))  # List of outgoing edges
+    paths_in = ListField(StringField())  # edge_ids of the incoming edges
+    paths_out = ListField(StringField())  # edge_ids of the outgoing edges
+    graph_id = StringField()  # Optional, the graph the node was created for
 
-    meta = {'collection': 'nodes'}  # MongoDB collection name
+    meta = {
+        'collection': 'nodes',  # MongoDB collection name
+        'indexes': [('graph_id', 'node_id')]
+    }
 
 
 ### Graph Model ###
 class Graph(Document):
     graph_id = StringField(required=True, unique=True)
-    nodes = ListField(ReferenceField(Node))  # List of Node references
-    
-    meta = {'collection': 'graphs'}  # MongoDB collection name
+    nodes = ListField(StringField())  # node_ids of the graph's nodes
+    version = IntField(default=0)  # Bumped whenever the graph's nodes or edges change
+    validated_version = IntField()  # Last version whose schemas passed a whole-graph validation
+    patch_lock = DateTimeField()  # Set while a patch is being written, until it expires
+
+    meta = {
+        'collection': 'graphs',  # MongoDB collection name
+        'indexes': ['nodes']  # Find the graphs affected by a node/edge change
+    }
 
 
 ### GraphRunConfig Model ###
 class GraphRunConfig(Document):
+    graph_id = StringField()  # Graph the config was saved for
     root_inputs = MapField(MapField(DataType))  # Dict[str, Dict[str, DataType]]
     data_overwrites = MapField(MapField(DataType))  # Dict[str, Dict[str, DataType]]
     enable_list = ListField(StringField())  # List of enabled node_ids
     disable_list = ListField(StringField())  # List of disabled node_ids
+    outputs = ListField(StringField())  # node_ids to compute and return, all of them if empty
+
+    meta = {
+        'collection': 'graph_run_configs',  # MongoDB collection name
+        'indexes': ['graph_id']
+    }
+
+
+### GraphSnapshot Model ###
+class GraphSnapshot(Document):
+    graph_id = StringField(required=True, unique=True)
+    version = IntField()  # Graph.version the snapshot was built from
+    format = IntField()
+    size = IntField()  # Bytes of the compressed snapshot
+    data = BinaryField()  # The snapshot, when small enough to be stored inline
+    gridfs_id = ObjectIdField()  # Otherwise, its file in the graph_snapshots_fs GridFS bucket
+
+    meta = {
+        'collection': 'graph_snapshots',
+        'indexes': [('graph_id', 'version')]
+    }
+
+
+### RunJob Model ###
+class RunJob(Document):
+    job_id = StringField(required=True, unique=True)
+    graph_id = StringField()
+    config = DictField()  # Run config: root_inputs, disable_list, data_overwrites
+    status = StringField()  # queued, running, succeeded, failed or cancelled
+    cancel_requested = BooleanField(default=False)
+    result = DictField()
+    status_code = IntField()
+    error = StringField()
+    submitted_at = DateTimeField()
+    started_at = DateTimeField()
+    finished_at = DateTimeField()
+
+    meta = {
+        'collection': 'run_jobs',  # Used when JOB_STORE=mongo
+        'indexes': ['status']
+    }
+
+
+### RunResult Model ###
+class RunResult(Document):
+    key = StringField(required=True, unique=True)  # Hash of the graph version and run config
+    graph_id = StringField()
+    version = IntField()
+    body = BinaryField()  # The serialized response
+    status = IntField()
+    created_at = DateTimeField()
 
-    meta = {'collection': 'graph_run_configs'}  # MongoDB collection name
+    meta = {
+        'collection': 'run_results',  # Used when RESULT_CACHE_MONGO is set
+        'indexes': [{'fields': ['created_at'], 'expireAfterSeconds': Config.RESULT_CACHE_TTL}]
+    }
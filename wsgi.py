@@ -0,0 +1,12 @@
+"""
+Production entry point:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every worker process imports this module after the fork, so it creates its
+own app, Mongo pool and caches, and runs the configured warmup before it
+accepts requests.
+"""
+from app import create_app
+
+app = create_app()